@@ -1,21 +1,24 @@
-from .coding_models import CodeResponse, CodeExplanation, CodeDebug
-from .enhanced_coding_agent import (
-    generate_structured_code,
-    explain_structured_code,
-    debug_structured_code,
-    format_code_response,
-    format_explanation,
-    format_debug_info
-)
+import importlib
 
-__all__ = [
-    'CodeResponse',
-    'CodeExplanation',
-    'CodeDebug',
-    'generate_structured_code',
-    'explain_structured_code',
-    'debug_structured_code',
-    'format_code_response',
-    'format_explanation',
-    'format_debug_info'
-] 
\ No newline at end of file
+# Exported names and their modules. They are imported on first access, so
+# importing a light module such as agents.router does not load the LLM client
+_EXPORTS = {
+    'CodeResponse': 'coding_models',
+    'CodeExplanation': 'coding_models',
+    'CodeDebug': 'coding_models',
+    'generate_structured_code': 'enhanced_coding_agent',
+    'explain_structured_code': 'enhanced_coding_agent',
+    'debug_structured_code': 'enhanced_coding_agent',
+    'format_code_response': 'enhanced_coding_agent',
+    'format_explanation': 'enhanced_coding_agent',
+    'format_debug_info': 'enhanced_coding_agent'
+}
+
+__all__ = list(_EXPORTS)
+
+def __getattr__(name):
+    if name not in _EXPORTS:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(f".{_EXPORTS[name]}", __name__), name)
+    globals()[name] = value
+    return value
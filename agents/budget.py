@@ -0,0 +1,226 @@
+import os
+import time
+import sqlite3
+import logging
+import threading
+import contextvars
+from contextlib import contextmanager
+try:
+    from . import model_router, pricing, token_counter, usage_context, usage_store
+except ImportError:
+    import model_router
+    import pricing
+    import token_counter
+    import usage_context
+    import usage_store
+
+logger = logging.getLogger(__name__)
+
+# Spend limits in dollars (overridable through the environment); 0 disables a limit
+DAILY_BUDGET = float(os.getenv("LLM_BUDGET_DAILY", "0"))
+SESSION_BUDGET = float(os.getenv("LLM_BUDGET_SESSION", "0"))
+KEY_DAILY_BUDGET = float(os.getenv("LLM_BUDGET_KEY_DAILY", "0"))
+# Switch a call to the fast tier when only that fits the remaining budget
+DEGRADE_ENABLED = os.getenv("LLM_BUDGET_DEGRADE", "1") != "0"
+# How often the daily spend is re-read from the store to pick up other processes
+REFRESH_INTERVAL = float(os.getenv("LLM_BUDGET_REFRESH", "5"))
+# Most plan steps a plan-execute-replan loop runs before it falls back to the answerer
+MAX_EXECUTED_STEPS = int(os.getenv("MULTI_AGENT_MAX_STEPS", "8"))
+
+class BudgetExceeded(Exception):
+    """Raised before an LLM call whose estimated cost would take a spend limit over budget."""
+
+    def __init__(self, scope, limit, spent, estimate):
+        self.scope = scope
+        self.limit = limit
+        self.spent = spent
+        self.estimate = estimate
+        super().__init__(
+            f"The {scope} budget of ${limit:.4f} would be exceeded: ${spent:.4f} spent "
+            f"and the next call could cost up to ${estimate:.4f}"
+        )
+
+    def to_dict(self):
+        return {
+            "scope": self.scope,
+            "limit": self.limit,
+            "spent": round(self.spent, 6),
+            "estimate": round(self.estimate, 6)
+        }
+
+class Admission:
+    """The session and API key that a request's LLM calls are charged to."""
+
+    def __init__(self, session=None, api_key=None):
+        self.session = session
+        self.api_key = api_key
+        self.degraded = 0
+        self.rejected = None
+
+_current = contextvars.ContextVar("llm_admission", default=None)
+
+@contextmanager
+def admission(session=None, api_key=None):
+    """
+    Charges every LLM call inside the block to a session and API key for
+    the per-session and per-key budgets. A rejection is kept on the yielded
+    Admission, since agents often turn errors into plain answers.
+    """
+    admitted = Admission(session, api_key)
+    token = _current.set(admitted)
+    try:
+        yield admitted
+    finally:
+        _current.reset(token)
+
+def rejection():
+    """The budget error raised inside the current admission block, if any."""
+    admitted = _current.get()
+    return admitted.rejected if admitted else None
+
+def request_cost() -> float:
+    """What the current request has spent so far and is not yet in the store."""
+    usage = usage_context.current_usage()
+    while usage is not None and usage.parent is not None:
+        usage = usage.parent
+    return usage.cost if usage is not None else 0.0
+
+class _Stats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.checks = 0
+        self.degraded = 0
+        self.rejected = 0
+
+    def incr(self, name):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+class BudgetGuard:
+    """
+    Checks the worst-case cost of an LLM call (its prompt plus max_tokens)
+    against the daily, per-session and per-key limits before it is made.
+    Spend is read from the usage store's in-memory day rollups and session
+    totals, so a check never waits on the database; the daily total is
+    re-read from the database every `refresh_interval` seconds so that
+    other processes' spend counts too.
+    """
+
+    def __init__(self, store=None, daily=DAILY_BUDGET, session=SESSION_BUDGET, key_daily=KEY_DAILY_BUDGET,
+                 degrade=DEGRADE_ENABLED, refresh_interval=REFRESH_INTERVAL):
+        self._store = store
+        self.limits = {"daily": daily, "session": session, "key": key_daily}
+        self.degrade = degrade
+        self.refresh_interval = refresh_interval
+        self.stats_counters = _Stats()
+        self._lock = threading.Lock()
+        # (day, stored cost, rollup cost at the time, monotonic time)
+        self._snapshot = None
+
+    @property
+    def store(self) -> usage_store.UsageStore:
+        if self._store is None:
+            self._store = usage_store.get_store()
+        return self._store
+
+    @property
+    def enabled(self) -> bool:
+        return any(limit > 0 for limit in self.limits.values())
+
+    def _rollup_cost(self) -> float:
+        return self.store.rollups.query(window=1, granularity="day")["totals"]["cost"]
+
+    def daily_spent(self) -> float:
+        """Today's spend across processes: the last stored total plus local spend since."""
+        day = usage_store.today()
+        snapshot = self._snapshot
+        if snapshot is None or snapshot[0] != day or time.monotonic() - snapshot[3] >= self.refresh_interval:
+            with self._lock:
+                snapshot = self._snapshot
+                if snapshot is None or snapshot[0] != day or time.monotonic() - snapshot[3] >= self.refresh_interval:
+                    try:
+                        snapshot = (day, self.store.day_cost(day), self._rollup_cost(), time.monotonic())
+                    except sqlite3.Error as e:
+                        logger.error(f"Error reading today's spend: {str(e)}")
+                        if snapshot is None or snapshot[0] != day:
+                            snapshot = (day, 0.0, 0.0, time.monotonic())
+                    self._snapshot = snapshot
+        return snapshot[1] + max(self._rollup_cost() - snapshot[2], 0.0)
+
+    def spent(self, admitted=None):
+        """(scope, limit, spent) for every enabled limit that applies, including the in-flight request."""
+        in_flight = request_cost()
+        scopes = []
+        if self.limits["daily"] > 0:
+            scopes.append(("daily", self.limits["daily"], self.daily_spent() + in_flight))
+        if admitted is not None and admitted.session and self.limits["session"] > 0:
+            spent = self.store.session_usage(admitted.session)["cost"]
+            scopes.append(("session", self.limits["session"], spent + in_flight))
+        if admitted is not None and admitted.api_key and self.limits["key"] > 0:
+            spent = self.store.key_usage(admitted.api_key)["cost"]
+            scopes.append(("key", self.limits["key"], spent + in_flight))
+        return scopes
+
+    def check(self, messages, model, max_tokens) -> str:
+        """
+        Returns the model to call: `model` if the call fits every budget,
+        the fast tier model if only that fits. Raises BudgetExceeded otherwise.
+        """
+        if not self.enabled:
+            return model
+        self.stats_counters.incr("checks")
+        admitted = _current.get()
+        prompt_tokens = token_counter.approx_message_tokens(messages)
+        scopes = self.spent(admitted)
+
+        def over(candidate):
+            estimate = pricing.price_call(candidate, prompt_tokens, max_tokens or 0)
+            for scope, limit, spent in scopes:
+                if spent + estimate > limit:
+                    return BudgetExceeded(scope, limit, spent, estimate)
+            return None
+
+        error = over(model)
+        if error is None:
+            return model
+        fallback = model_router.FAST_MODEL
+        if self.degrade and fallback != model and over(fallback) is None:
+            self.stats_counters.incr("degraded")
+            if admitted is not None:
+                admitted.degraded += 1
+            logger.warning(f"Switching from {model} to {fallback} to stay within the {error.scope} budget")
+            return fallback
+        self.stats_counters.incr("rejected")
+        if admitted is not None:
+            admitted.rejected = error
+        logger.warning(f"Rejected LLM call: {str(error)}")
+        raise error
+
+    def stats(self):
+        result = {
+            "enabled": self.enabled,
+            "limits": dict(self.limits),
+            "degrade": self.degrade,
+            "checks": self.stats_counters.checks,
+            "degraded": self.stats_counters.degraded,
+            "rejected": self.stats_counters.rejected
+        }
+        if self.limits["daily"] > 0:
+            result["daily_spent"] = round(self.daily_spent(), 6)
+        return result
+
+_guard = None
+_guard_lock = threading.Lock()
+
+def get_guard() -> BudgetGuard:
+    """Returns the process-wide budget guard."""
+    global _guard
+    if _guard is None:
+        with _guard_lock:
+            if _guard is None:
+                _guard = BudgetGuard()
+    return _guard
+
+def check(messages, model, max_tokens) -> str:
+    """Admits one LLM call under the process-wide budgets; see BudgetGuard.check."""
+    return get_guard().check(messages, model, max_tokens)
@@ -1,65 +1,15 @@
-import os
 from dotenv import load_dotenv
-from openai import OpenAI
-import tiktoken
-import json
-from datetime import datetime
+try:
+    from . import llm_client, model_router, usage_context, usage_store
+except ImportError:
+    import llm_client
+    import model_router
+    import usage_context
+    import usage_store
 
 # Load environment variables
 load_dotenv()
 
-# Configure OpenRouter
-client = OpenAI(
-    api_key="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",
-    base_url="https://openrouter.ai/api/v1"
-)
-
-# Initialize token counter
-def count_tokens(text: str) -> int:
-    encoding = tiktoken.encoding_for_model("gpt-3.5-turbo")
-    return len(encoding.encode(text))
-
-# Cost tracking
-class CostTracker:
-    def __init__(self):
-        self.total_tokens = 0
-        self.total_cost = 0
-        self.daily_usage = {}
-        self.load_usage()
-
-    def load_usage(self):
-        if os.path.exists('coding_usage.json'):
-            with open('coding_usage.json', 'r') as f:
-                data = json.load(f)
-                self.total_tokens = data.get('total_tokens', 0)
-                self.total_cost = data.get('total_cost', 0)
-                self.daily_usage = data.get('daily_usage', {})
-
-    def save_usage(self):
-        with open('coding_usage.json', 'w') as f:
-            json.dump({
-                'total_tokens': self.total_tokens,
-                'total_cost': self.total_cost,
-                'daily_usage': self.daily_usage
-            }, f)
-
-    def track_usage(self, tokens: int):
-        today = datetime.now().strftime('%Y-%m-%d')
-        self.total_tokens += tokens
-        self.daily_usage[today] = self.daily_usage.get(today, 0) + tokens
-        # Calculate cost (OpenRouter GPT-3.5-turbo: $0.002 per 1K tokens)
-        self.total_cost = (self.total_tokens / 1000) * 0.002
-        self.save_usage()
-
-    def get_usage_summary(self):
-        return f"""
-Usage Summary:
--------------
-Total Tokens: {self.total_tokens:,}
-Total Cost: ${self.total_cost:.4f}
-Today's Usage: {self.daily_usage.get(datetime.now().strftime('%Y-%m-%d'), 0):,} tokens
-"""
-
 def generate_code(prompt, language="python"):
     system_prompt = f"""You are an expert programmer specializing in {language}. 
     Generate clean, efficient, and well-documented code based on the user's request.
@@ -67,8 +17,8 @@ def generate_code(prompt, language="python"):
     Focus on best practices and maintainable code."""
     
     try:
-        response = client.chat.completions.create(
-            model="openai/gpt-3.5-turbo",
+        response = llm_client.chat_completion(
+            model=model_router.choose_model("code"),
             messages=[
                 {"role": "system", "content": system_prompt},
                 {"role": "user", "content": prompt}
@@ -90,8 +40,8 @@ def explain_code(code):
     4. Potential improvements or optimizations"""
     
     try:
-        response = client.chat.completions.create(
-            model="openai/gpt-3.5-turbo",
+        response = llm_client.chat_completion(
+            model=model_router.choose_model("code"),
             messages=[
                 {"role": "system", "content": system_prompt},
                 {"role": "user", "content": code}
@@ -118,8 +68,8 @@ def debug_code(code, error_message=None):
         if error_message:
             user_content += f"\nError message:\n{error_message}"
             
-        response = client.chat.completions.create(
-            model="openai/gpt-3.5-turbo",
+        response = llm_client.chat_completion(
+            model=model_router.choose_model("code"),
             messages=[
                 {"role": "system", "content": system_prompt},
                 {"role": "user", "content": user_content}
@@ -133,7 +83,7 @@ def debug_code(code, error_message=None):
 
 def main():
     print("Initializing Coding Agent...")
-    cost_tracker = CostTracker()
+    cost_tracker = usage_store.CostTracker('coding', session=usage_store.new_session_id())
     
     print("\nCoding Agent CLI")
     print("===============")
@@ -161,59 +111,54 @@ def main():
             if not user_input:
                 continue
 
-            # Track input tokens
-            input_tokens = count_tokens(user_input)
-            cost_tracker.track_usage(input_tokens)
-
-            # Process the command
-            if user_input.lower().startswith('generate '):
-                parts = user_input[9:].split(' ', 1)
-                if len(parts) == 2:
-                    language, prompt = parts
-                    print(f"\nGenerating {language} code...")
-                    response = generate_code(prompt, language)
-                    print(f"\nGenerated Code:\n{response}")
-                else:
-                    print("\nPlease use format: generate <language> <prompt>")
-                    continue
+            # Process the command, collecting the usage of every LLM call
+            with usage_context.track_usage() as usage:
+                if user_input.lower().startswith('generate '):
+                    parts = user_input[9:].split(' ', 1)
+                    if len(parts) == 2:
+                        language, prompt = parts
+                        print(f"\nGenerating {language} code...")
+                        response = generate_code(prompt, language)
+                        print(f"\nGenerated Code:\n{response}")
+                    else:
+                        print("\nPlease use format: generate <language> <prompt>")
+                        continue
                     
-            elif user_input.lower().startswith('explain '):
-                code = user_input[8:].strip()
-                if code:
-                    print("\nAnalyzing code...")
-                    response = explain_code(code)
-                    print(f"\nExplanation:\n{response}")
-                else:
-                    print("\nPlease provide code to explain.")
-                    continue
+                elif user_input.lower().startswith('explain '):
+                    code = user_input[8:].strip()
+                    if code:
+                        print("\nAnalyzing code...")
+                        response = explain_code(code)
+                        print(f"\nExplanation:\n{response}")
+                    else:
+                        print("\nPlease provide code to explain.")
+                        continue
+                    
+                elif user_input.lower().startswith('debug '):
+                    parts = user_input[6:].split(' ', 1)
+                    if len(parts) >= 1:
+                        code = parts[0]
+                        error_message = parts[1] if len(parts) > 1 else None
+                        print("\nDebugging code...")
+                        response = debug_code(code, error_message)
+                        print(f"\nDebug Analysis:\n{response}")
+                    else:
+                        print("\nPlease provide code to debug.")
+                        continue
                     
-            elif user_input.lower().startswith('debug '):
-                parts = user_input[6:].split(' ', 1)
-                if len(parts) >= 1:
-                    code = parts[0]
-                    error_message = parts[1] if len(parts) > 1 else None
-                    print("\nDebugging code...")
-                    response = debug_code(code, error_message)
-                    print(f"\nDebug Analysis:\n{response}")
                 else:
-                    print("\nPlease provide code to debug.")
+                    print("\nUnknown command. Available commands:")
+                    print("  generate <language> <prompt> - Generate code in specified language")
+                    print("  explain <code> - Get explanation of the code")
+                    print("  debug <code> [error_message] - Debug code with optional error message")
+                    print("  usage - Show usage statistics")
+                    print("  exit - Exit the program")
                     continue
-                    
-            else:
-                print("\nUnknown command. Available commands:")
-                print("  generate <language> <prompt> - Generate code in specified language")
-                print("  explain <code> - Get explanation of the code")
-                print("  debug <code> [error_message] - Debug code with optional error message")
-                print("  usage - Show usage statistics")
-                print("  exit - Exit the program")
-                continue
-
-            # Track output tokens
-            output_tokens = count_tokens(str(response))
-            cost_tracker.track_usage(output_tokens)
+            usage.count_locally(user_input, str(response))
+            cost_tracker.track_request(usage)
 
             # Print usage info
-            print(f"\nUsage: {input_tokens + output_tokens:,} tokens (${(input_tokens + output_tokens)/1000*0.002:.4f})")
+            print(f"\nUsage: {usage.total_tokens:,} tokens (${usage.cost:.4f})")
 
         except KeyboardInterrupt:
             print("\n\nExiting...")
@@ -1,14 +1,27 @@
-import os
 import matplotlib.pyplot as plt
 from langchain_openai import OpenAI
 from langchain.chains import LLMChain
 from langchain.prompts import PromptTemplate
+from langchain_community.callbacks import get_openai_callback
 from dotenv import load_dotenv
+from functools import lru_cache
 import tempfile
+import time
+try:
+    from . import budget, llm_client, usage_context
+except ImportError:
+    import budget
+    import llm_client
+    import usage_context
 
 # Load environment variables
 load_dotenv()
 
+LLM_MODEL = "gpt-3.5-turbo-instruct"
+# The same model under its id in the pricing registry
+PRICED_MODEL = "openai/" + LLM_MODEL
+MAX_TOKENS = 256
+
 # Prompt for Concept Mapping & Data Agent
 concept_prompt = PromptTemplate(
     input_variables=["topic"],
@@ -54,12 +67,33 @@ Data: {{"Label1": number, "Label2": number, ...}}
 """
 )
 
+# The chains hold no per-query state, so they are built once and shared
+@lru_cache(maxsize=1)
 def initialize_agent():
-    llm = OpenAI(model="gpt-3.5-turbo-instruct", temperature=0.4)
+    llm = OpenAI(model=LLM_MODEL, temperature=0.4, max_tokens=MAX_TOKENS)
     concept_chain = LLMChain(llm=llm, prompt=concept_prompt)
     chart_chain = LLMChain(llm=llm, prompt=chart_prompt)
     return concept_chain, chart_chain
 
+def run_chain(chain, text):
+    """
+    Runs one chain under the request's budget and records its usage. The
+    chains call OpenAI directly, so when only the fast tier fits the budget
+    the prompt goes through the shared client instead.
+    """
+    prompt = chain.prompt.format(**{chain.prompt.input_variables[0]: text})
+    messages = [{"role": "user", "content": prompt}]
+    model = budget.check(messages, PRICED_MODEL, MAX_TOKENS)
+    if model != PRICED_MODEL:
+        return llm_client.call_openrouter(prompt, temperature=0.4, max_tokens=MAX_TOKENS, model=model)
+
+    start = time.monotonic()
+    with get_openai_callback() as callback:
+        result = chain.run(text)
+    usage = callback if callback.prompt_tokens else None
+    usage_context.record_call(PRICED_MODEL, time.monotonic() - start, usage, messages, result)
+    return result
+
 def generate_plot(chart_type, title, x_label, y_label, data_dict):
     fig, ax = plt.subplots()
 
@@ -92,7 +126,7 @@ def process_query(query):
 
     if any(word in query for word in ["plot", "chart", "visualize", "compare", "graph"]):
         try:
-            plan = chart_chain.run(query)
+            plan = run_chain(chart_chain, query)
             
             # Parse the chart generation instruction
             chart_type = plan.split("Chart Type:")[1].split("\n")[0].strip()
@@ -112,16 +146,18 @@ def process_query(query):
                 "message": f"{title}\n\n_(Generated chart based on your query)_"
             }
             
+        except budget.BudgetExceeded:
+            raise
         except Exception as e:
             # Fallback to concept mapping if chart generation fails
-            result = concept_chain.run(query)
+            result = run_chain(concept_chain, query)
             return {
                 "type": "text",
                 "message": f"⚠ Error generating plot: {str(e)}\n\nFallbacking to concept mapping:\n\n{result}"
             }
     else:
         # Default: run concept/data agent
-        result = concept_chain.run(query)
+        result = run_chain(concept_chain, query)
         return {
             "type": "text",
             "message": result
@@ -0,0 +1,161 @@
+import os
+import re
+import logging
+import threading
+try:
+    from . import token_counter, usage_context
+except ImportError:
+    import token_counter
+    import usage_context
+
+logger = logging.getLogger(__name__)
+
+# Prompt size settings (overridable through the environment)
+CONTEXT_WINDOW = int(os.getenv("LLM_CONTEXT_WINDOW", "16385"))
+CONTEXT_BUDGET = int(os.getenv("LLM_CONTEXT_BUDGET", "1500"))
+
+# Segments that would be cut below this many tokens are dropped instead
+MIN_SEGMENT_TOKENS = 32
+
+TRUNCATION_MARKER = " ..."
+
+def prompt_budget(system_prompt, prompt, max_tokens=1000, model=token_counter.DEFAULT_MODEL, budget=None):
+    """
+    Returns how many tokens of context fit into a prompt: the context budget,
+    capped by what is left of the model window after the fixed prompt text
+    and the completion.
+    """
+    fixed = token_counter.count_message_tokens(
+        [{"role": "system", "content": system_prompt}, {"role": "user", "content": prompt}], model
+    )
+    available = CONTEXT_WINDOW - fixed - max_tokens
+    return max(0, min(CONTEXT_BUDGET if budget is None else budget, available))
+
+def query_terms(text):
+    return {word for word in re.findall(r"\w+", text.lower()) if len(word) > 2}
+
+class Segment:
+    def __init__(self, group, text, score=0.0, order=0):
+        self.group = group
+        self.text = text
+        self.score = score
+        self.order = order
+
+class AssembledContext:
+    def __init__(self, groups, original_tokens, used_tokens):
+        self.groups = groups
+        self.original_tokens = original_tokens
+        self.used_tokens = used_tokens
+
+    @property
+    def saved_tokens(self) -> int:
+        return self.original_tokens - self.used_tokens
+
+    def text(self, group, separator="\n\n") -> str:
+        return separator.join(self.groups.get(group, []))
+
+class ContextAssembler:
+    """
+    Collects context segments (Wikipedia passages, executed plan steps,
+    conversation turns), then keeps the highest-ranked ones that fit the
+    token budget. The segment that crosses the budget is truncated, and the
+    kept segments are returned in their original order.
+    """
+
+    def __init__(self, budget, model=token_counter.DEFAULT_MODEL):
+        self.budget = budget
+        self.model = model
+        self.segments = []
+
+    def add(self, group, text, score=0.0):
+        if text:
+            self.segments.append(Segment(group, text, score, len(self.segments)))
+        return self
+
+    def add_wiki(self, query, wiki_text, group="wiki"):
+        """Adds Wikipedia passages ranked by overlap with the query, then by search rank."""
+        terms = query_terms(query)
+        passages = [p.strip() for p in (wiki_text or "").split("\n\n") if p.strip()]
+        for rank, passage in enumerate(passages):
+            overlap = len(terms & query_terms(passage)) / len(terms) if terms else 0.0
+            self.add(group, passage, overlap + 0.5 / (rank + 1))
+        return self
+
+    def add_steps(self, past_steps, group="steps"):
+        """Adds executed (task, result) steps, preferring the most recent."""
+        if isinstance(past_steps, str):
+            return self.add(group, past_steps.strip(), 1.0)
+        for i, step in enumerate(past_steps or []):
+            if isinstance(step, (tuple, list)) and len(step) == 2:
+                text = f"Step: {step[0]}\nResult: {step[1]}"
+            else:
+                text = str(step)
+            self.add(group, text, float(i))
+        return self
+
+    def add_history(self, messages, group="history"):
+        """Adds conversation turns ({"role", "content"} dicts), preferring the most recent."""
+        for i, message in enumerate(messages or []):
+            self.add(group, f"{message.get('role', 'user')}: {message.get('content') or ''}", float(i))
+        return self
+
+    def assemble(self) -> AssembledContext:
+        counts = token_counter.count_tokens_batch([segment.text for segment in self.segments], self.model)
+        counted = list(zip(self.segments, counts))
+        original = sum(tokens for _, tokens in counted)
+
+        kept = []
+        remaining = self.budget
+        for segment, tokens in sorted(counted, key=lambda item: (-item[0].score, item[0].order)):
+            if tokens <= remaining:
+                kept.append((segment, segment.text, tokens))
+                remaining -= tokens
+            elif remaining >= MIN_SEGMENT_TOKENS:
+                text = token_counter.truncate_tokens(segment.text, remaining - 2, self.model).rstrip()
+                text += TRUNCATION_MARKER
+                kept.append((segment, text, token_counter.count_tokens(text, self.model)))
+                remaining = 0
+
+        groups = {}
+        used = 0
+        for segment, text, tokens in sorted(kept, key=lambda item: item[0].order):
+            groups.setdefault(segment.group, []).append(text)
+            used += tokens
+
+        context = AssembledContext(groups, original, min(used, original))
+        stats_counters.record(context)
+        if context.saved_tokens:
+            # The request's usage shows what trimming saved it
+            usage = usage_context.current_usage()
+            if usage is not None:
+                usage.add_saved(context.saved_tokens)
+            logger.info(f"Trimmed prompt context from {original} to {context.used_tokens} tokens "
+                        f"(saved {context.saved_tokens})")
+        return context
+
+class _Stats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.prompts = 0
+        self.trimmed = 0
+        self.original_tokens = 0
+        self.saved_tokens = 0
+
+    def record(self, context):
+        with self._lock:
+            self.prompts += 1
+            self.original_tokens += context.original_tokens
+            self.saved_tokens += context.saved_tokens
+            if context.saved_tokens:
+                self.trimmed += 1
+
+stats_counters = _Stats()
+
+def stats():
+    return {
+        "budget": CONTEXT_BUDGET,
+        "prompts": stats_counters.prompts,
+        "trimmed": stats_counters.trimmed,
+        "context_tokens": stats_counters.original_tokens,
+        "saved_tokens": stats_counters.saved_tokens
+    }
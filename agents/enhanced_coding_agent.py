@@ -1,20 +1,13 @@
-import os
 from dotenv import load_dotenv
-from openai import OpenAI
 import tiktoken
 import json
 from datetime import datetime
+from . import llm_client, model_router
 from .coding_models import CodeResponse, CodeExplanation, CodeDebug
 
 # Load environment variables
 load_dotenv()
 
-# Configure OpenRouter
-client = OpenAI(
-    api_key=os.getenv("OPENROUTER_API_KEY"),
-    base_url="https://openrouter.ai/api/v1"
-)
-
 def generate_structured_code(prompt: str, language: str = "python") -> CodeResponse:
     """Generate code with structured output using Pydantic models"""
     system_prompt = f"""You are an expert programmer specializing in {language}. 
@@ -30,8 +23,8 @@ def generate_structured_code(prompt: str, language: str = "python") -> CodeRespo
     Focus on best practices and maintainable code."""
     
     try:
-        response = client.chat.completions.create(
-            model="openai/gpt-3.5-turbo",
+        response = llm_client.chat_completion(
+            model=model_router.choose_model("code"),
             messages=[
                 {"role": "system", "content": system_prompt},
                 {"role": "user", "content": prompt}
@@ -66,8 +59,8 @@ def explain_structured_code(code: str) -> CodeExplanation:
     }"""
     
     try:
-        response = client.chat.completions.create(
-            model="openai/gpt-3.5-turbo",
+        response = llm_client.chat_completion(
+            model=model_router.choose_model("code"),
             messages=[
                 {"role": "system", "content": system_prompt},
                 {"role": "user", "content": code}
@@ -105,8 +98,8 @@ def debug_structured_code(code: str, error_message: str = None) -> CodeDebug:
         if error_message:
             user_content += f"\nError message:\n{error_message}"
             
-        response = client.chat.completions.create(
-            model="openai/gpt-3.5-turbo",
+        response = llm_client.chat_completion(
+            model=model_router.choose_model("code"),
             messages=[
                 {"role": "system", "content": system_prompt},
                 {"role": "user", "content": user_content}
@@ -1,12 +1,15 @@
-import os
-from openai import OpenAI
 from langchain_community.utilities import WikipediaAPIWrapper
 from dotenv import load_dotenv
-import tiktoken
 from functools import lru_cache
-import json
-from datetime import datetime
 import logging
+try:
+    from . import llm_client, context_budget, model_router, usage_context, usage_store
+except ImportError:
+    import llm_client
+    import context_budget
+    import model_router
+    import usage_context
+    import usage_store
 
 # Set up logging
 logging.basicConfig(level=logging.INFO)
@@ -15,60 +18,8 @@ logger = logging.getLogger(__name__)
 # Load environment variables
 load_dotenv()
 
-# Configure OpenRouter
-client = OpenAI(
-    api_key=os.getenv("OPENROUTER_API_KEY"),
-    base_url="https://openrouter.ai/api/v1"
-)
-
-# Initialize token counter
-def count_tokens(text: str) -> int:
-    encoding = tiktoken.encoding_for_model("gpt-3.5-turbo")
-    return len(encoding.encode(text))
-
-# Cost tracking
-class CostTracker:
-    def __init__(self):
-        self.total_tokens = 0
-        self.total_cost = 0
-        self.daily_usage = {}
-        self.load_usage()
-
-    def load_usage(self):
-        if os.path.exists('usage.json'):
-            with open('usage.json', 'r') as f:
-                data = json.load(f)
-                self.total_tokens = data.get('total_tokens', 0)
-                self.total_cost = data.get('total_cost', 0)
-                self.daily_usage = data.get('daily_usage', {})
-
-    def save_usage(self):
-        with open('usage.json', 'w') as f:
-            json.dump({
-                'total_tokens': self.total_tokens,
-                'total_cost': self.total_cost,
-                'daily_usage': self.daily_usage
-            }, f)
-
-    def track_usage(self, tokens: int):
-        today = datetime.now().strftime('%Y-%m-%d')
-        self.total_tokens += tokens
-        self.daily_usage[today] = self.daily_usage.get(today, 0) + tokens
-        # Calculate cost (GPT-3.5-turbo: $0.002 per 1K tokens)
-        self.total_cost = (self.total_tokens / 1000) * 0.002
-        self.save_usage()
-
-    def get_usage_summary(self):
-        return f"""
-Usage Summary:
--------------
-Total Tokens: {self.total_tokens:,}
-Total Cost: ${self.total_cost:.4f}
-Today's Usage: {self.daily_usage.get(datetime.now().strftime('%Y-%m-%d'), 0):,} tokens
-"""
-
-# Initialize cost tracker
-cost_tracker = CostTracker()
+# Usage goes to the store shared by every agent and process
+cost_tracker = usage_store.CostTracker('executor')
 
 # Cached Wikipedia wrapper
 @lru_cache(maxsize=1)
@@ -76,29 +27,24 @@ def get_wikipedia():
     return WikipediaAPIWrapper()
 
 def call_openrouter(prompt, system_prompt="You are a helpful assistant that can answer questions and perform tasks."):
-    try:
-        response = client.chat.completions.create(
-            model="openai/gpt-3.5-turbo",
-            messages=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": prompt}
-            ],
-            temperature=0,
-            max_tokens=1000
-        )
-        return response.choices[0].message.content
-    except Exception as e:
-        logger.error(f"Error calling OpenRouter: {str(e)}")
-        return f"Error: {str(e)}"
+    return llm_client.call_openrouter(prompt, system_prompt, temperature=0, max_tokens=1000,
+                                      model=model_router.choose_model("execute"))
 
-def process_query(query):
-    try:
-        # Get Wikipedia data if needed
-        wikipedia = get_wikipedia()
-        wiki_data = wikipedia.run(query)
-        
-        # Create a comprehensive prompt
-        prompt = f"""
+SYSTEM_PROMPT = "You are a helpful assistant that can answer questions and perform tasks."
+
+def build_prompt(query):
+    # Get Wikipedia data if needed
+    wikipedia = get_wikipedia()
+    wiki_data = wikipedia.run(query)
+    
+    # Keep only the passages that fit the prompt's token budget
+    budget = context_budget.prompt_budget(SYSTEM_PROMPT, executor_prompt(query, ""), max_tokens=1000)
+    wiki_data = context_budget.ContextAssembler(budget).add_wiki(query, wiki_data).assemble().text("wiki")
+    return executor_prompt(query, wiki_data)
+
+def executor_prompt(query, wiki_data):
+    # Create a comprehensive prompt
+    return f"""
 You are an AI assistant that can answer questions and perform tasks.
 If the question requires factual information, use the Wikipedia data provided.
 If the question is about a task or process, provide step-by-step instructions.
@@ -110,14 +56,28 @@ Wikipedia Information (if relevant):
 
 Please provide a comprehensive answer:
 """
-        
+
+def process_query(query):
+    try:
         # Call OpenRouter with the prompt
-        system_prompt = "You are a helpful assistant that can answer questions and perform tasks."
-        return call_openrouter(prompt, system_prompt)
+        return call_openrouter(build_prompt(query), SYSTEM_PROMPT)
     except Exception as e:
         logger.error(f"Error processing query: {str(e)}")
         return f"I encountered an error while processing your query: {str(e)}"
 
+def stream_query(query):
+    """
+    Yields the executor's response text as it is generated.
+    """
+    try:
+        prompt = build_prompt(query)
+    except Exception as e:
+        logger.error(f"Error processing query: {str(e)}")
+        yield f"I encountered an error while processing your query: {str(e)}"
+        return
+    yield from llm_client.stream_openrouter(prompt, SYSTEM_PROMPT, temperature=0, max_tokens=1000,
+                                           model=model_router.choose_model("execute"))
+
 def get_executor():
     """
     Returns a function that can be used to process queries.
@@ -154,20 +114,15 @@ if __name__ == "__main__":
             
             print("\nProcessing your query...")
             
-            # Track input tokens
-            input_tokens = count_tokens(user_input)
-            cost_tracker.track_usage(input_tokens)
-            
-            # Process the query
-            response = executor({"input": user_input})
-            
-            # Track output tokens
-            output_tokens = count_tokens(response["output"])
-            cost_tracker.track_usage(output_tokens)
+            # Process the query, collecting the usage of every LLM call
+            with usage_context.track_usage() as usage:
+                response = executor({"input": user_input})
+            usage.count_locally(user_input, response["output"])
+            cost_tracker.track_request(usage)
             
             # Print response with usage info
             print(f"\nResponse: {response['output']}")
-            print(f"\nUsage: {input_tokens + output_tokens} tokens (${(input_tokens + output_tokens)/1000*0.002:.4f})")
+            print(f"\nUsage: {usage.total_tokens} tokens (${usage.cost:.4f})")
             
         except KeyboardInterrupt:
             print("\n\nExiting...")
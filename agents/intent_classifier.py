@@ -0,0 +1,161 @@
+import os
+import json
+import math
+import zlib
+import struct
+import logging
+import threading
+from array import array
+from bisect import bisect_left
+try:
+    from . import router
+except ImportError:
+    import router
+
+logger = logging.getLogger(__name__)
+
+# The model trained from data/intents_train.jsonl by train_intent_classifier.py
+DEFAULT_MODEL_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "intent_model.bin")
+
+# Classifier settings (overridable through the environment)
+INTENT_MODEL_PATH = os.getenv("INTENT_MODEL", DEFAULT_MODEL_PATH)
+INTENT_THRESHOLD = float(os.getenv("INTENT_THRESHOLD", "0.7"))
+# Only the start of a long query is read; pasted code adds little about intent
+MAX_TOKENS = int(os.getenv("INTENT_MAX_TOKENS", "256"))
+
+HASH_BITS = 20
+MAGIC = b"NBI1"
+
+def features(query, max_tokens=MAX_TOKENS):
+    """Hashed unigrams and bigrams of the query's word tokens."""
+    tokens = router.tokenize(query)[:max_tokens]
+    mask = (1 << HASH_BITS) - 1
+    hashed = [zlib.crc32(token) & mask for token in tokens]
+    hashed.extend(zlib.crc32(first + b" " + second) & mask for first, second in zip(tokens, tokens[1:]))
+    return hashed
+
+class IntentClassifier:
+    """
+    Multinomial naive Bayes over hashed word unigrams and bigrams. The
+    model is two flat arrays, the sorted feature hashes and their per-label
+    log likelihoods, so loading it is a couple of memory copies and a
+    prediction is one binary search per feature.
+    """
+
+    def __init__(self, labels, priors, hashes, weights):
+        self.labels = list(labels)
+        self.priors = list(priors)
+        self.hashes = hashes
+        self.weights = weights
+
+    @classmethod
+    def train(cls, examples, alpha=0.5):
+        """Trains on (query, label) pairs with Laplace smoothing `alpha`."""
+        labels = sorted({label for _, label in examples})
+        index = {label: i for i, label in enumerate(labels)}
+        docs = [0] * len(labels)
+        totals = [0] * len(labels)
+        counts = {}
+        for query, label in examples:
+            i = index[label]
+            docs[i] += 1
+            for feature in features(query):
+                row = counts.setdefault(feature, [0] * len(labels))
+                row[i] += 1
+                totals[i] += 1
+
+        vocabulary = len(counts)
+        hashes = array('I', sorted(counts))
+        weights = array('f')
+        for feature in hashes:
+            row = counts[feature]
+            weights.extend(math.log((row[i] + alpha) / (totals[i] + alpha * vocabulary)) for i in range(len(labels)))
+        priors = [math.log(count / len(examples)) for count in docs]
+        return cls(labels, priors, hashes, weights)
+
+    def save(self, path):
+        header = json.dumps({"labels": self.labels, "priors": self.priors, "features": len(self.hashes)}).encode("utf-8")
+        with open(path, 'wb') as f:
+            f.write(MAGIC + struct.pack("<I", len(header)) + header)
+            f.write(self.hashes.tobytes())
+            f.write(self.weights.tobytes())
+
+    @classmethod
+    def load(cls, path):
+        with open(path, 'rb') as f:
+            data = f.read()
+        if data[:4] != MAGIC:
+            raise ValueError(f"{path} is not an intent model")
+        (length,) = struct.unpack_from("<I", data, 4)
+        header = json.loads(data[8:8 + length])
+        start = 8 + length
+        hashes = array('I')
+        hashes.frombytes(data[start:start + 4 * header["features"]])
+        weights = array('f')
+        weights.frombytes(data[start + 4 * header["features"]:])
+        return cls(header["labels"], header["priors"], hashes, weights)
+
+    def predict_proba(self, query):
+        """The probability of every label for the query."""
+        width = len(self.labels)
+        scores = list(self.priors)
+        hashes, weights, count = self.hashes, self.weights, len(self.hashes)
+        for feature in features(query):
+            i = bisect_left(hashes, feature)
+            if i < count and hashes[i] == feature:
+                base = i * width
+                for j in range(width):
+                    scores[j] += weights[base + j]
+        top = max(scores)
+        exps = [math.exp(score - top) for score in scores]
+        total = sum(exps)
+        return {label: value / total for label, value in zip(self.labels, exps)}
+
+    def predict(self, query):
+        """The most likely label and its probability."""
+        probabilities = self.predict_proba(query)
+        label = max(probabilities, key=probabilities.get)
+        return label, probabilities[label]
+
+def load_examples(path):
+    """Reads {"query", "agent"} lines from a JSONL file as (query, agent) pairs."""
+    examples = []
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                record = json.loads(line)
+                examples.append((record["query"], record["agent"]))
+    return examples
+
+_classifier = None
+_classifier_loaded = False
+_classifier_lock = threading.Lock()
+
+def get_classifier():
+    """Returns the process-wide classifier, or None when no model file is available."""
+    global _classifier, _classifier_loaded
+    if not _classifier_loaded:
+        with _classifier_lock:
+            if not _classifier_loaded:
+                if INTENT_MODEL_PATH and os.path.exists(INTENT_MODEL_PATH):
+                    try:
+                        _classifier = IntentClassifier.load(INTENT_MODEL_PATH)
+                    except (OSError, ValueError) as e:
+                        logger.error(f"Error loading intent model {INTENT_MODEL_PATH}: {str(e)}")
+                _classifier_loaded = True
+    return _classifier
+
+def predict_agent(query, agents, threshold=None):
+    """
+    The classifier's agent for the query when it is at least `threshold`
+    confident and the agent is one of `agents`; otherwise None, and the
+    caller falls back to the keyword rules.
+    """
+    classifier = get_classifier()
+    if classifier is None:
+        return None
+    label, confidence = classifier.predict(query)
+    if confidence < (INTENT_THRESHOLD if threshold is None else threshold) or label not in agents:
+        return None
+    return label
@@ -0,0 +1,197 @@
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+import logging
+from collections import OrderedDict
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+# Cache settings (overridable through the environment)
+CACHE_ENABLED = os.getenv("LLM_CACHE", "1") != "0"
+CACHE_PATH = os.getenv("LLM_CACHE_PATH", "llm_cache.db")
+CACHE_TTL = float(os.getenv("LLM_CACHE_TTL", str(7 * 24 * 3600)))
+CACHE_MEMORY_ENTRIES = int(os.getenv("LLM_CACHE_MEMORY_ENTRIES", "512"))
+CACHE_MAX_ENTRIES = int(os.getenv("LLM_CACHE_MAX_ENTRIES", "20000"))
+
+# How many disk writes happen between eviction sweeps
+PRUNE_INTERVAL = 100
+
+def make_key(model, messages, temperature, max_tokens, **extra) -> str:
+    """Build a stable cache key from everything that affects the completion."""
+    payload = json.dumps(
+        {
+            "model": model,
+            "messages": messages,
+            "temperature": temperature,
+            "max_tokens": max_tokens,
+            "extra": extra
+        },
+        sort_keys=True,
+        default=str
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+class LLMCache:
+    """
+    Two-tier completion cache: an in-memory LRU in front of a SQLite table.
+    Entries expire after `ttl` seconds; the disk tier is trimmed to
+    `max_entries` by evicting the least recently used rows.
+    """
+
+    def __init__(self, path=CACHE_PATH, ttl=CACHE_TTL, memory_entries=CACHE_MEMORY_ENTRIES,
+                 max_entries=CACHE_MAX_ENTRIES):
+        self.path = path
+        self.ttl = ttl
+        self.memory_entries = memory_entries
+        self.max_entries = max_entries
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._conn = None
+        self._writes = 0
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _db(self):
+        if self._conn is None:
+            self._conn = sqlite3.connect(self.path, timeout=5, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS llm_cache (
+                    key TEXT PRIMARY KEY,
+                    value TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    accessed_at REAL NOT NULL
+                )
+            """)
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS llm_cache_accessed ON llm_cache (accessed_at)"
+            )
+            self._conn.commit()
+        return self._conn
+
+    def _remember(self, key, value, created_at):
+        self._memory[key] = (value, created_at)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_entries:
+            self._memory.popitem(last=False)
+
+    def get(self, key):
+        """Return the cached value for key, or None on a miss or expired entry."""
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                value, created_at = entry
+                if now - created_at <= self.ttl:
+                    self._memory.move_to_end(key)
+                    self.memory_hits += 1
+                    return value
+                del self._memory[key]
+
+            try:
+                db = self._db()
+                row = db.execute(
+                    "SELECT value, created_at FROM llm_cache WHERE key = ?", (key,)
+                ).fetchone()
+                if row is not None:
+                    value, created_at = row
+                    if now - created_at <= self.ttl:
+                        db.execute("UPDATE llm_cache SET accessed_at = ? WHERE key = ?", (now, key))
+                        db.commit()
+                        self._remember(key, value, created_at)
+                        self.disk_hits += 1
+                        return value
+                    db.execute("DELETE FROM llm_cache WHERE key = ?", (key,))
+                    db.commit()
+            except sqlite3.Error as e:
+                logger.error(f"Error reading LLM cache: {str(e)}")
+
+            self.misses += 1
+            return None
+
+    def set(self, key, value):
+        now = time.time()
+        with self._lock:
+            self._remember(key, value, now)
+            try:
+                db = self._db()
+                db.execute(
+                    "INSERT OR REPLACE INTO llm_cache (key, value, created_at, accessed_at) VALUES (?, ?, ?, ?)",
+                    (key, value, now, now)
+                )
+                db.commit()
+                self._writes += 1
+                if self._writes % PRUNE_INTERVAL == 0:
+                    self._prune(now)
+            except sqlite3.Error as e:
+                logger.error(f"Error writing LLM cache: {str(e)}")
+
+    def _prune(self, now):
+        db = self._db()
+        expired = db.execute("DELETE FROM llm_cache WHERE created_at < ?", (now - self.ttl,)).rowcount
+        count = db.execute("SELECT COUNT(*) FROM llm_cache").fetchone()[0]
+        overflow = max(0, count - self.max_entries)
+        if overflow:
+            db.execute(
+                "DELETE FROM llm_cache WHERE key IN "
+                "(SELECT key FROM llm_cache ORDER BY accessed_at ASC LIMIT ?)",
+                (overflow,)
+            )
+        db.commit()
+        self.evictions += expired + overflow
+
+    def prune(self):
+        """Drop expired rows and trim the disk tier to max_entries."""
+        with self._lock:
+            self._prune(time.time())
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+            db = self._db()
+            db.execute("DELETE FROM llm_cache")
+            db.commit()
+
+    def stats(self):
+        hits = self.memory_hits + self.disk_hits
+        lookups = hits + self.misses
+        return {
+            "hits": hits,
+            "memory_hits": self.memory_hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": hits / lookups if lookups else 0.0,
+            "memory_entries": len(self._memory)
+        }
+
+_cache = None
+_cache_lock = threading.Lock()
+
+def get_cache() -> LLMCache:
+    """Returns the process-wide completion cache."""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = LLMCache()
+    return _cache
+
+def should_cache(temperature, cache=None, stream=False) -> bool:
+    """
+    Decide whether a call may use the cache.
+    Deterministic (temperature 0) calls are cached unless the caller opts out;
+    sampled calls are only cached when the caller explicitly opts in.
+    """
+    if not CACHE_ENABLED or stream:
+        return False
+    if cache is not None:
+        return cache
+    return not temperature
@@ -0,0 +1,262 @@
+import os
+import time
+import threading
+import logging
+from contextlib import contextmanager
+import httpx
+from openai import OpenAI
+from openai.types.chat import ChatCompletion
+from dotenv import load_dotenv
+try:
+    from . import budget, llm_cache, rate_limiter, resilience, token_counter, usage_context
+    from .single_flight import SingleFlight
+except ImportError:
+    import budget
+    import llm_cache
+    import rate_limiter
+    import resilience
+    import token_counter
+    import usage_context
+    from single_flight import SingleFlight
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Load environment variables
+load_dotenv()
+
+OPENROUTER_BASE_URL = "https://openrouter.ai/api/v1"
+DEFAULT_MODEL = "openai/gpt-3.5-turbo"
+
+# Connection pool and timeout tuning, shared by every agent in the process
+MAX_CONNECTIONS = int(os.getenv("LLM_MAX_CONNECTIONS", "64"))
+MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("LLM_MAX_KEEPALIVE_CONNECTIONS", "32"))
+KEEPALIVE_EXPIRY = float(os.getenv("LLM_KEEPALIVE_EXPIRY", "90"))
+CONNECT_TIMEOUT = float(os.getenv("LLM_CONNECT_TIMEOUT", "5"))
+DEFAULT_TIMEOUT = float(os.getenv("LLM_TIMEOUT", "60"))
+# Retries are handled by agents/resilience.py, so the client itself does not retry
+MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "0"))
+
+_client = None
+_http_client = None
+_client_lock = threading.Lock()
+
+# Identical deterministic calls that are in flight at the same time share one request
+inflight_calls = SingleFlight()
+
+def get_base_url() -> str:
+    return os.getenv("OPENROUTER_BASE_URL", OPENROUTER_BASE_URL)
+
+def _build_http_client() -> httpx.Client:
+    return httpx.Client(
+        limits=httpx.Limits(
+            max_connections=MAX_CONNECTIONS,
+            max_keepalive_connections=MAX_KEEPALIVE_CONNECTIONS,
+            keepalive_expiry=KEEPALIVE_EXPIRY
+        ),
+        timeout=httpx.Timeout(DEFAULT_TIMEOUT, connect=CONNECT_TIMEOUT)
+    )
+
+def get_client(api_key: str = None) -> OpenAI:
+    """
+    Returns the process-wide OpenRouter client.
+    The client is created on first use and owns the shared HTTP connection pool.
+    Passing an api_key returns a derived client that reuses the same pool.
+    """
+    global _client, _http_client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _http_client = _build_http_client()
+                _client = OpenAI(
+                    api_key=os.getenv("OPENROUTER_API_KEY") or api_key,
+                    base_url=get_base_url(),
+                    http_client=_http_client,
+                    max_retries=MAX_RETRIES
+                )
+    if api_key and api_key != _client.api_key:
+        return _client.with_options(api_key=api_key)
+    return _client
+
+def warm_connection(timeout=CONNECT_TIMEOUT) -> int:
+    """
+    Opens a connection to the provider in the shared pool, TLS handshake
+    included, so the first LLM call does not pay for it. Any HTTP answer
+    counts; connection errors are raised.
+    """
+    get_client()
+    response = _http_client.head(get_base_url().rstrip("/") + "/models", timeout=timeout)
+    return response.status_code
+
+def close_client():
+    """Close the shared client and its connection pool."""
+    global _client, _http_client
+    with _client_lock:
+        if _client is not None:
+            _client.close()
+            _client = None
+            _http_client = None
+
+@contextmanager
+def provider_slot(messages, model, max_tokens, timeout):
+    """
+    Waits for room under the shared provider rate and concurrency limits.
+    The token budget is charged for the prompt plus max_tokens up front and
+    the unused part is refunded once the real usage is known.
+    """
+    if not rate_limiter.RATE_LIMIT_ENABLED:
+        yield {"actual_tokens": None}
+        return
+    # A cheap estimate is enough here; the actual usage is refunded after the call
+    estimate = token_counter.approx_message_tokens(messages) + (max_tokens or 0)
+    with rate_limiter.get_limiter().slot(estimate, timeout=timeout) as call:
+        yield call
+
+def chat_completion(messages, model=DEFAULT_MODEL, temperature=0, max_tokens=1000,
+                    timeout=None, api_key=None, cache=None, **kwargs):
+    """
+    Create a chat completion through the shared client.
+    `timeout` is the deadline in seconds for this call, defaulting to LLM_TIMEOUT.
+    `cache` forces the response cache on or off; by default only
+    temperature 0 calls are cached. Calls that miss the cache must fit the
+    spend budgets (see agents/budget.py) and may be moved to a cheaper model.
+    Returns the raw completion response.
+    """
+    timeout = timeout if timeout is not None else DEFAULT_TIMEOUT
+
+    def attempt():
+        with provider_slot(messages, model, max_tokens, timeout) as call:
+            start = time.monotonic()
+            response = get_client(api_key).chat.completions.create(
+                model=model,
+                messages=messages,
+                temperature=temperature,
+                max_tokens=max_tokens,
+                timeout=timeout,
+                **kwargs
+            )
+            latency = time.monotonic() - start
+            resilience.latencies.record(latency)
+            if response.usage:
+                call["actual_tokens"] = response.usage.total_tokens
+            usage_context.record_call(model, latency, response.usage, messages,
+                                      response.choices[0].message.content if response.choices else "")
+            return response
+
+    def create():
+        return resilience.call_with_retries(lambda: resilience.hedged(attempt))
+
+    if not llm_cache.should_cache(temperature, cache, kwargs.get("stream", False)):
+        model = budget.check(messages, model, max_tokens)
+        return create()
+
+    key = llm_cache.make_key(model, messages, temperature, max_tokens, **kwargs)
+    cached = llm_cache.get_cache().get(key)
+    if cached is not None:
+        return ChatCompletion.model_validate_json(cached)
+
+    admitted = budget.check(messages, model, max_tokens)
+    if admitted != model:
+        model = admitted
+        key = llm_cache.make_key(model, messages, temperature, max_tokens, **kwargs)
+
+    def create_and_store():
+        response = create()
+        llm_cache.get_cache().set(key, response.model_dump_json())
+        return response
+
+    return inflight_calls.do(key, create_and_store, timeout=timeout)
+
+def call_openrouter(prompt, system_prompt="You are a helpful assistant.", temperature=0,
+                    max_tokens=1000, model=DEFAULT_MODEL, timeout=None, cache=None):
+    try:
+        response = chat_completion(
+            [
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": prompt}
+            ],
+            model=model,
+            temperature=temperature,
+            max_tokens=max_tokens,
+            timeout=timeout,
+            cache=cache
+        )
+        return response.choices[0].message.content
+    except budget.BudgetExceeded:
+        raise
+    except Exception as e:
+        logger.error(f"Error calling OpenRouter: {str(e)}")
+        return f"Error: {str(e)}"
+
+def stream_chat_completion(messages, model=DEFAULT_MODEL, temperature=0, max_tokens=1000,
+                           timeout=None, api_key=None, **kwargs):
+    """
+    Stream a chat completion through the shared client.
+    Yields completion chunks as the provider emits them; the final chunk
+    carries the token usage for the whole call. Transient errors are
+    retried only until the first chunk has been yielded. The call is
+    recorded however the stream ends; when it stops before the usage chunk
+    the prompt and the text streamed so far are counted locally.
+    """
+    timeout = timeout if timeout is not None else DEFAULT_TIMEOUT
+    model = budget.check(messages, model, max_tokens)
+    attempt = 0
+    started = False
+    while True:
+        try:
+            with provider_slot(messages, model, max_tokens, timeout) as call:
+                start = time.monotonic()
+                stream = get_client(api_key).chat.completions.create(
+                    model=model,
+                    messages=messages,
+                    temperature=temperature,
+                    max_tokens=max_tokens,
+                    timeout=timeout,
+                    stream=True,
+                    stream_options={"include_usage": True},
+                    **kwargs
+                )
+                usage = None
+                parts = []
+                try:
+                    for chunk in stream:
+                        if chunk.usage:
+                            usage = chunk.usage
+                            call["actual_tokens"] = chunk.usage.total_tokens
+                        if chunk.choices and chunk.choices[0].delta.content:
+                            parts.append(chunk.choices[0].delta.content)
+                        started = True
+                        yield chunk
+                finally:
+                    stream.close()
+                    usage_context.record_call(model, time.monotonic() - start, usage, messages, "".join(parts))
+            return
+        except Exception as e:
+            if started or not resilience.should_retry(e, attempt):
+                raise
+            resilience.stats_counters.incr("retries")
+            time.sleep(resilience.backoff_delay(e, attempt))
+            attempt += 1
+
+def stream_openrouter(prompt, system_prompt="You are a helpful assistant.", temperature=0,
+                      max_tokens=1000, model=DEFAULT_MODEL, timeout=None):
+    """Yields the response text as it is generated."""
+    try:
+        for chunk in stream_chat_completion(
+            [
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": prompt}
+            ],
+            model=model,
+            temperature=temperature,
+            max_tokens=max_tokens,
+            timeout=timeout
+        ):
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
+    except budget.BudgetExceeded:
+        raise
+    except Exception as e:
+        logger.error(f"Error streaming from OpenRouter: {str(e)}")
+        yield f"Error: {str(e)}"
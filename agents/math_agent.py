@@ -6,60 +6,23 @@ from langchain_community.utilities import WikipediaAPIWrapper
 from langchain.agents.agent_types import AgentType
 from langchain.agents import Tool, initialize_agent
 from dotenv import load_dotenv
-import tiktoken
 from functools import lru_cache
-import json
-from datetime import datetime
-import os
+try:
+    from . import usage_context, usage_store
+except ImportError:
+    import usage_context
+    import usage_store
 
 # Load environment variables
 load_dotenv()
 
-# Initialize token counter
-def count_tokens(text: str) -> int:
-    encoding = tiktoken.encoding_for_model("gpt-3.5-turbo")
-    return len(encoding.encode(text))
-
-# Cost tracking
-class CostTracker:
-    def __init__(self):
-        self.total_tokens = 0
-        self.total_cost = 0
-        self.daily_usage = {}
-        self.load_usage()
-
-    def load_usage(self):
-        if os.path.exists('usage.json'):
-            with open('usage.json', 'r') as f:
-                data = json.load(f)
-                self.total_tokens = data.get('total_tokens', 0)
-                self.total_cost = data.get('total_cost', 0)
-                self.daily_usage = data.get('daily_usage', {})
-
-    def save_usage(self):
-        with open('usage.json', 'w') as f:
-            json.dump({
-                'total_tokens': self.total_tokens,
-                'total_cost': self.total_cost,
-                'daily_usage': self.daily_usage
-            }, f)
-
-    def track_usage(self, tokens: int):
-        today = datetime.now().strftime('%Y-%m-%d')
-        self.total_tokens += tokens
-        self.daily_usage[today] = self.daily_usage.get(today, 0) + tokens
-        # Calculate cost (GPT-3.5-turbo: $0.002 per 1K tokens)
-        self.total_cost = (self.total_tokens / 1000) * 0.002
-        self.save_usage()
-
-# Initialize cost tracker
-cost_tracker = CostTracker()
+LLM_MODEL = 'gpt-3.5-turbo-instruct'
 
 @cl.on_chat_start
 def math_chatbot():
     # Initialize OpenAI with cost-efficient settings
     llm = OpenAI(
-        model='gpt-3.5-turbo-instruct',
+        model=LLM_MODEL,
         temperature=0,
         max_tokens=500  # Limit response length to save tokens
     )
@@ -110,31 +73,26 @@ def math_chatbot():
         handle_parsing_errors=True
     )
 
-    # Store agent and cost tracker in session
+    # Store agent and cost tracker in session; usage goes to the store shared by every agent and process
     cl.user_session.set("agent", agent)
-    cl.user_session.set("cost_tracker", cost_tracker)
+    cl.user_session.set("cost_tracker", usage_store.CostTracker('math', session=cl.user_session.get("id")))
 
 @cl.on_message
 async def process_user_query(message: cl.Message):
     agent = cl.user_session.get("agent")
     cost_tracker = cl.user_session.get("cost_tracker")
 
-    # Track input tokens
-    input_tokens = count_tokens(message.content)
-    cost_tracker.track_usage(input_tokens)
-
-    # Process the query
-    response = await agent.acall(
-        message.content,
-        callbacks=[cl.AsyncLangchainCallbackHandler()]
-    )
-
-    # Track output tokens
-    output_tokens = count_tokens(response["output"])
-    cost_tracker.track_usage(output_tokens)
+    # Process the query; LangChain's calls bypass the shared client, so they are counted locally
+    with usage_context.track_usage() as usage:
+        response = await agent.acall(
+            message.content,
+            callbacks=[cl.AsyncLangchainCallbackHandler()]
+        )
+    usage.count_locally(message.content, response["output"], model=LLM_MODEL)
+    cost_tracker.track_request(usage)
 
     # Create response message with usage info
-    usage_info = f"\n\n---\n*Usage: {input_tokens + output_tokens} tokens (${(input_tokens + output_tokens)/1000*0.002:.4f})*"
+    usage_info = f"\n\n---\n*Usage: {usage.total_tokens} tokens (${usage.cost:.4f})*"
     
     await cl.Message(
         content=response["output"] + usage_info
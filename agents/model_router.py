@@ -0,0 +1,188 @@
+import os
+import re
+import json
+import logging
+import threading
+try:
+    from . import pricing, token_counter
+except ImportError:
+    import pricing
+    import token_counter
+
+logger = logging.getLogger(__name__)
+
+# Tiering settings (overridable through the environment)
+TIERING_ENABLED = os.getenv("LLM_TIERING", "1") != "0"
+FAST_MODEL = os.getenv("LLM_MODEL_FAST", "openai/gpt-4o-mini")
+STANDARD_MODEL = os.getenv("LLM_MODEL_STANDARD", "openai/gpt-3.5-turbo")
+STRONG_MODEL = os.getenv("LLM_MODEL_STRONG", "openai/gpt-4o")
+MODEL_REGISTRY_PATH = os.getenv("LLM_MODEL_REGISTRY")
+SIMPLE_QUERY_TOKENS = int(os.getenv("LLM_SIMPLE_QUERY_TOKENS", "200"))
+
+TIERS = ["fast", "standard", "strong"]
+
+# Which tier each kind of task starts on
+TASK_TIERS = {
+    "answer": "fast",
+    "language": "fast",
+    "routing": "fast",
+    "plan": "standard",
+    "replan": "standard",
+    "execute": "standard",
+    "research": "standard",
+    "code": "standard",
+    "math": "standard"
+}
+
+# Phrases that mark a query as too involved for the fast tier
+COMPLEX_QUERY_PATTERN = re.compile(
+    r"```|\bstep[- ]by[- ]step\b|\bin detail\b|\bcompare\b|\bprove\b|\banaly[sz]e\b|\bderive\b|\bdebug\b",
+    re.IGNORECASE
+)
+
+class ModelInfo:
+    """
+    A model's tier and context window, plus its observed latency. Prices
+    per 1K tokens come from the pricing registry unless given here.
+    """
+
+    def __init__(self, name, tier, input_price=None, output_price=None, context_window=4096):
+        self.name = name
+        self.tier = tier
+        self.price = pricing.ModelPrice(input_price, output_price) if input_price is not None else None
+        self.context_window = context_window
+        self.calls = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.avg_latency = None
+
+    def estimate_cost(self, prompt_tokens, completion_tokens) -> float:
+        price = self.price or pricing.get_pricing().price(self.name)
+        return price.cost(prompt_tokens, completion_tokens)
+
+    def stats(self):
+        return {
+            "tier": self.tier,
+            "calls": self.calls,
+            "prompt_tokens": self.prompt_tokens,
+            "completion_tokens": self.completion_tokens,
+            "cost": round(self.estimate_cost(self.prompt_tokens, self.completion_tokens), 6),
+            "avg_latency_ms": round(self.avg_latency * 1000, 1) if self.avg_latency is not None else None
+        }
+
+DEFAULT_MODELS = [
+    ModelInfo(FAST_MODEL, "fast", context_window=128000),
+    ModelInfo(STANDARD_MODEL, "standard", context_window=16385),
+    ModelInfo(STRONG_MODEL, "strong", context_window=128000)
+]
+
+class ModelRegistry:
+    """
+    Known models by name and tier. Latency and token counts are updated
+    from every completed call so cost and latency can be compared by tier.
+    """
+
+    def __init__(self, models=None):
+        self.models = {model.name: model for model in (models or DEFAULT_MODELS)}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_file(cls, path):
+        """
+        Loads models from a JSON list of {"name", "tier", "context_window"}
+        objects, on top of the defaults. Entries may also carry
+        "input_price", "output_price" and "cached_input_price"; these are
+        added to the pricing registry so calls are billed at the same rates.
+        """
+        with open(path, 'r', encoding='utf-8') as f:
+            entries = json.load(f)
+        models = {model.name: model for model in DEFAULT_MODELS}
+        for entry in entries:
+            if "input_price" in entry:
+                cached = entry.get("cached_input_price")
+                pricing.get_pricing().set(entry["name"], pricing.ModelPrice(
+                    float(entry["input_price"]),
+                    float(entry.get("output_price", entry["input_price"])),
+                    float(cached) if cached is not None else None
+                ))
+            models[entry["name"]] = ModelInfo(entry["name"], entry["tier"],
+                                              context_window=int(entry.get("context_window", 4096)))
+        return cls(list(models.values()))
+
+    def get(self, name):
+        return self.models.get(name)
+
+    def candidates(self, tier):
+        return [model for model in self.models.values() if model.tier == tier]
+
+    def record(self, name, latency=None, prompt_tokens=0, completion_tokens=0):
+        with self._lock:
+            model = self.models.get(name)
+            if model is None:
+                model = self.models[name] = ModelInfo(name, "unknown")
+            model.calls += 1
+            model.prompt_tokens += prompt_tokens
+            model.completion_tokens += completion_tokens
+            if latency is not None:
+                model.avg_latency = latency if model.avg_latency is None else 0.8 * model.avg_latency + 0.2 * latency
+
+    def stats(self):
+        with self._lock:
+            models = {name: model.stats() for name, model in self.models.items()}
+        tiers = {}
+        for stats in models.values():
+            tier = tiers.setdefault(stats["tier"], {"calls": 0, "prompt_tokens": 0, "completion_tokens": 0, "cost": 0.0})
+            for field in ("calls", "prompt_tokens", "completion_tokens", "cost"):
+                tier[field] += stats[field]
+        return {"tiering_enabled": TIERING_ENABLED, "models": models, "tiers": tiers}
+
+_registry = None
+_registry_lock = threading.Lock()
+
+def get_registry() -> ModelRegistry:
+    """Returns the process-wide model registry."""
+    global _registry
+    if _registry is None:
+        with _registry_lock:
+            if _registry is None:
+                _registry = ModelRegistry.from_file(MODEL_REGISTRY_PATH) if MODEL_REGISTRY_PATH else ModelRegistry()
+    return _registry
+
+def choose_tier(task, text="") -> str:
+    """Starts from the task's tier and escalates long or complex queries off the fast tier."""
+    tier = TASK_TIERS.get(task, "standard")
+    if tier == "fast" and text and (
+        token_counter.approx_tokens(text) > SIMPLE_QUERY_TOKENS or COMPLEX_QUERY_PATTERN.search(text)
+    ):
+        tier = "standard"
+    return tier
+
+def choose_model(task, text="", prompt_tokens=None, max_tokens=1000) -> str:
+    """
+    Picks the model for one call. Within a tier the cheapest model whose
+    context window fits the call wins, with observed latency breaking
+    ties; if none fits, the next tier up is tried.
+    """
+    if not TIERING_ENABLED:
+        return STANDARD_MODEL
+    registry = get_registry()
+    if prompt_tokens is None:
+        prompt_tokens = token_counter.approx_tokens(text)
+
+    for tier in TIERS[TIERS.index(choose_tier(task, text)):]:
+        fitting = [model for model in registry.candidates(tier)
+                   if prompt_tokens + max_tokens <= model.context_window]
+        if fitting:
+            best = min(fitting, key=lambda model: (
+                model.estimate_cost(prompt_tokens, max_tokens),
+                model.avg_latency if model.avg_latency is not None else 0.0
+            ))
+            return best.name
+    return STANDARD_MODEL
+
+def estimate_cost(model, prompt_tokens, completion_tokens, cached_tokens=0) -> float:
+    """Prices a call with the pricing registry's per-model rates."""
+    return pricing.price_call(model, prompt_tokens, completion_tokens, cached_tokens)
+
+def stats():
+    return get_registry().stats()
@@ -0,0 +1,130 @@
+import os
+import logging
+import threading
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+try:
+    from . import budget
+except ImportError:
+    import budget
+
+logger = logging.getLogger(__name__)
+
+# Plan execution settings (overridable through the environment); 1 runs one step at a time
+PLAN_PARALLELISM = int(os.getenv("PLAN_PARALLELISM", "4"))
+
+def dependencies_of(plan, dependencies):
+    """The dependencies of every step; a step the planner gave none for needs the step before it."""
+    dependencies = list(dependencies or ())
+    return [
+        [need for need in dependencies[i] if 0 <= need < i] if i < len(dependencies) else ([i - 1] if i else [])
+        for i in range(len(plan))
+    ]
+
+def ready_steps(plan, dependencies):
+    """Indices of the steps that need no other step of the plan, in plan order."""
+    return [i for i, needs in enumerate(dependencies_of(plan, dependencies)) if not needs]
+
+def remove_steps(plan, dependencies, done):
+    """The plan and dependencies left once the steps at `done` have run, renumbered."""
+    done = set(done)
+    kept = [i for i in range(len(plan)) if i not in done]
+    index = {old: new for new, old in enumerate(kept)}
+    dependencies = dependencies_of(plan, dependencies)
+    return ([plan[i] for i in kept],
+            [[index[need] for need in dependencies[i] if need in index] for i in kept])
+
+def run_wave(run, tasks, parallelism=None):
+    """
+    (task, output) for every task, running up to `parallelism` of them at
+    once. Each task runs in a copy of the caller's context, so its LLM calls
+    count towards the caller's usage, budget and retry allowance.
+    """
+    parallelism = PLAN_PARALLELISM if parallelism is None else parallelism
+    if len(tasks) <= 1 or parallelism <= 1:
+        return [(task, run(task)) for task in tasks]
+    with ThreadPoolExecutor(max_workers=min(parallelism, len(tasks)), thread_name_prefix="plan-step") as pool:
+        futures = [pool.submit(contextvars.copy_context().run, run, task) for task in tasks]
+        return [(task, future.result()) for task, future in zip(tasks, futures)]
+
+class _Stats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.plans = 0
+        self.waves = 0
+        self.steps = 0
+
+    def record(self, waves, steps):
+        with self._lock:
+            self.plans += 1
+            self.waves += waves
+            self.steps += steps
+
+_stats = _Stats()
+
+def run_plan(query, planner, executor, replanner, answerer, max_steps=None, parallelism=None):
+    """
+    Plans the query, then runs its steps in waves: every step whose
+    dependencies have run is executed at once, and the replanner is called
+    once per wave rather than once per step. Stops at a response, after
+    `max_steps` executed steps or when the budget runs out, falling back to
+    the answerer. Returns the final state, with the number of waves run.
+    """
+    max_steps = budget.MAX_EXECUTED_STEPS if max_steps is None else max_steps
+    state = {
+        "input": query,
+        "plan": [],
+        "dependencies": [],
+        "past_steps": [],
+        "response": "",
+        "waves": 0
+    }
+
+    # Get initial plan
+    plan_result = planner({"objective": query})
+    state["plan"] = plan_result.steps
+    state["dependencies"] = dependencies_of(plan_result.steps, getattr(plan_result, "dependencies", None))
+
+    # Execute waves until we get a response, the step cap is reached or the budget runs out
+    while state["plan"] and not state["response"]:
+        remaining = max_steps - len(state["past_steps"])
+        if remaining <= 0:
+            logger.warning(f"Multi-agent loop stopped after {max_steps} steps")
+            break
+        if budget.rejection() is not None:
+            break
+        wave = ready_steps(state["plan"], state["dependencies"])[:remaining]
+        tasks = [state["plan"][i] for i in wave]
+        state["past_steps"].extend(run_wave(lambda task: executor({"input": task})["output"], tasks, parallelism))
+        state["waves"] += 1
+
+        # Remove the executed steps
+        state["plan"], state["dependencies"] = remove_steps(state["plan"], state["dependencies"], wave)
+
+        # Replan or get response
+        replan_result = replanner(state)
+        if hasattr(replan_result, "response"):
+            state["response"] = replan_result.response
+        else:
+            state["plan"] = replan_result.steps
+            state["dependencies"] = dependencies_of(replan_result.steps, getattr(replan_result, "dependencies", None))
+
+    # If we still don't have a response, use the answerer
+    if not state["response"] and budget.rejection() is None:
+        answer_result = answerer({"input": query})
+        state["response"] = answer_result.response
+
+    _stats.record(state["waves"], len(state["past_steps"]))
+    return state
+
+def stats():
+    steps = _stats.steps
+    return {
+        "parallelism": PLAN_PARALLELISM,
+        "plans": _stats.plans,
+        "waves": _stats.waves,
+        "steps": steps,
+        # Every step after the first of a wave saves a replanner call
+        "replans_saved": steps - _stats.waves,
+        "steps_per_wave": steps / _stats.waves if _stats.waves else 0.0
+    }
@@ -1,12 +1,17 @@
-import os
-from openai import OpenAI
+import re
 from pydantic import BaseModel, Field
 from dotenv import load_dotenv
-import tiktoken
-from functools import lru_cache
-import json
-from datetime import datetime
 import logging
+try:
+    from . import llm_client, context_budget, model_router, route_cache, router, usage_context, usage_store
+except ImportError:
+    import llm_client
+    import context_budget
+    import model_router
+    import route_cache
+    import router
+    import usage_context
+    import usage_store
 
 # Set up logging
 logging.basicConfig(level=logging.INFO)
@@ -15,60 +20,8 @@ logger = logging.getLogger(__name__)
 # Load environment variables
 load_dotenv()
 
-# Configure OpenRouter
-client = OpenAI(
-    api_key=os.getenv("OPENROUTER_API_KEY"),
-    base_url="https://openrouter.ai/api/v1"
-)
-
-# Initialize token counter
-def count_tokens(text: str) -> int:
-    encoding = tiktoken.encoding_for_model("gpt-3.5-turbo")
-    return len(encoding.encode(text))
-
-# Cost tracking
-class CostTracker:
-    def __init__(self):
-        self.total_tokens = 0
-        self.total_cost = 0
-        self.daily_usage = {}
-        self.load_usage()
-
-    def load_usage(self):
-        if os.path.exists('usage.json'):
-            with open('usage.json', 'r') as f:
-                data = json.load(f)
-                self.total_tokens = data.get('total_tokens', 0)
-                self.total_cost = data.get('total_cost', 0)
-                self.daily_usage = data.get('daily_usage', {})
-
-    def save_usage(self):
-        with open('usage.json', 'w') as f:
-            json.dump({
-                'total_tokens': self.total_tokens,
-                'total_cost': self.total_cost,
-                'daily_usage': self.daily_usage
-            }, f)
-
-    def track_usage(self, tokens: int):
-        today = datetime.now().strftime('%Y-%m-%d')
-        self.total_tokens += tokens
-        self.daily_usage[today] = self.daily_usage.get(today, 0) + tokens
-        # Calculate cost (GPT-3.5-turbo: $0.002 per 1K tokens)
-        self.total_cost = (self.total_tokens / 1000) * 0.002
-        self.save_usage()
-
-    def get_usage_summary(self):
-        return f"""
-Usage Summary:
--------------
-Total Tokens: {self.total_tokens:,}
-Total Cost: ${self.total_cost:.4f}
-Today's Usage: {self.daily_usage.get(datetime.now().strftime('%Y-%m-%d'), 0):,} tokens
-"""
-
-# Initialize cost tracker
-cost_tracker = CostTracker()
+# Usage goes to the store shared by every agent and process
+cost_tracker = usage_store.CostTracker('planner')
 
 class Planner(BaseModel):
     """Plan the execution of the agent"""
@@ -76,27 +29,87 @@ class Planner(BaseModel):
     steps: list[str] = Field(
         description="The steps to execute the agent, should be in sorted order"
     )
+    dependencies: list[list[int]] = Field(
+        default_factory=list,
+        description="For every step, the indices of the earlier steps whose results it needs"
+    )
 
 class Response(BaseModel):
     """Response to user"""
     
     response: str
     
-def call_openrouter(prompt, system_prompt="You are a helpful assistant that can create plans and provide responses."):
-    try:
-        response = client.chat.completions.create(
-            model="openai/gpt-3.5-turbo",
-            messages=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": prompt}
-            ],
-            temperature=0.7,  # Increased temperature for more varied responses
-            max_tokens=1000
-        )
-        return response.choices[0].message.content
-    except Exception as e:
-        logger.error(f"Error calling OpenRouter: {str(e)}")
-        return f"Error: {str(e)}"
+def call_openrouter(prompt, system_prompt="You are a helpful assistant that can create plans and provide responses.", model=None):
+    # Increased temperature for more varied responses
+    return llm_client.call_openrouter(prompt, system_prompt, temperature=0.7, max_tokens=1000,
+                                      model=model or model_router.choose_model("plan"))
+
+# A step's dependencies, written after it as "(needs: 1, 3)" or "(needs: none)"
+_NEEDS = re.compile(r"\s*[(\[]\s*(?:needs|depends on)\b:?([^)\]]*)[)\]]\W*$", re.IGNORECASE)
+
+# A numbered or bulleted line, with the planner's own step number when it has one
+_LIST_ITEM = re.compile(r"^(?:(\d+)[.)]|[-*•→]|>>?)\s+")
+
+def parse_needs(step, numbers):
+    """
+    The step without its dependency annotation, and the indices of the
+    earlier steps it needs, or None when it is not annotated. `numbers`
+    maps the planner's numbers of the earlier steps to their indices, so
+    references to the step itself or to later steps are dropped and a plan
+    can never wait on itself.
+    """
+    match = _NEEDS.search(step)
+    if not match:
+        return step, None
+    needs = sorted({numbers[int(number)] for number in re.findall(r"\d+", match.group(1)) if int(number) in numbers})
+    return step[:match.start()].rstrip(), needs
+
+def parse_plan(response) -> Planner:
+    """
+    The steps of a numbered or bulleted plan and the earlier steps each
+    one needs. A step without a "(needs: ...)" annotation needs the step
+    before it, so a plan written without annotations runs one step at a time.
+    Lines around a list, such as "Here is the plan.", are not steps.
+    """
+    lines = [line.strip() for line in response.strip().split('\n') if line.strip()]
+    listed = any(_LIST_ITEM.match(line) for line in lines)
+    steps = []
+    dependencies = []
+    numbers = {}
+    
+    for line in lines:
+        item = _LIST_ITEM.match(line)
+        if item:
+            # Remove numbering/bullets
+            line = line[item.end():]
+        # Without a list, short sentences might be steps
+        elif listed or not ((line.endswith('.') or _NEEDS.search(line)) and len(line) < 100):
+            continue
+        
+        step, needs = parse_needs(line, numbers)
+        if needs is None:
+            needs = [len(steps) - 1] if steps else []
+        number = int(item.group(1)) if item and item.group(1) else len(steps) + 1
+        numbers[number] = len(steps)
+        steps.append(step)
+        dependencies.append(needs)
+    
+    # If no steps were found, treat the entire response as one step
+    if not steps:
+        return Planner(steps=[response], dependencies=[[]])
+    
+    return Planner(steps=steps, dependencies=dependencies)
+
+def format_plan(steps, dependencies=()):
+    """The plan as numbered steps with their "(needs: ...)" annotations, as the planner writes it."""
+    lines = []
+    for i, step in enumerate(steps):
+        needs = dependencies[i] if i < len(dependencies) else None
+        if needs is None:
+            lines.append(f"{i + 1}. {step}")
+        else:
+            lines.append(f"{i + 1}. {step} (needs: {', '.join(str(n + 1) for n in needs) or 'none'})")
+    return "\n".join(lines)
 
 def get_planner():
     """
@@ -113,7 +126,8 @@ Avoid unnecessary steps and aim to make the plan as short as possible. The resul
 
 Objective: {objective}
 
-Please provide a natural, conversational response with the steps. Don't use a rigid format or numbering unless it makes sense for the specific query.
+Please number the steps. Steps that don't need each other's results, such as looking up two different facts, are run at the same time,
+so end every step with the numbers of the earlier steps whose results it needs, like "(needs: 1, 2)", or "(needs: none)" if it needs none.
 """
         
         # Call OpenRouter with the prompt
@@ -122,33 +136,7 @@ Please provide a natural, conversational response with the steps. Don't use a ri
         
         # Extract steps from the response
         try:
-            # Try to identify steps in the response
-            lines = response.strip().split('\n')
-            steps = []
-            
-            for line in lines:
-                line = line.strip()
-                if not line:
-                    continue
-                
-                # Check for numbered or bulleted lists
-                if line.startswith(('1.', '2.', '3.', '4.', '5.', '6.', '7.', '8.', '9.', '0.', 
-                                   '-', '*', '•', '→', '>>', '>', '•')):
-                    # Remove numbering/bullets
-                    if '. ' in line:
-                        line = line.split('. ', 1)[1]
-                    elif ' ' in line:
-                        line = line.split(' ', 1)[1]
-                    steps.append(line)
-                # Check for sentences that might be steps
-                elif line.endswith('.') and len(line) < 100:
-                    steps.append(line)
-            
-            # If no steps were found, treat the entire response as one step
-            if not steps:
-                steps = [response]
-            
-            return Planner(steps=steps)
+            return parse_plan(response)
         except Exception as e:
             logger.error(f"Error parsing planner response: {str(e)}")
             # Return a simple plan if parsing fails
@@ -163,10 +151,13 @@ def get_replanner():
     def replanner(state_dict):
         input_text = state_dict.get("input", "")
         plan = state_dict.get("plan", "")
+        if isinstance(plan, list):
+            plan = format_plan(plan, state_dict.get("dependencies") or ())
         past_steps = state_dict.get("past_steps", "")
         
         # Create a prompt for the replanner
-        prompt = f"""
+        def build_prompt(executed_steps):
+            return f"""
 Your task is to revise the current plan based on the executed steps. Remove any steps that have been completed and ensure the remaining steps will lead to the complete answer for the objective. Remember, the objective should be fully answered, not just partially. If the answer is already found in the executed steps, return the answer to the objective.
 
 Objective:
@@ -176,14 +167,19 @@ Current Plan:
 {plan}
 
 Executed Steps:
-{past_steps}
+{executed_steps}
 
-Please provide a natural, conversational response. If you're providing a final answer, give it directly. If you're updating the plan, explain what steps remain in a natural way.
+Please provide a natural, conversational response. If you're providing a final answer, give it directly. If you're updating the plan, number the remaining steps from 1 and end every step with the steps it needs, like "(needs: 1)" or "(needs: none)".
 """
         
-        # Call OpenRouter with the prompt
         system_prompt = "You are a helpful assistant that revises plans or provides final answers in a natural, conversational way."
-        response = call_openrouter(prompt, system_prompt)
+        
+        # Trim the executed steps to the prompt's token budget, keeping the most recent ones
+        budget = context_budget.prompt_budget(system_prompt, build_prompt(""), max_tokens=1000)
+        past_steps = context_budget.ContextAssembler(budget).add_steps(past_steps).assemble().text("steps")
+        
+        # Call OpenRouter with the prompt
+        response = call_openrouter(build_prompt(past_steps), system_prompt, model=model_router.choose_model("replan"))
         
         # Determine if this is a response or updated plan
         try:
@@ -192,32 +188,7 @@ Please provide a natural, conversational response. If you're providing a final a
                 return Response(response=response)
             
             # Otherwise, treat as an updated plan
-            lines = response.strip().split('\n')
-            steps = []
-            
-            for line in lines:
-                line = line.strip()
-                if not line:
-                    continue
-                
-                # Check for numbered or bulleted lists
-                if line.startswith(('1.', '2.', '3.', '4.', '5.', '6.', '7.', '8.', '9.', '0.', 
-                                   '-', '*', '•', '→', '>>', '>', '•')):
-                    # Remove numbering/bullets
-                    if '. ' in line:
-                        line = line.split('. ', 1)[1]
-                    elif ' ' in line:
-                        line = line.split(' ', 1)[1]
-                    steps.append(line)
-                # Check for sentences that might be steps
-                elif line.endswith('.') and len(line) < 100:
-                    steps.append(line)
-            
-            # If no steps were found, treat the entire response as one step
-            if not steps:
-                steps = [response]
-            
-            return Planner(steps=steps)
+            return parse_plan(response)
         except Exception as e:
             logger.error(f"Error parsing replanner response: {str(e)}")
             # Return a simple response if parsing fails
@@ -225,15 +196,10 @@ Please provide a natural, conversational response. If you're providing a final a
     
     return replanner
 
-def get_answerer():
-    """
-    Returns a function that can be used to answer any question directly.
-    """
-    def answerer(query_dict):
-        query = query_dict.get("input", "")
-        
-        # Create a prompt for the answerer
-        prompt = f"""
+ANSWERER_SYSTEM_PROMPT = "You are a helpful assistant that provides comprehensive answers in a natural, conversational tone. Adapt your response style to match the query."
+
+def answerer_prompt(query):
+    return f"""
 Please provide a comprehensive answer to the following question or request.
 If the question requires factual information, provide accurate details.
 If the question is about a task or process, provide step-by-step instructions.
@@ -243,15 +209,29 @@ Question: {query}
 
 Please provide a detailed and helpful response in a natural, conversational tone. Adapt your response style to match the query - be formal for serious topics, friendly for casual questions, etc.
 """
+
+def get_answerer():
+    """
+    Returns a function that can be used to answer any question directly.
+    """
+    def answerer(query_dict):
+        query = query_dict.get("input", "")
         
-        # Call OpenRouter with the prompt
-        system_prompt = "You are a helpful assistant that provides comprehensive answers in a natural, conversational tone. Adapt your response style to match the query."
-        response = call_openrouter(prompt, system_prompt)
+        # Call OpenRouter with the prompt; simple questions go to the fast tier
+        model = model_router.choose_model("answer", query)
+        response = call_openrouter(answerer_prompt(query), ANSWERER_SYSTEM_PROMPT, model=model)
         
         return Response(response=response)
     
     return answerer
 
+def stream_answer(query):
+    """
+    Yields the answerer's response text as it is generated.
+    """
+    return llm_client.stream_openrouter(answerer_prompt(query), ANSWERER_SYSTEM_PROMPT, temperature=0.7, max_tokens=1000,
+                                       model=model_router.choose_model("answer", query))
+
 # Testing
 if __name__ == "__main__":
     print("Planner Agent CLI")
@@ -277,31 +257,22 @@ if __name__ == "__main__":
             
             print("\nProcessing your query...")
             
-            # Track input tokens
-            input_tokens = count_tokens(user_input)
-            cost_tracker.track_usage(input_tokens)
-            
-            # Determine if this is a planning request or a direct question
-            if any(keyword in user_input.lower() for keyword in ["how to", "steps", "plan", "process", "guide", "instructions"]):
-                # Get the plan
-                plan_result = planner({"objective": user_input})
-                print("\nPlan:")
-                # Print the steps in a more natural way
-                for i, step in enumerate(plan_result.steps, 1):
-                    print(f"{i}. {step}")
-                
-                # Track output tokens
-                output_tokens = count_tokens("\n".join(plan_result.steps))
-            else:
-                # Get direct answer
-                answer_result = answerer({"input": user_input})
-                print(f"\nAnswer: {answer_result.response}")
-                
-                # Track output tokens
-                output_tokens = count_tokens(answer_result.response)
+            # Determine if this is a planning request or a direct question, collecting the usage of every LLM call
+            with usage_context.track_usage() as usage:
+                if route_cache.route("planner", user_input, lambda text: "planner" in router.match(text)):
+                    # Get the plan
+                    plan_result = planner({"objective": user_input})
+                    print("\nPlan:")
+                    # Print the steps in a more natural way
+                    for i, step in enumerate(plan_result.steps, 1):
+                        print(f"{i}. {step}")
+                else:
+                    # Get direct answer
+                    answer_result = answerer({"input": user_input})
+                    print(f"\nAnswer: {answer_result.response}")
             
-            cost_tracker.track_usage(output_tokens)
-            print(f"\nUsage: {input_tokens + output_tokens} tokens (${(input_tokens + output_tokens)/1000*0.002:.4f})")
+            cost_tracker.track_request(usage)
+            print(f"\nUsage: {usage.total_tokens} tokens (${usage.cost:.4f})")
             
         except KeyboardInterrupt:
             print("\n\nExiting...")
@@ -0,0 +1,151 @@
+import os
+import time
+import logging
+import importlib
+import threading
+try:
+    from . import registry
+except ImportError:
+    import registry
+
+logger = logging.getLogger(__name__)
+
+# Prewarm settings (overridable through the environment)
+PREWARM_ENABLED = os.getenv("PREWARM", "1") != "0"
+# Agents imported before the server reports ready, most used first
+PREWARM_AGENTS = [name.strip() for name in os.getenv(
+    "PREWARM_AGENTS", "answerer,research,math,planner,multi_agent,coding,concept_chart").split(",") if name.strip()]
+# Resources that must be warm before the server reports ready; the rest are warmed on a best-effort basis
+PREWARM_REQUIRED = [name.strip() for name in os.getenv("PREWARM_REQUIRED", "agents,provider").split(",") if name.strip()]
+# Seconds between attempts at a required resource that failed to warm
+PREWARM_RETRY_INTERVAL = float(os.getenv("PREWARM_RETRY_INTERVAL", "15"))
+
+def _module(name):
+    # Imported when warmed, so that importing this module stays cheap
+    return importlib.import_module(f"{__package__}.{name}" if __package__ else name)
+
+def warm_agents():
+    for name in PREWARM_AGENTS:
+        registry.load(name)
+
+def warm_provider():
+    # The shared client's pool keeps the connection, and its TLS session, for the first LLM call
+    _module("llm_client").warm_connection()
+
+def warm_tokenizer():
+    _module("token_counter").load_encoding()
+
+def warm_wikipedia():
+    for name in ("math", "research"):
+        if name in PREWARM_AGENTS:
+            registry.load(name).get_wikipedia()
+
+def warm_concept_chart():
+    if "concept_chart" in PREWARM_AGENTS:
+        registry.load("concept_chart").initialize_agent()
+
+# Resources in the order they are warmed
+RESOURCES = [
+    ("agents", warm_agents),
+    ("provider", warm_provider),
+    ("tokenizer", warm_tokenizer),
+    ("wikipedia", warm_wikipedia),
+    ("concept_chart", warm_concept_chart)
+]
+
+class Prewarmer:
+    """
+    Warms agents, the provider connection, the tokenizer, the Wikipedia
+    wrappers and the concept chart chains in a background thread, so the
+    server can accept connections meanwhile. It is ready once every
+    required resource is warm; a required resource that fails is retried
+    every `retry_interval` seconds.
+    """
+
+    def __init__(self, resources=RESOURCES, required=PREWARM_REQUIRED, retry_interval=PREWARM_RETRY_INTERVAL):
+        self.resources = list(resources)
+        self.required = set(required)
+        self.retry_interval = retry_interval
+        self._lock = threading.Lock()
+        self._thread = None
+        self._started_at = None
+        self._state = {
+            name: {"state": "pending", "required": name in self.required}
+            for name, _ in self.resources
+        }
+
+    def start(self):
+        """Starts warming in a background thread; later calls do nothing."""
+        with self._lock:
+            if self._thread is not None:
+                return False
+            self._started_at = time.monotonic()
+            self._thread = threading.Thread(target=self._run, name="prewarm", daemon=True)
+            self._thread.start()
+        return True
+
+    def _warm(self, name, warm):
+        start = time.perf_counter()
+        try:
+            warm()
+        except Exception as e:
+            logger.warning(f"Could not warm {name}: {str(e)}")
+            self._state[name] = dict(self._state[name], state="failed", error=str(e))
+            return False
+        elapsed = round((time.perf_counter() - start) * 1000, 1)
+        self._state[name] = {"state": "warm", "required": name in self.required, "ms": elapsed}
+        logger.info(f"Warmed {name} in {elapsed:.0f} ms")
+        return True
+
+    def _run(self):
+        failed = [(name, warm) for name, warm in self.resources if not self._warm(name, warm)]
+        if self.ready:
+            logger.info(f"Ready after {time.monotonic() - self._started_at:.1f} s of prewarming")
+        # Required resources are retried until they warm; the others stay failed
+        failed = [(name, warm) for name, warm in failed if name in self.required]
+        while failed:
+            time.sleep(self.retry_interval)
+            failed = [(name, warm) for name, warm in failed if not self._warm(name, warm)]
+            if not failed:
+                logger.info(f"Ready after {time.monotonic() - self._started_at:.1f} s of prewarming")
+
+    @property
+    def started(self) -> bool:
+        return self._thread is not None
+
+    @property
+    def ready(self) -> bool:
+        return self.started and all(
+            self._state[name]["state"] == "warm" for name in self.required if name in self._state
+        )
+
+    def status(self):
+        return {
+            "ready": self.ready,
+            "started": self.started,
+            "seconds": round(time.monotonic() - self._started_at, 1) if self._started_at else None,
+            "resources": {name: dict(state) for name, state in self._state.items()}
+        }
+
+_prewarmer = None
+_prewarmer_lock = threading.Lock()
+
+def get_prewarmer() -> Prewarmer:
+    """Returns the process-wide prewarmer."""
+    global _prewarmer
+    if _prewarmer is None:
+        with _prewarmer_lock:
+            if _prewarmer is None:
+                _prewarmer = Prewarmer()
+    return _prewarmer
+
+def start():
+    """Starts the process-wide prewarm unless PREWARM=0."""
+    if PREWARM_ENABLED:
+        get_prewarmer().start()
+
+def status():
+    """The prewarm status; a process that does not prewarm is always ready."""
+    if not PREWARM_ENABLED:
+        return {"ready": True, "started": False, "seconds": None, "resources": {}}
+    return get_prewarmer().status()
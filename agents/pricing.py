@@ -0,0 +1,112 @@
+import os
+import json
+import threading
+
+# Pricing settings (overridable through the environment)
+PRICING_PATH = os.getenv("LLM_PRICING")
+
+# Price per 1K tokens assumed for models missing from the registry (GPT-3.5-turbo's old rate)
+UNKNOWN_MODEL_PRICE = 0.002
+
+class ModelPrice:
+    """Price per 1K input, output and cached input tokens."""
+
+    def __init__(self, input_price, output_price, cached_input_price=None):
+        self.input_price = input_price
+        self.output_price = output_price
+        # Providers without prompt caching bill cached tokens as ordinary input
+        self.cached_input_price = input_price if cached_input_price is None else cached_input_price
+
+    def cost(self, prompt_tokens, completion_tokens, cached_tokens=0) -> float:
+        cached_tokens = min(cached_tokens, prompt_tokens)
+        return ((prompt_tokens - cached_tokens) * self.input_price
+                + cached_tokens * self.cached_input_price
+                + completion_tokens * self.output_price) / 1000
+
+    def to_dict(self):
+        return {
+            "input": self.input_price,
+            "output": self.output_price,
+            "cached_input": self.cached_input_price
+        }
+
+UNKNOWN_PRICE = ModelPrice(UNKNOWN_MODEL_PRICE, UNKNOWN_MODEL_PRICE)
+
+# Published list prices per 1K tokens, keyed by OpenRouter model id
+DEFAULT_PRICES = {
+    "openai/gpt-4o-mini": ModelPrice(0.00015, 0.0006, 0.000075),
+    "openai/gpt-4o": ModelPrice(0.0025, 0.01, 0.00125),
+    "openai/gpt-4-turbo": ModelPrice(0.01, 0.03),
+    "openai/gpt-3.5-turbo": ModelPrice(0.0005, 0.0015),
+    "openai/gpt-3.5-turbo-instruct": ModelPrice(0.0015, 0.002),
+    "anthropic/claude-3.5-sonnet": ModelPrice(0.003, 0.015, 0.0003),
+    "anthropic/claude-3-haiku": ModelPrice(0.00025, 0.00125, 0.00003)
+}
+
+class PricingRegistry:
+    """
+    Prices by model id. Ids are matched exactly first, then without the
+    provider prefix, so "gpt-4o" and "openai/gpt-4o" share a price.
+    """
+
+    def __init__(self, prices=None):
+        self.prices = dict(DEFAULT_PRICES if prices is None else prices)
+        self._by_name = {model.split("/", 1)[-1]: price for model, price in self.prices.items()}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_file(cls, path):
+        """
+        Loads prices from a JSON object mapping model ids to {"input",
+        "output", "cached_input"} prices per 1K tokens, on top of the defaults.
+        """
+        with open(path, 'r', encoding='utf-8') as f:
+            entries = json.load(f)
+        prices = dict(DEFAULT_PRICES)
+        for model, entry in entries.items():
+            cached = entry.get("cached_input")
+            prices[model] = ModelPrice(
+                float(entry.get("input", 0)),
+                float(entry.get("output", 0)),
+                float(cached) if cached is not None else None
+            )
+        return cls(prices)
+
+    def get(self, model):
+        """Returns the model's price, or None when it is unknown."""
+        if not model:
+            return None
+        price = self.prices.get(model)
+        if price is None:
+            price = self._by_name.get(model.split("/", 1)[-1])
+        return price
+
+    def price(self, model) -> ModelPrice:
+        return self.get(model) or UNKNOWN_PRICE
+
+    def set(self, model, price):
+        with self._lock:
+            self.prices[model] = price
+            self._by_name[model.split("/", 1)[-1]] = price
+
+    def stats(self):
+        return {
+            "unknown_model_price": UNKNOWN_MODEL_PRICE,
+            "models": {model: price.to_dict() for model, price in sorted(self.prices.items())}
+        }
+
+_pricing = None
+_pricing_lock = threading.Lock()
+
+def get_pricing() -> PricingRegistry:
+    """Returns the process-wide pricing registry."""
+    global _pricing
+    if _pricing is None:
+        with _pricing_lock:
+            if _pricing is None:
+                _pricing = PricingRegistry.from_file(PRICING_PATH) if PRICING_PATH else PricingRegistry()
+    return _pricing
+
+def price_call(model, prompt_tokens, completion_tokens, cached_tokens=0) -> float:
+    """Prices one call with the model's input, output and cached input rates."""
+    return get_pricing().price(model).cost(prompt_tokens, completion_tokens, cached_tokens)
@@ -0,0 +1,195 @@
+import os
+import time
+import threading
+from contextlib import contextmanager
+
+# Provider pacing settings (overridable through the environment)
+RATE_LIMIT_ENABLED = os.getenv("LLM_RATE_LIMIT", "1") != "0"
+REQUESTS_PER_SECOND = float(os.getenv("LLM_RATE_LIMIT_RPS", "10"))
+TOKENS_PER_MINUTE = float(os.getenv("LLM_RATE_LIMIT_TPM", "200000"))
+INITIAL_CONCURRENCY = float(os.getenv("LLM_INITIAL_CONCURRENCY", "8"))
+MIN_CONCURRENCY = float(os.getenv("LLM_MIN_CONCURRENCY", "1"))
+MAX_CONCURRENCY = float(os.getenv("LLM_MAX_CONCURRENCY", "32"))
+
+class LimiterTimeout(TimeoutError):
+    """Raised when a call cannot get provider capacity before its deadline."""
+
+class TokenBucket:
+    """
+    Token bucket that refills at `rate` units per second up to `capacity`.
+    Reservations may drive the balance negative; the caller then waits for
+    the debt to be paid back, which keeps waiters in arrival order.
+    """
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def reserve(self, amount) -> float:
+        """Take `amount` from the bucket and return how long to wait before using it."""
+        with self._lock:
+            self._refill(time.monotonic())
+            self.tokens -= min(amount, self.capacity)
+            return max(0.0, -self.tokens / self.rate)
+
+    def refund(self, amount):
+        """Give back part of a reservation that turned out not to be needed."""
+        with self._lock:
+            self._refill(time.monotonic())
+            self.tokens = min(self.capacity, self.tokens + amount)
+
+class AdaptiveConcurrencyLimiter:
+    """
+    AIMD concurrency limit for provider calls.
+    The limit grows by roughly one slot per limit's worth of successful
+    calls and is cut multiplicatively on a 429 or a latency spike (a call
+    slower than `spike_factor` times the moving average latency).
+    """
+
+    def __init__(self, initial=INITIAL_CONCURRENCY, minimum=MIN_CONCURRENCY, maximum=MAX_CONCURRENCY,
+                 backoff=0.5, spike_factor=2.5, spike_backoff=0.9):
+        self.limit = initial
+        self.minimum = minimum
+        self.maximum = maximum
+        self.backoff = backoff
+        self.spike_factor = spike_factor
+        self.spike_backoff = spike_backoff
+        self.in_flight = 0
+        self.waiting = 0
+        self.avg_latency = None
+        self.rate_limited = 0
+        self.latency_spikes = 0
+        self._condition = threading.Condition()
+
+    def acquire(self, timeout=None):
+        deadline = time.monotonic() + timeout if timeout is not None else None
+        with self._condition:
+            self.waiting += 1
+            try:
+                while self.in_flight >= max(1, int(self.limit)):
+                    remaining = deadline - time.monotonic() if deadline is not None else None
+                    if remaining is not None and remaining <= 0:
+                        raise LimiterTimeout("Timed out waiting for a provider concurrency slot")
+                    self._condition.wait(remaining)
+                self.in_flight += 1
+            finally:
+                self.waiting -= 1
+
+    def release(self, latency, rate_limited=False):
+        with self._condition:
+            self.in_flight -= 1
+            if rate_limited:
+                self.rate_limited += 1
+                self.limit = max(self.minimum, self.limit * self.backoff)
+            elif self.avg_latency is not None and latency > self.avg_latency * self.spike_factor:
+                self.latency_spikes += 1
+                self.limit = max(self.minimum, self.limit * self.spike_backoff)
+            else:
+                self.limit = min(self.maximum, self.limit + 1.0 / max(self.limit, 1.0))
+            if not rate_limited:
+                self.avg_latency = latency if self.avg_latency is None else 0.9 * self.avg_latency + 0.1 * latency
+            self._condition.notify_all()
+
+class ProviderLimiter:
+    """
+    Paces provider calls by requests per second and estimated tokens per
+    minute, and bounds how many run at once with an adaptive limit.
+    """
+
+    def __init__(self, requests_per_second=REQUESTS_PER_SECOND, tokens_per_minute=TOKENS_PER_MINUTE,
+                 concurrency=None):
+        self.requests = TokenBucket(requests_per_second, max(1.0, requests_per_second))
+        self.tokens = TokenBucket(tokens_per_minute / 60.0, tokens_per_minute)
+        self.concurrency = concurrency or AdaptiveConcurrencyLimiter()
+        self._lock = threading.Lock()
+        self.pacing = 0
+        self.calls = 0
+        self.throttled = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    @contextmanager
+    def slot(self, estimated_tokens, timeout=None):
+        """
+        Waits for capacity, then runs the body as one provider call.
+        Use the yielded dict to report `actual_tokens` once they are known;
+        the unused part of the estimate is returned to the token budget.
+        """
+        start = time.monotonic()
+        wait = max(self.requests.reserve(1), self.tokens.reserve(estimated_tokens))
+        if timeout is not None and wait > timeout:
+            self.requests.refund(1)
+            self.tokens.refund(estimated_tokens)
+            raise LimiterTimeout(f"Provider budget exhausted for the next {wait:.1f}s")
+        if wait:
+            with self._lock:
+                self.pacing += 1
+            try:
+                time.sleep(wait)
+            finally:
+                with self._lock:
+                    self.pacing -= 1
+        remaining = timeout - (time.monotonic() - start) if timeout is not None else None
+        try:
+            self.concurrency.acquire(remaining)
+        except LimiterTimeout:
+            # The call never ran, so its reservations go back to the buckets
+            self.requests.refund(1)
+            self.tokens.refund(estimated_tokens)
+            raise
+
+        waited = time.monotonic() - start
+        with self._lock:
+            self.calls += 1
+            self.total_wait += waited
+            self.max_wait = max(self.max_wait, waited)
+            if waited > 0.001:
+                self.throttled += 1
+
+        call = {"actual_tokens": None}
+        started = time.monotonic()
+        rate_limited = False
+        try:
+            yield call
+        except Exception as e:
+            rate_limited = getattr(e, "status_code", None) == 429
+            raise
+        finally:
+            self.concurrency.release(time.monotonic() - started, rate_limited=rate_limited)
+            if call["actual_tokens"] is not None and call["actual_tokens"] < estimated_tokens:
+                self.tokens.refund(estimated_tokens - call["actual_tokens"])
+
+    def stats(self):
+        concurrency = self.concurrency
+        return {
+            "enabled": RATE_LIMIT_ENABLED,
+            "queue_depth": concurrency.waiting + self.pacing,
+            "in_flight": concurrency.in_flight,
+            "concurrency_limit": round(concurrency.limit, 2),
+            "avg_latency_ms": round(concurrency.avg_latency * 1000, 1) if concurrency.avg_latency else None,
+            "calls": self.calls,
+            "throttled_calls": self.throttled,
+            "avg_wait_ms": round(self.total_wait / self.calls * 1000, 1) if self.calls else 0.0,
+            "max_wait_ms": round(self.max_wait * 1000, 1),
+            "rate_limited": concurrency.rate_limited,
+            "latency_spikes": concurrency.latency_spikes
+        }
+
+_limiter = None
+_limiter_lock = threading.Lock()
+
+def get_limiter() -> ProviderLimiter:
+    """Returns the process-wide provider limiter."""
+    global _limiter
+    if _limiter is None:
+        with _limiter_lock:
+            if _limiter is None:
+                _limiter = ProviderLimiter()
+    return _limiter
@@ -0,0 +1,146 @@
+import time
+import logging
+import importlib
+import threading
+
+logger = logging.getLogger(__name__)
+
+class AgentSpec:
+    """
+    Where an agent lives: its module, relative to this package, and the
+    names of its entry points in that module, with any agents it needs.
+    """
+
+    def __init__(self, name, module, entry_points, description="", requires=(), aliases=()):
+        self.name = name
+        self.module = module
+        self.entry_points = dict(entry_points)
+        self.description = description
+        self.requires = tuple(requires)
+        self.aliases = tuple(aliases)
+
+# Every agent the entry points serve. Nothing here is imported until an entry point is first used
+AGENTS = [
+    AgentSpec("coding", "coding_agent_cli",
+              {"generate": "generate_code", "explain": "explain_code", "debug": "debug_code"},
+              "Generates, explains and debugs code"),
+    AgentSpec("math", "executor", {"init": "get_executor", "stream": "stream_query"},
+              "Solves calculations and answers with Wikipedia context", aliases=("executor",)),
+    AgentSpec("research", "research_agent_cli", {"run": "research_topic", "stream": "stream_research"},
+              "Summarizes Wikipedia research"),
+    AgentSpec("planner", "planner", {"init": "get_planner"}, "Breaks an objective into steps"),
+    AgentSpec("answerer", "planner", {"init": "get_answerer", "stream": "stream_answer"}, "Answers directly"),
+    AgentSpec("multi_agent", "planner", {"replanner": "get_replanner"},
+              "Plans, executes and replans until the objective is met",
+              requires=("planner", "math", "answerer"), aliases=("multi-agent",)),
+    AgentSpec("concept_chart", "concept_chart_agent", {"run": "process_query"},
+              "Draws concept maps and charts with matplotlib"),
+    AgentSpec("language", "language_agent_cli",
+              {"detect": "detect_language", "translate": "translate_text", "correct": "correct_text"},
+              "Detects, translates and corrects text")
+]
+
+class AgentRegistry:
+    """
+    Imports an agent's module the first time one of its entry points is
+    called, so a process only pays for the agents it serves. The import
+    time of every loaded agent is kept for the startup benchmark.
+    """
+
+    def __init__(self, specs=AGENTS, package=__package__):
+        self.specs = {}
+        for spec in specs:
+            self.specs[spec.name] = spec
+            for alias in spec.aliases:
+                self.specs[alias] = spec
+        self.package = package
+        self._modules = {}
+        self._load_times = {}
+        # One lock per agent, so a request is not held up while another agent loads
+        self._locks = {spec.name: threading.Lock() for spec in specs}
+
+    def spec(self, name) -> AgentSpec:
+        if name not in self.specs:
+            raise KeyError(f"Unknown agent: {name}")
+        return self.specs[name]
+
+    def _import(self, module):
+        return importlib.import_module(f"{self.package}.{module}" if self.package else module)
+
+    def load(self, name):
+        """Imports an agent and the agents it needs, returning its module."""
+        spec = self.spec(name)
+        module = self._modules.get(spec.name)
+        if module is not None:
+            return module
+        for required in spec.requires:
+            self.load(required)
+        with self._locks[spec.name]:
+            if spec.name not in self._modules:
+                start = time.perf_counter()
+                module = self._import(spec.module)
+                self._load_times[spec.name] = time.perf_counter() - start
+                self._modules[spec.name] = module
+                logger.info(f"Loaded {spec.name} agent in {self._load_times[spec.name] * 1000:.0f} ms")
+            return self._modules[spec.name]
+
+    def get(self, name, entry_point):
+        """The entry point function of an agent, importing the agent if needed."""
+        spec = self.spec(name)
+        if entry_point not in spec.entry_points:
+            raise KeyError(f"The {spec.name} agent has no {entry_point} entry point")
+        return getattr(self.load(name), spec.entry_points[entry_point])
+
+    def entry(self, name, entry_point):
+        """A stand-in for an entry point that loads the agent when first called."""
+        spec = self.spec(name)
+        if entry_point not in spec.entry_points:
+            raise KeyError(f"The {spec.name} agent has no {entry_point} entry point")
+        return LazyEntry(self, name, entry_point)
+
+    def loaded(self, name) -> bool:
+        return self.spec(name).name in self._modules
+
+    def stats(self):
+        agents = {}
+        for name, spec in self.specs.items():
+            if name != spec.name:
+                continue
+            agents[name] = {
+                "module": spec.module,
+                "description": spec.description,
+                "loaded": name in self._modules
+            }
+            if name in self._load_times:
+                agents[name]["load_ms"] = round(self._load_times[name] * 1000, 1)
+        return agents
+
+class LazyEntry:
+    """Calls an agent's entry point, importing the agent on the first call."""
+
+    def __init__(self, registry, name, entry_point):
+        self.registry = registry
+        self.name = name
+        self.entry_point = entry_point
+        self._function = None
+
+    def __call__(self, *args, **kwargs):
+        if self._function is None:
+            self._function = self.registry.get(self.name, self.entry_point)
+        return self._function(*args, **kwargs)
+
+    def __repr__(self):
+        return f"<lazy {self.name}.{self.entry_point}>"
+
+registry = AgentRegistry()
+
+def entry(name, entry_point):
+    """A lazily loaded entry point of an agent in the process-wide registry."""
+    return registry.entry(name, entry_point)
+
+def load(name):
+    """Imports an agent in the process-wide registry."""
+    return registry.load(name)
+
+def stats():
+    return registry.stats()
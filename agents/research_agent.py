@@ -1,13 +1,15 @@
-import os
 import chainlit as cl
-from openai import OpenAI
 from langchain_community.utilities import WikipediaAPIWrapper
 from dotenv import load_dotenv
-import tiktoken
 from functools import lru_cache
-import json
-from datetime import datetime
 import logging
+try:
+    from . import llm_client, model_router, usage_context, usage_store
+except ImportError:
+    import llm_client
+    import model_router
+    import usage_context
+    import usage_store
 
 # Set up logging
 logging.basicConfig(level=logging.INFO)
@@ -16,60 +18,8 @@ logger = logging.getLogger(__name__)
 # Load environment variables
 load_dotenv()
 
-# Configure OpenRouter
-client = OpenAI(
-    api_key=os.getenv("OPENROUTER_API_KEY"),
-    base_url="https://openrouter.ai/api/v1"
-)
-
-# Initialize token counter
-def count_tokens(text: str) -> int:
-    encoding = tiktoken.encoding_for_model("gpt-3.5-turbo")
-    return len(encoding.encode(text))
-
-# Cost tracking
-class CostTracker:
-    def __init__(self):
-        self.total_tokens = 0
-        self.total_cost = 0
-        self.daily_usage = {}
-        self.load_usage()
-
-    def load_usage(self):
-        if os.path.exists('usage.json'):
-            with open('usage.json', 'r') as f:
-                data = json.load(f)
-                self.total_tokens = data.get('total_tokens', 0)
-                self.total_cost = data.get('total_cost', 0)
-                self.daily_usage = data.get('daily_usage', {})
-
-    def save_usage(self):
-        with open('usage.json', 'w') as f:
-            json.dump({
-                'total_tokens': self.total_tokens,
-                'total_cost': self.total_cost,
-                'daily_usage': self.daily_usage
-            }, f)
-
-    def track_usage(self, tokens: int):
-        today = datetime.now().strftime('%Y-%m-%d')
-        self.total_tokens += tokens
-        self.daily_usage[today] = self.daily_usage.get(today, 0) + tokens
-        # Calculate cost (GPT-3.5-turbo: $0.002 per 1K tokens)
-        self.total_cost = (self.total_tokens / 1000) * 0.002
-        self.save_usage()
-
-    def get_usage_summary(self):
-        return f"""
-Usage Summary:
--------------
-Total Tokens: {self.total_tokens:,}
-Total Cost: ${self.total_cost:.4f}
-Today's Usage: {self.daily_usage.get(datetime.now().strftime('%Y-%m-%d'), 0):,} tokens
-"""
-
-# Initialize cost tracker
-cost_tracker = CostTracker()
+# Usage goes to the store shared by every agent and process
+cost_tracker = usage_store.CostTracker('research')
 
 # Cached Wikipedia wrapper
 @lru_cache(maxsize=1)
@@ -77,20 +27,8 @@ def get_wikipedia():
     return WikipediaAPIWrapper()
 
 def call_openrouter(prompt, system_prompt="You are a helpful research assistant."):
-    try:
-        response = client.chat.completions.create(
-            model="openai/gpt-3.5-turbo",
-            messages=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": prompt}
-            ],
-            temperature=0,
-            max_tokens=1000
-        )
-        return response.choices[0].message.content
-    except Exception as e:
-        logger.error(f"Error calling OpenRouter: {str(e)}")
-        return f"Error: {str(e)}"
+    return llm_client.call_openrouter(prompt, system_prompt, temperature=0, max_tokens=1000,
+                                      model=model_router.choose_model("research"))
 
 def research_topic(topic):
     try:
@@ -139,18 +77,13 @@ async def start():
 
 @cl.on_message
 async def main(message: cl.Message):
-    # Track input tokens
-    input_tokens = count_tokens(message.content)
-    cost_tracker.track_usage(input_tokens)
-    
-    # Process the query
-    response = research_topic(message.content)
-    
-    # Track output tokens
-    output_tokens = count_tokens(response)
-    cost_tracker.track_usage(output_tokens)
+    # Process the query, collecting the usage of every LLM call
+    with usage_context.track_usage() as usage:
+        response = research_topic(message.content)
+    usage.count_locally(message.content, response)
+    cost_tracker.track_request(usage, session=cl.user_session.get("id"))
     
     # Send response with usage info
     await cl.Message(
-        content=f"{response}\n\n---\nUsage: {input_tokens + output_tokens} tokens (${(input_tokens + output_tokens)/1000*0.002:.4f})"
+        content=f"{response}\n\n---\nUsage: {usage.total_tokens} tokens (${usage.cost:.4f})"
     ).send() 
\ No newline at end of file
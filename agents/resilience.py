@@ -0,0 +1,179 @@
+import os
+import time
+import random
+import threading
+import contextvars
+from collections import deque
+from contextlib import contextmanager
+from concurrent.futures import CancelledError, ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+# Retry and hedging settings (hedging is opt-in)
+RETRY_ATTEMPTS = int(os.getenv("LLM_RETRY_ATTEMPTS", "3"))
+RETRY_BASE_DELAY = float(os.getenv("LLM_RETRY_BASE_DELAY", "0.5"))
+RETRY_MAX_DELAY = float(os.getenv("LLM_RETRY_MAX_DELAY", "8"))
+RETRY_BUDGET = int(os.getenv("LLM_RETRY_BUDGET", "6"))
+HEDGE_ENABLED = os.getenv("LLM_HEDGE", "0") == "1"
+HEDGE_PERCENTILE = float(os.getenv("LLM_HEDGE_PERCENTILE", "95"))
+HEDGE_MIN_SAMPLES = int(os.getenv("LLM_HEDGE_MIN_SAMPLES", "20"))
+
+TRANSIENT_STATUS_CODES = {408, 409, 429, 500, 502, 503, 504}
+
+class AttemptBudget:
+    """Extra attempts (retries and hedges) one user request may spend."""
+
+    def __init__(self, limit):
+        self.remaining = limit
+        self._lock = threading.Lock()
+
+    def take(self) -> bool:
+        with self._lock:
+            if self.remaining <= 0:
+                return False
+            self.remaining -= 1
+            return True
+
+_budget = contextvars.ContextVar("llm_attempt_budget", default=None)
+
+@contextmanager
+def attempt_budget(limit=RETRY_BUDGET):
+    """Cap the retries and hedges made by every LLM call inside the block."""
+    token = _budget.set(AttemptBudget(limit))
+    try:
+        yield
+    finally:
+        _budget.reset(token)
+
+class _Stats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.retries = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+        self.budget_exhausted = 0
+
+    def incr(self, name):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+stats_counters = _Stats()
+
+def take_attempt() -> bool:
+    budget = _budget.get()
+    if budget is None or budget.take():
+        return True
+    stats_counters.incr("budget_exhausted")
+    return False
+
+def is_transient(error) -> bool:
+    # Imported here so that importing this module does not load the OpenAI SDK
+    import openai
+    if isinstance(error, openai.APIConnectionError):
+        return True
+    return getattr(error, "status_code", None) in TRANSIENT_STATUS_CODES
+
+def backoff_delay(error, attempt) -> float:
+    """Full-jitter exponential backoff, honouring Retry-After when the provider sends it."""
+    response = getattr(error, "response", None)
+    retry_after = response.headers.get("retry-after") if response is not None else None
+    if retry_after:
+        try:
+            return min(float(retry_after), RETRY_MAX_DELAY)
+        except ValueError:
+            pass
+    return random.uniform(0, min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * (2 ** attempt)))
+
+def should_retry(error, attempt) -> bool:
+    return attempt + 1 < RETRY_ATTEMPTS and is_transient(error) and take_attempt()
+
+def call_with_retries(fn):
+    """Run fn, retrying transient provider errors with jittered backoff."""
+    attempt = 0
+    while True:
+        try:
+            return fn()
+        except Exception as e:
+            if not should_retry(e, attempt):
+                raise
+            stats_counters.incr("retries")
+            time.sleep(backoff_delay(e, attempt))
+            attempt += 1
+
+class LatencyTracker:
+    """
+    Recent successful provider latencies, used to pick the hedging delay.
+    Callers record a call's latency from when it holds a provider slot, so
+    time queued in the rate limiter is not counted.
+    """
+
+    def __init__(self, size=200):
+        self._samples = deque(maxlen=size)
+        self._lock = threading.Lock()
+
+    def record(self, latency):
+        with self._lock:
+            self._samples.append(latency)
+
+    def percentile(self, p):
+        with self._lock:
+            if len(self._samples) < HEDGE_MIN_SAMPLES:
+                return None
+            ordered = sorted(self._samples)
+        return ordered[min(len(ordered) - 1, int(p / 100 * len(ordered)))]
+
+latencies = LatencyTracker()
+_hedge_pool = ThreadPoolExecutor(max_workers=64, thread_name_prefix="llm-hedge")
+
+def hedged(fn):
+    """
+    Run fn; if it has not returned within the recent HEDGE_PERCENTILE latency,
+    start an identical second attempt and return whichever succeeds first.
+    The loser is cancelled if it has not started by the time the winner
+    succeeds, otherwise its result is discarded when it completes.
+    """
+    delay = latencies.percentile(HEDGE_PERCENTILE) if HEDGE_ENABLED else None
+    if delay is None:
+        return fn()
+
+    settled = threading.Event()
+
+    def attempt():
+        # A queued attempt that starts after the other one succeeded does not call the provider
+        if settled.is_set():
+            raise CancelledError()
+        result = fn()
+        settled.set()
+        return result
+
+    primary = _hedge_pool.submit(contextvars.copy_context().run, attempt)
+    done, _ = wait([primary], timeout=delay)
+    if done or not take_attempt():
+        return primary.result()
+
+    stats_counters.incr("hedges")
+    hedge = _hedge_pool.submit(contextvars.copy_context().run, attempt)
+    pending = {primary, hedge}
+    error = None
+    while pending:
+        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            if future.exception() is None:
+                for loser in pending:
+                    loser.cancel()
+                if future is hedge:
+                    stats_counters.incr("hedge_wins")
+                return future.result()
+            error = future.exception()
+    raise error
+
+def stats():
+    hedges = stats_counters.hedges
+    delay = latencies.percentile(HEDGE_PERCENTILE)
+    return {
+        "hedging_enabled": HEDGE_ENABLED,
+        "hedge_delay_ms": round(delay * 1000, 1) if delay is not None else None,
+        "retries": stats_counters.retries,
+        "hedges": hedges,
+        "hedge_wins": stats_counters.hedge_wins,
+        "hedge_win_rate": stats_counters.hedge_wins / hedges if hedges else 0.0,
+        "budget_exhausted": stats_counters.budget_exhausted
+    }
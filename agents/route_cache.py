@@ -0,0 +1,124 @@
+import os
+import re
+import threading
+from collections import OrderedDict
+try:
+    from . import router
+except ImportError:
+    import router
+
+# Routing cache settings (overridable through the environment); 0 disables the cache
+ROUTE_CACHE_SIZE = int(os.getenv("ROUTE_CACHE_SIZE", "1024"))
+
+# Pasted code is replaced by this word, so routing still sees that code was sent
+CODE_MARKER = "code"
+# Unfenced code is only stripped in runs of at least this many code-like lines,
+# so a line of prose that happens to look like code is routed as written
+MIN_CODE_LINES = 3
+
+_FENCED_CODE = re.compile(r"```.*?(?:```|\Z)", re.DOTALL)
+# Indented lines other than bulleted or numbered list items, lines ending a statement or block, and
+# lines that define a function or class or import a module
+_CODE_LINE = re.compile(
+    r"^(?:[ \t]+(?![-*]\s|\d+[.)]\s)\S|.*[;{}]\s*$|def \w+\s*\(|class \w+\s*[(:]|import [\w.]+\s*$|from [\w.]+ import |"
+    r"#include|function\s*\w*\s*\(|(?:const|let|var) \w+\s*=)"
+)
+
+def strip_code(query):
+    """
+    The query with fenced code blocks, and runs of at least MIN_CODE_LINES
+    code-like lines, replaced by CODE_MARKER.
+    """
+    text = _FENCED_CODE.sub(f"\n{CODE_MARKER}\n", (query or "").strip())
+    lines = []
+    run = []
+    for line in text.splitlines() + [""]:
+        if line and _CODE_LINE.match(line):
+            run.append(line)
+            continue
+        lines.extend([CODE_MARKER] if len(run) >= MIN_CODE_LINES else run)
+        run = []
+        lines.append(line)
+    return "\n".join(lines[:-1])
+
+def normalize(query) -> str:
+    """
+    The text a routing decision depends on: pasted code stripped, case
+    folded, and punctuation and whitespace collapsed into single spaces,
+    so "What is X?" and "what is x" route the same.
+    """
+    return b" ".join(router.tokenize(strip_code(query).casefold())).decode("utf-8", "ignore")
+
+class RouteCache:
+    """
+    Bounded LRU of routing decisions keyed by entry point and normalized
+    query. The decision function is given the normalized query, so every
+    query that normalizes the same is routed the same.
+    """
+
+    def __init__(self, max_entries=ROUTE_CACHE_SIZE):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def route(self, scope, query, decide):
+        """The cached decision for the query under `scope`, computing it with `decide(normalized)` on a miss."""
+        text = normalize(query)
+        if self.max_entries <= 0:
+            return decide(text)
+        key = (scope, text)
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key]
+            self.misses += 1
+
+        decision = decide(text)
+        with self._lock:
+            self._entries[key] = decision
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+        return decision
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "enabled": self.max_entries > 0,
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": self.hits / lookups if lookups else 0.0
+        }
+
+    def summary(self) -> str:
+        stats = self.stats()
+        return (f"Routing cache: {stats['hits']} hits of {stats['hits'] + stats['misses']} lookups "
+                f"({stats['hit_rate']:.1%}), {stats['entries']} entries")
+
+_cache = None
+_cache_lock = threading.Lock()
+
+def get_route_cache() -> RouteCache:
+    """Returns the process-wide routing cache."""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = RouteCache()
+    return _cache
+
+def route(scope, query, decide):
+    """Routes a query through the process-wide routing cache; see RouteCache.route."""
+    return get_route_cache().route(scope, query, decide)
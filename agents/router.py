@@ -0,0 +1,189 @@
+import threading
+
+# Keyword rules per agent category, in the order entry points usually check them
+AGENT_RULES = {
+    "concept_chart": [
+        "plot", "chart", "visualize", "visualise", "graph", "bar", "line", "pie", "show", "display",
+        "compare", "concept", "map", "outline", "structure"
+    ],
+    "coding": [
+        "code", "program", "write", "implement", "function", "class", "script", "debug", "fix",
+        "error", "exception", "run", "execute", "compile", "build", "test", "algorithm", "data structure"
+    ],
+    "math": [
+        "calculate", "math", "mathematical", "formula", "equation", "solve", "compute", "prime",
+        "armstrong", "fibonacci", "factorial", "gcd", "lcm", "square root", "power", "exponent",
+        "logarithm", "trigonometry", "geometry", "algebra", "calculus", "statistics", "probability"
+    ],
+    "research": [
+        "research", "find", "search", "look up", "information about", "find information about",
+        "tell me about", "what is", "who is", "when did", "where is", "how does", "explain",
+        "describe", "history of", "meaning of", "definition of", "facts about"
+    ],
+    "planner": [
+        "plan", "strategy", "approach", "steps", "how to", "guide", "tutorial", "process",
+        "instructions", "method", "way to"
+    ],
+    "multi_agent": [
+        "compare", "analyze", "analyse", "evaluate", "investigate", "study", "find out",
+        "figure out", "determine", "calculate", "solve"
+    ]
+}
+
+# What a coding request asks for
+CODING_TASK_RULES = {
+    "debug": ["debug", "fix", "error", "exception"],
+    "explain": ["explain", "how does", "what does"]
+}
+
+# Languages the coding agent writes, in the order they are preferred
+LANGUAGES = ["python", "javascript", "java", "c++", "c#", "ruby", "go", "rust"]
+
+# Word endings a keyword may carry and still match ("functions", "debugged");
+# phrases only take a plural ("data structures")
+SUFFIXES = ("s", "es", "ed", "ing")
+PHRASE_SUFFIXES = ("s",)
+
+# Lowercases ASCII and turns every byte that cannot be part of a word into a space;
+# "+" and "#" are word characters so "c++" and "c#" survive
+_WORD_BYTES = set(b"abcdefghijklmnopqrstuvwxyz0123456789_+#")
+_TOKEN_TABLE = bytes(
+    lower if lower in _WORD_BYTES or lower >= 128 else 32
+    for lower in (byte + 32 if 65 <= byte <= 90 else byte for byte in range(256))
+)
+
+def tokenize(text):
+    """Lowercased ASCII word tokens as bytes, split in C by one translate and one split."""
+    return (text or "").encode("utf-8", "ignore").translate(_TOKEN_TABLE).split()
+
+class RouteMatch:
+    """The categories a query matched, scored by the number of their keywords it contains."""
+
+    def __init__(self, scores, keywords):
+        self.scores = scores
+        self.keywords = keywords
+
+    def __contains__(self, category):
+        return category in self.scores
+
+    def __bool__(self):
+        return bool(self.scores)
+
+    def best(self, order, default=None):
+        """The first category in `order` that matched, or `default`."""
+        for category in order:
+            if category in self.scores:
+                return category
+        return default
+
+    def to_dict(self):
+        return {"scores": dict(self.scores), "keywords": list(self.keywords)}
+
+class KeywordRouter:
+    """
+    Matches the keyword rules of every category against a query at once.
+    The query is split into word tokens in C and one set intersection
+    with the first words of all keywords finds every single-word match;
+    only phrases starting with a matched word are then searched for,
+    longest first. Keywords match whole words only, so "line" no longer
+    matches "online", and a word inside a longer phrase ("find" in
+    "find out") is not counted again.
+    """
+
+    def __init__(self, rules, suffixes=True):
+        self.rules = {category: list(keywords) for category, keywords in rules.items()}
+        self.suffixes = suffixes
+        self._compiled = None
+        self._lock = threading.Lock()
+
+    def _compile(self):
+        """
+        Builds, for every first word, the keyword spellings starting with it
+        as (rank, b" word  word " needle, single word or None, keyword,
+        categories) entries; a lower rank is a longer phrase, counted first.
+        """
+        categories = {}
+        for category, keywords in self.rules.items():
+            for keyword in keywords:
+                keyword = " ".join(keyword.lower().split())
+                targets = categories.setdefault(keyword, [])
+                if category not in targets:
+                    targets.append(category)
+
+        # Exact spellings are added before suffixed ones so they win when both exist
+        needles = {}
+        for ending in ("",) + (SUFFIXES if self.suffixes else ()):
+            for keyword, targets in categories.items():
+                words = [word.encode("utf-8") for word in keyword.split()]
+                if len(words) > 1 and ending and ending not in PHRASE_SUFFIXES:
+                    continue
+                spelled = words[:-1] + [words[-1] + ending.encode("ascii")]
+                needle = b" " + b"  ".join(spelled) + b" "
+                if needle not in needles:
+                    needles[needle] = (spelled, keyword, tuple(targets))
+
+        by_first_word = {}
+        ordered = sorted(needles.items(), key=lambda item: (-len(item[1][0]), -len(item[0])))
+        for rank, (needle, (spelled, keyword, targets)) in enumerate(ordered):
+            word = spelled[0] if len(spelled) == 1 else None
+            by_first_word.setdefault(spelled[0], []).append((rank, needle, word, keyword, targets))
+        return frozenset(by_first_word), by_first_word
+
+    @property
+    def compiled(self):
+        """The keyword index, built on first use."""
+        if self._compiled is None:
+            with self._lock:
+                if self._compiled is None:
+                    self._compiled = self._compile()
+        return self._compiled
+
+    def match(self, query) -> RouteMatch:
+        first_words, by_first_word = self.compiled
+        tokens = tokenize(query)
+        present = first_words.intersection(tokens)
+        if not present:
+            return RouteMatch({}, [])
+
+        # Single words are known to be present from the intersection; phrases
+        # are looked up in the tokens joined by two spaces
+        text = None
+        scores = {}
+        keywords = []
+        if len(present) == 1:
+            # Each word's entries are already in rank order
+            candidates = by_first_word[next(iter(present))]
+        else:
+            candidates = sorted([entry for first in present for entry in by_first_word[first]])
+        for rank, needle, word, keyword, targets in candidates:
+            if word is None:
+                if text is None:
+                    text = b" " + b"  ".join(tokens) + b" "
+                if needle not in text:
+                    continue
+                # A phrase's words are not counted again as shorter keywords
+                text = text.replace(needle, b" ")
+            elif text is not None and needle not in text:
+                continue
+            if keyword in keywords:
+                continue
+            keywords.append(keyword)
+            for category in targets:
+                scores[category] = scores.get(category, 0) + 1
+        return RouteMatch(scores, keywords)
+
+agent_router = KeywordRouter(AGENT_RULES)
+coding_task_router = KeywordRouter(CODING_TASK_RULES)
+language_router = KeywordRouter({language: [language] for language in LANGUAGES}, suffixes=False)
+
+def match(query) -> RouteMatch:
+    """Matches a query against the agent rules."""
+    return agent_router.match(query)
+
+def coding_task(query) -> str:
+    """"debug", "explain" or "generate" for a coding request."""
+    return coding_task_router.match(query).best(["debug", "explain"], "generate")
+
+def code_language(query, default="python") -> str:
+    """The first preferred language a coding request names."""
+    return language_router.match(query).best(LANGUAGES, default)
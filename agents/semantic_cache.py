@@ -0,0 +1,206 @@
+import os
+import re
+import time
+import zlib
+import threading
+import numpy as np
+
+# Semantic cache settings (the cache is opt-in)
+SEMANTIC_CACHE_ENABLED = os.getenv("SEMANTIC_CACHE", "0") == "1"
+SEMANTIC_CACHE_THRESHOLD = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.9"))
+SEMANTIC_CACHE_MAX_ENTRIES = int(os.getenv("SEMANTIC_CACHE_MAX_ENTRIES", "1000"))
+SEMANTIC_CACHE_TTL = float(os.getenv("SEMANTIC_CACHE_TTL", str(24 * 3600)))
+
+# Size of the hashed feature space and the character n-gram lengths used
+VECTOR_DIM = 2048
+NGRAM_SIZES = (3, 4, 5)
+
+CONTRACTIONS = {
+    "what's": "what is",
+    "who's": "who is",
+    "where's": "where is",
+    "how's": "how is",
+    "it's": "it is",
+    "that's": "that is",
+    "there's": "there is",
+    "can't": "cannot",
+    "won't": "will not",
+    "don't": "do not",
+    "doesn't": "does not",
+    "isn't": "is not",
+    "i'm": "i am"
+}
+
+_contraction_re = re.compile(r"\b(" + "|".join(re.escape(c) for c in CONTRACTIONS) + r")\b")
+# Arithmetic operators are kept, so "3+3" and "3*3" stay different questions
+_punctuation_re = re.compile(r"[^\w\s+\-*/^=%]")
+# Hyphens and slashes between letters, as in "well-known" or "and/or", only join words
+_word_joiner_re = re.compile(r"(?<=[^\W\d])[-/](?=[^\W\d])")
+_operator_re = re.compile(r"([+\-*/^=%])")
+# Queries with numbers or operators are only served for the same normalized text
+_exact_re = re.compile(r"[\d+\-*/^=%]")
+_whitespace_re = re.compile(r"\s+")
+
+def normalize_query(query: str) -> str:
+    """Case-fold, expand common contractions and strip punctuation other than arithmetic operators."""
+    text = query.lower().replace("’", "'")
+    text = _contraction_re.sub(lambda m: CONTRACTIONS[m.group(0)], text)
+    text = _punctuation_re.sub(" ", text)
+    text = _word_joiner_re.sub(" ", text)
+    text = _operator_re.sub(r" \1 ", text)
+    return _whitespace_re.sub(" ", text).strip()
+
+def vectorize(text: str) -> np.ndarray:
+    """Sublinear term frequencies of hashed character n-grams."""
+    padded = f" {text} "
+    buckets = [
+        zlib.crc32(padded[i:i + n].encode("utf-8")) % VECTOR_DIM
+        for n in NGRAM_SIZES
+        for i in range(len(padded) - n + 1)
+    ]
+    vector = np.zeros(VECTOR_DIM, dtype=np.float32)
+    if buckets:
+        np.add.at(vector, buckets, 1.0)
+        np.log1p(vector, out=vector)
+    return vector
+
+class SemanticCache:
+    """
+    Near-duplicate answer cache for full agent responses.
+    Queries are stored as rows of a fixed-size TF matrix; lookups weight the
+    matrix by the current IDF and run one cosine search over the rows that
+    belong to the same agent type. When full, the least recently used row
+    is overwritten.
+    """
+
+    def __init__(self, threshold=SEMANTIC_CACHE_THRESHOLD, max_entries=SEMANTIC_CACHE_MAX_ENTRIES,
+                 ttl=SEMANTIC_CACHE_TTL):
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._tf = np.zeros((max_entries, VECTOR_DIM), dtype=np.float32)
+        self._doc_freq = np.zeros(VECTOR_DIM, dtype=np.float32)
+        self._used = np.zeros(max_entries, dtype=bool)
+        self._created = np.zeros(max_entries, dtype=np.float64)
+        self._last_used = np.zeros(max_entries, dtype=np.float64)
+        self._agents = np.empty(max_entries, dtype=object)
+        self._keys = [None] * max_entries
+        self._values = [None] * max_entries
+        self._slots = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _idf(self):
+        count = max(int(self._used.sum()), 1)
+        return np.log((1.0 + count) / (1.0 + self._doc_freq)) + 1.0
+
+    def _release(self, slot):
+        self._doc_freq -= self._tf[slot] > 0
+        self._tf[slot] = 0
+        self._used[slot] = False
+        self._slots.pop(self._keys[slot], None)
+        self._keys[slot] = None
+        self._agents[slot] = None
+        self._values[slot] = None
+
+    def lookup(self, query: str, agent_type: str):
+        """
+        Return the cached value for the closest stored query, or None.
+        Queries with digits or arithmetic operators only match the same
+        normalized text, since one changed number or operator changes the answer.
+        """
+        normalized = normalize_query(query)
+        vector = vectorize(normalized)
+        now = time.time()
+        with self._lock:
+            expired = np.flatnonzero(self._used & (now - self._created > self.ttl))
+            for slot in expired:
+                self._release(slot)
+                self.evictions += 1
+
+            if _exact_re.search(normalized):
+                slot = self._slots.get((agent_type, normalized))
+                if slot is not None:
+                    self._last_used[slot] = now
+                    self.hits += 1
+                    return self._values[slot]
+                self.misses += 1
+                return None
+
+            candidates = np.flatnonzero(self._used & (self._agents == agent_type))
+            if candidates.size and vector.any():
+                idf = self._idf()
+                rows = self._tf[candidates] * idf
+                probe = vector * idf
+                norms = np.linalg.norm(rows, axis=1) * np.linalg.norm(probe)
+                scores = rows @ probe / np.maximum(norms, 1e-12)
+                best = int(np.argmax(scores))
+                if scores[best] >= self.threshold:
+                    slot = candidates[best]
+                    self._last_used[slot] = now
+                    self.hits += 1
+                    return self._values[slot]
+
+            self.misses += 1
+            return None
+
+    def store(self, query: str, agent_type: str, value):
+        normalized = normalize_query(query)
+        vector = vectorize(normalized)
+        if not vector.any():
+            return
+        now = time.time()
+        with self._lock:
+            slot = self._slots.get((agent_type, normalized))
+            if slot is not None:
+                self._release(slot)
+            else:
+                free = np.flatnonzero(~self._used)
+                if free.size:
+                    slot = free[0]
+                else:
+                    slot = int(np.argmin(self._last_used))
+                    self._release(slot)
+                    self.evictions += 1
+
+            self._tf[slot] = vector
+            self._doc_freq += vector > 0
+            self._used[slot] = True
+            self._created[slot] = now
+            self._last_used[slot] = now
+            self._agents[slot] = agent_type
+            self._values[slot] = value
+            self._keys[slot] = (agent_type, normalized)
+            self._slots[(agent_type, normalized)] = slot
+
+    def clear(self):
+        with self._lock:
+            for slot in np.flatnonzero(self._used):
+                self._release(slot)
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "enabled": SEMANTIC_CACHE_ENABLED,
+            "threshold": self.threshold,
+            "entries": int(self._used.sum()),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": self.hits / lookups if lookups else 0.0
+        }
+
+_cache = None
+_cache_lock = threading.Lock()
+
+def get_semantic_cache() -> SemanticCache:
+    """Returns the process-wide semantic cache."""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = SemanticCache()
+    return _cache
@@ -0,0 +1,79 @@
+import time
+import threading
+from concurrent.futures import CancelledError
+
+class SingleFlightTimeout(TimeoutError):
+    """Raised when a waiter gives up before the shared call finishes."""
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.waiters = 0
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls that share a key.
+    The first caller (the leader) runs the function; callers arriving while
+    it is in flight wait for the same result or exception. A waiter that
+    times out only stops waiting - the leader keeps running for everyone
+    else. If the leader itself is cancelled, waiters with time left start a
+    fresh call instead of inheriting the cancellation.
+    """
+
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+        self.leaders = 0
+        self.shared = 0
+        self.timeouts = 0
+
+    def do(self, key, fn, timeout=None):
+        deadline = time.monotonic() + timeout if timeout is not None else None
+        while True:
+            with self._lock:
+                call = self._calls.get(key)
+                leader = call is None
+                if leader:
+                    call = _Call()
+                    self._calls[key] = call
+                    self.leaders += 1
+                else:
+                    call.waiters += 1
+                    self.shared += 1
+
+            if leader:
+                try:
+                    call.result = fn()
+                except BaseException as e:
+                    call.error = e
+                    raise
+                finally:
+                    with self._lock:
+                        self._calls.pop(key, None)
+                    call.done.set()
+                return call.result
+
+            remaining = deadline - time.monotonic() if deadline is not None else None
+            if not call.done.wait(remaining):
+                with self._lock:
+                    self.timeouts += 1
+                raise SingleFlightTimeout(f"Timed out after {timeout}s waiting for an identical in-flight request")
+            if isinstance(call.error, CancelledError):
+                continue
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+    def in_flight(self) -> int:
+        with self._lock:
+            return len(self._calls)
+
+    def stats(self):
+        return {
+            "in_flight": self.in_flight(),
+            "leaders": self.leaders,
+            "shared": self.shared,
+            "timeouts": self.timeouts
+        }
@@ -0,0 +1,100 @@
+import os
+import logging
+from functools import lru_cache
+import tiktoken
+
+logger = logging.getLogger(__name__)
+
+# Tokenizer settings (overridable through the environment); 0 approximates every count
+# from the text length, so the tiktoken encodings are never downloaded
+TOKENIZER_ENABLED = os.getenv("TOKENIZER", "1") != "0"
+
+DEFAULT_MODEL = "gpt-3.5-turbo"
+
+# Extra tokens the chat format adds around every message
+TOKENS_PER_MESSAGE = 4
+
+# Average characters per token for English text with the cl100k encoding
+CHARS_PER_TOKEN = 4
+
+def get_encoding(model: str = DEFAULT_MODEL):
+    """
+    Returns the tiktoken encoder for a model, loaded once per process.
+    Provider prefixes such as "openai/" are ignored. Returns None when the
+    encoder cannot be loaded, in which case counts are approximated.
+    """
+    return _load_encoding(model.split("/")[-1])
+
+def load_encoding(model: str = DEFAULT_MODEL):
+    """
+    Loads a model's encoder ahead of its first use. Raises when it cannot
+    be loaded, and forgets the failure so that a later call tries again.
+    Does nothing when the tokenizer is turned off.
+    """
+    if not TOKENIZER_ENABLED:
+        return None
+    encoding = get_encoding(model)
+    if encoding is None:
+        _load_encoding.cache_clear()
+        raise RuntimeError(f"The tokenizer for {model} could not be loaded")
+    return encoding
+
+@lru_cache(maxsize=None)
+def _load_encoding(name: str):
+    if not TOKENIZER_ENABLED:
+        return None
+    try:
+        try:
+            return tiktoken.encoding_for_model(name)
+        except KeyError:
+            return tiktoken.get_encoding("cl100k_base")
+    except Exception as e:
+        logger.error(f"Error loading tokenizer for {name}: {str(e)}")
+        return None
+
+def approx_tokens(text: str) -> int:
+    """
+    Cheap token estimate from the text length, for pre-flight budgeting
+    where an exact count is not worth encoding the text.
+    """
+    if not text:
+        return 0
+    return max(1, (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN)
+
+def count_tokens(text: str, model: str = DEFAULT_MODEL) -> int:
+    if not text:
+        return 0
+    encoding = get_encoding(model)
+    if encoding is None:
+        return approx_tokens(text)
+    return len(encoding.encode(text, disallowed_special=()))
+
+def count_tokens_batch(texts, model: str = DEFAULT_MODEL, num_threads: int = 8):
+    """Counts the tokens of many texts at once, encoding them in parallel."""
+    texts = [text or "" for text in texts]
+    encoding = get_encoding(model)
+    if encoding is None:
+        return [approx_tokens(text) for text in texts]
+    encoded = encoding.encode_batch(texts, num_threads=num_threads, disallowed_special=())
+    return [len(tokens) for tokens in encoded]
+
+def truncate_tokens(text: str, max_tokens: int, model: str = DEFAULT_MODEL) -> str:
+    """Cut text down to at most max_tokens tokens."""
+    encoding = get_encoding(model)
+    if encoding is None:
+        return text[:max(0, max_tokens) * CHARS_PER_TOKEN]
+    tokens = encoding.encode(text, disallowed_special=())
+    if len(tokens) <= max_tokens:
+        return text
+    return encoding.decode(tokens[:max(0, max_tokens)])
+
+def count_message_tokens(messages, model: str = DEFAULT_MODEL) -> int:
+    """Count the prompt tokens of a chat messages list."""
+    return sum(
+        TOKENS_PER_MESSAGE + count_tokens(str(message.get("content") or ""), model)
+        for message in messages
+    )
+
+def approx_message_tokens(messages) -> int:
+    """Estimate the prompt tokens of a chat messages list without encoding it."""
+    return sum(TOKENS_PER_MESSAGE + approx_tokens(str(message.get("content") or "")) for message in messages)
@@ -0,0 +1,128 @@
+import threading
+import contextvars
+from contextlib import contextmanager
+try:
+    from . import model_router, pricing, token_counter
+except ImportError:
+    import model_router
+    import pricing
+    import token_counter
+
+class RequestUsage:
+    """
+    Token usage and cost of every LLM call made while serving one request,
+    including system prompts, injected context and intermediate planner calls.
+    """
+
+    def __init__(self, parent=None):
+        self.parent = parent
+        self.calls = 0
+        self.estimated_calls = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.cached_tokens = 0
+        self.cost = 0.0
+        # Prompt context tokens left out to fit the context budget
+        self.saved_tokens = 0
+        self.models = []
+        # model -> [calls, prompt_tokens, completion_tokens, cost]
+        self.by_model = {}
+        self._lock = threading.Lock()
+
+    @property
+    def total_tokens(self) -> int:
+        return self.prompt_tokens + self.completion_tokens
+
+    def add(self, model, prompt_tokens, completion_tokens, cost, estimated=False, cached_tokens=0):
+        with self._lock:
+            self.calls += 1
+            self.prompt_tokens += prompt_tokens
+            self.completion_tokens += completion_tokens
+            self.cached_tokens += cached_tokens
+            self.cost += cost
+            if estimated:
+                self.estimated_calls += 1
+            if model not in self.models:
+                self.models.append(model)
+            row = self.by_model.setdefault(model, [0, 0, 0, 0.0])
+            row[0] += 1
+            row[1] += prompt_tokens
+            row[2] += completion_tokens
+            row[3] += cost
+        if self.parent is not None:
+            self.parent.add(model, prompt_tokens, completion_tokens, cost, estimated, cached_tokens)
+
+    def add_saved(self, tokens):
+        with self._lock:
+            self.saved_tokens += tokens
+        if self.parent is not None:
+            self.parent.add_saved(tokens)
+
+    def count_locally(self, prompt, completion, model=token_counter.DEFAULT_MODEL):
+        """
+        Falls back to counting the query and answer locally when no call
+        inside the request reported usage, e.g. agents built on LangChain.
+        """
+        if self.calls:
+            return
+        prompt_tokens, completion_tokens = token_counter.count_tokens_batch([prompt or "", completion or ""], model)
+        self.add(model, prompt_tokens, completion_tokens,
+                 pricing.price_call(model, prompt_tokens, completion_tokens), estimated=True)
+
+    def to_dict(self):
+        return {
+            "tokens": self.total_tokens,
+            "prompt_tokens": self.prompt_tokens,
+            "completion_tokens": self.completion_tokens,
+            "cached_tokens": self.cached_tokens,
+            "cost": round(self.cost, 6),
+            "calls": self.calls,
+            "saved_tokens": self.saved_tokens,
+            "estimated": self.estimated_calls > 0
+        }
+
+_current = contextvars.ContextVar("llm_request_usage", default=None)
+
+@contextmanager
+def track_usage():
+    """
+    Collects the usage of every LLM call made inside the block. Blocks can
+    be nested; calls are then also counted by the enclosing block.
+    """
+    usage = RequestUsage(_current.get())
+    token = _current.set(usage)
+    try:
+        yield usage
+    finally:
+        _current.reset(token)
+
+def current_usage():
+    return _current.get()
+
+def record_call(model, latency=None, usage=None, messages=None, completion=""):
+    """
+    Records one completed provider call. Token counts come from the
+    provider's usage; only when it is missing are the messages and the
+    completion counted locally. Prompt tokens the provider served from its
+    prompt cache are billed at the model's cached input rate.
+    """
+    prompt_tokens = getattr(usage, "prompt_tokens", None)
+    estimated = prompt_tokens is None
+    cached_tokens = 0
+    if estimated:
+        prompt_tokens = token_counter.count_message_tokens(messages or [], model)
+        completion_tokens = token_counter.count_tokens(completion or "", model)
+    else:
+        completion_tokens = getattr(usage, "completion_tokens", 0) or 0
+        details = getattr(usage, "prompt_tokens_details", None)
+        if isinstance(details, dict):
+            cached_tokens = details.get("cached_tokens") or 0
+        elif details is not None:
+            cached_tokens = getattr(details, "cached_tokens", 0) or 0
+
+    model_router.get_registry().record(model, latency, prompt_tokens, completion_tokens)
+    request_usage = _current.get()
+    if request_usage is not None:
+        request_usage.add(model, prompt_tokens, completion_tokens,
+                          pricing.price_call(model, prompt_tokens, completion_tokens, cached_tokens),
+                          estimated, cached_tokens)
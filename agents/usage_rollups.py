@@ -0,0 +1,174 @@
+import os
+import math
+import time
+import threading
+from array import array
+from datetime import date, datetime
+
+# Rollup settings (overridable through the environment)
+MINUTE_SLOTS = int(os.getenv("USAGE_ROLLUP_MINUTES", "360"))
+HOUR_SLOTS = int(os.getenv("USAGE_ROLLUP_HOURS", "336"))
+DAY_SLOTS = int(os.getenv("USAGE_ROLLUP_DAYS", "400"))
+
+FIELDS = ("calls", "tokens", "prompt_tokens", "completion_tokens", "cost")
+GRANULARITIES = ("minute", "hour", "day")
+
+# Approximate bucket width in seconds (day buckets follow the local calendar)
+BUCKET_SECONDS = {"minute": 60, "hour": 3600, "day": 86400}
+
+def bucket_of(granularity, ts) -> int:
+    """Minute and hour buckets count from the epoch; day buckets are local calendar days."""
+    if granularity == "minute":
+        return int(ts // 60)
+    if granularity == "hour":
+        return int(ts // 3600)
+    return datetime.fromtimestamp(ts).toordinal()
+
+def bucket_start(granularity, bucket) -> float:
+    if granularity == "minute":
+        return bucket * 60.0
+    if granularity == "hour":
+        return bucket * 3600.0
+    return datetime.combine(date.fromordinal(bucket), datetime.min.time()).timestamp()
+
+class RollingCounter:
+    """
+    A ring of time buckets, each holding one counter per field, stored in
+    a flat array of doubles. A slot is reset when a newer bucket reuses it,
+    so memory stays fixed however long the process runs.
+    """
+
+    def __init__(self, slots):
+        self.slots = slots
+        self.values = array('d', bytes(8 * slots * len(FIELDS)))
+        self.buckets = array('q', [-1]) * slots
+
+    def add(self, bucket, values):
+        slot = bucket % self.slots
+        base = slot * len(FIELDS)
+        if self.buckets[slot] != bucket:
+            if self.buckets[slot] > bucket:
+                # Older than anything the ring still holds
+                return
+            self.buckets[slot] = bucket
+            for i in range(len(FIELDS)):
+                self.values[base + i] = 0.0
+        for i, value in enumerate(values):
+            self.values[base + i] += value
+
+    def get(self, bucket):
+        slot = bucket % self.slots
+        if self.buckets[slot] != bucket:
+            return None
+        base = slot * len(FIELDS)
+        return self.values[base:base + len(FIELDS)]
+
+class UsageRollups:
+    """
+    Usage pre-aggregated into minute, hour and day buckets per (agent,
+    model) series. Range and group-by queries read at most one ring of
+    buckets per series, so their cost does not grow with the history.
+    """
+
+    def __init__(self, minute_slots=MINUTE_SLOTS, hour_slots=HOUR_SLOTS, day_slots=DAY_SLOTS):
+        self.slots = {"minute": minute_slots, "hour": hour_slots, "day": day_slots}
+        self.series = {}
+        self._lock = threading.Lock()
+
+    def add(self, agent, model, calls=0, tokens=0, prompt_tokens=0, completion_tokens=0, cost=0.0,
+            ts=None, granularities=GRANULARITIES):
+        ts = time.time() if ts is None else ts
+        values = (calls, tokens, prompt_tokens, completion_tokens, cost)
+        with self._lock:
+            counters = self.series.get((agent, model))
+            if counters is None:
+                counters = self.series[(agent, model)] = {
+                    granularity: RollingCounter(slots) for granularity, slots in self.slots.items()
+                }
+            for granularity in granularities:
+                counters[granularity].add(bucket_of(granularity, ts), values)
+
+    def add_day(self, day, agent, model, calls=0, tokens=0, prompt_tokens=0, completion_tokens=0, cost=0.0):
+        """Adds a whole day's usage (a "YYYY-MM-DD" row of the usage store) to the day buckets only."""
+        ts = datetime.strptime(day, '%Y-%m-%d').timestamp()
+        self.add(agent, model, calls, tokens, prompt_tokens, completion_tokens, cost, ts=ts, granularities=("day",))
+
+    def choose_granularity(self, window) -> str:
+        """The finest granularity whose ring covers the window."""
+        for granularity in GRANULARITIES:
+            if window <= self.slots[granularity] * BUCKET_SECONDS[granularity]:
+                return granularity
+        return "day"
+
+    def query(self, window=3600, end=None, granularity=None, group_by=None, series=False):
+        """
+        Totals over the last `window` seconds before `end`, optionally
+        grouped by "agent" or "model" and broken into per-bucket points.
+        """
+        if group_by not in (None, "agent", "model"):
+            raise ValueError(f"Unknown usage dimension: {group_by}")
+        end = time.time() if end is None else end
+        granularity = granularity or self.choose_granularity(window)
+        if granularity not in GRANULARITIES:
+            raise ValueError(f"Unknown granularity: {granularity}")
+        last = bucket_of(granularity, end)
+        first = max(bucket_of(granularity, end - window + 1e-6), last - self.slots[granularity] + 1)
+
+        totals = [0.0] * len(FIELDS)
+        groups = {}
+        points = {}
+        with self._lock:
+            for (agent, model), counters in self.series.items():
+                counter = counters[granularity]
+                key = agent if group_by == "agent" else model
+                for bucket in range(first, last + 1):
+                    values = counter.get(bucket)
+                    if values is None:
+                        continue
+                    targets = [totals]
+                    if group_by:
+                        targets.append(groups.setdefault(key, [0.0] * len(FIELDS)))
+                    if series:
+                        targets.append(points.setdefault(bucket, [0.0] * len(FIELDS)))
+                    for target in targets:
+                        for i, value in enumerate(values):
+                            target[i] += value
+
+        result = {
+            "granularity": granularity,
+            "start": bucket_start(granularity, first),
+            "end": end,
+            "totals": _fields(totals)
+        }
+        if group_by:
+            result["groups"] = {key: _fields(values) for key, values in sorted(groups.items())}
+        if series:
+            result["series"] = [
+                {"start": bucket_start(granularity, bucket), **_fields(points.get(bucket, [0.0] * len(FIELDS)))}
+                for bucket in range(first, last + 1)
+            ]
+        return result
+
+def _fields(values):
+    fields = {name: int(value) for name, value in zip(FIELDS[:-1], values)}
+    fields["cost"] = round(values[-1], 6)
+    return fields
+
+def parse_window(text, max_seconds=None) -> float:
+    """
+    Parses windows like "90s", "15m", "6h" or "7d" into seconds. Raises
+    ValueError for windows that are not positive or are longer than
+    `max_seconds`, by default the span the day rollups keep.
+    """
+    units = {"s": 1, "m": 60, "h": 3600, "d": 86400}
+    max_seconds = DAY_SLOTS * 86400 if max_seconds is None else max_seconds
+    text = str(text).strip().lower()
+    if text and text[-1] in units:
+        seconds = float(text[:-1]) * units[text[-1]]
+    else:
+        seconds = float(text)
+    if not math.isfinite(seconds) or seconds <= 0:
+        raise ValueError(f"The window must be a positive duration, not {text!r}")
+    if seconds > max_seconds:
+        raise ValueError(f"The window must be at most {max_seconds / 86400:g} days, not {text!r}")
+    return seconds
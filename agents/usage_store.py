@@ -0,0 +1,433 @@
+import os
+import json
+import time
+import uuid
+import hashlib
+import atexit
+import sqlite3
+import logging
+import threading
+from datetime import datetime
+from collections import OrderedDict
+try:
+    from . import pricing, usage_rollups
+except ImportError:
+    import pricing
+    import usage_rollups
+
+logger = logging.getLogger(__name__)
+
+# Usage store settings (overridable through the environment)
+USAGE_DB_PATH = os.getenv("USAGE_DB_PATH", "usage.db")
+FLUSH_INTERVAL = float(os.getenv("USAGE_FLUSH_INTERVAL", "1.0"))
+FLUSH_RECORDS = int(os.getenv("USAGE_FLUSH_RECORDS", "100"))
+SESSION_CACHE_ENTRIES = int(os.getenv("USAGE_SESSION_CACHE", "10000"))
+
+# Model recorded when a call site only knows a token count
+UNKNOWN_MODEL = "unknown"
+
+# Per-agent JSON files written before the shared store, imported once
+LEGACY_FILES = {
+    "usage.json": "legacy",
+    "coding_usage.json": "coding",
+    "research_usage.json": "research",
+    "language_usage.json": "language"
+}
+
+def today() -> str:
+    return datetime.now().strftime('%Y-%m-%d')
+
+def new_session_id() -> str:
+    return uuid.uuid4().hex
+
+def key_scope(key, day=None) -> str:
+    """The session-table id holding an API key's usage for one day; the key itself is never stored."""
+    digest = hashlib.sha256(key.encode('utf-8')).hexdigest()[:16]
+    return f"key:{digest}:{day or today()}"
+
+class UsageStore:
+    """
+    Token usage and cost shared by every process and agent, kept in a
+    SQLite table in WAL mode with one row per (day, agent, model).
+    Records are summed in memory and applied by a background thread every
+    `flush_interval` seconds or `flush_records` records as atomic
+    `tokens = tokens + ?` upserts in one transaction, so concurrent
+    writers never overwrite each other's totals. Every record also goes
+    to in-memory minute/hour/day rollups; the day rollups start from the
+    stored rows, so they include other processes' earlier usage.
+    Usage can also be attributed to a session and an API key; their totals
+    (API keys per day) are kept in memory once loaded, so reading them
+    never waits on the database.
+    """
+
+    def __init__(self, path=USAGE_DB_PATH, flush_interval=FLUSH_INTERVAL, flush_records=FLUSH_RECORDS):
+        self.path = path
+        self.flush_interval = flush_interval
+        self.flush_records = flush_records
+        self.flushes = 0
+        self._pending = {}
+        self._pending_records = 0
+        self._pending_sessions = {}
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+        self._io_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._closed = False
+        self._conn = None
+        self.rollups = usage_rollups.UsageRollups()
+
+        self._db()
+        self._load_rollups()
+        self._thread = threading.Thread(target=self._run, name="usage-store", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def _db(self):
+        if self._conn is None:
+            self._conn = sqlite3.connect(self.path, timeout=10, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS usage (
+                    day TEXT NOT NULL,
+                    agent TEXT NOT NULL,
+                    model TEXT NOT NULL,
+                    calls INTEGER NOT NULL DEFAULT 0,
+                    tokens INTEGER NOT NULL DEFAULT 0,
+                    prompt_tokens INTEGER NOT NULL DEFAULT 0,
+                    completion_tokens INTEGER NOT NULL DEFAULT 0,
+                    cost REAL NOT NULL DEFAULT 0,
+                    PRIMARY KEY (day, agent, model)
+                )
+            """)
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS usage_sessions (
+                    session TEXT PRIMARY KEY,
+                    calls INTEGER NOT NULL DEFAULT 0,
+                    tokens INTEGER NOT NULL DEFAULT 0,
+                    cost REAL NOT NULL DEFAULT 0,
+                    updated_at REAL NOT NULL
+                )
+            """)
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS usage_imports (source TEXT PRIMARY KEY, imported_at REAL NOT NULL)"
+            )
+            self._conn.commit()
+        return self._conn
+
+    def _load_rollups(self):
+        since = datetime.fromordinal(datetime.now().toordinal() - self.rollups.slots["day"] + 1).strftime('%Y-%m-%d')
+        rows = self._db().execute(
+            "SELECT day, agent, model, calls, tokens, prompt_tokens, completion_tokens, cost FROM usage WHERE day >= ?",
+            (since,)
+        ).fetchall()
+        for row in rows:
+            self.rollups.add_day(*row)
+
+    def record(self, agent, model=UNKNOWN_MODEL, tokens=0, prompt_tokens=0, completion_tokens=0,
+               cost=0.0, calls=0, day=None, session=None, api_key=None):
+        """Adds usage to the write-behind buffer; it reaches the database on the next flush."""
+        key = (day or today(), agent, model or UNKNOWN_MODEL)
+        scopes = [session] if session else []
+        if api_key:
+            scopes.append(key_scope(api_key, key[0]))
+        for scope in scopes:
+            self._load_session(scope)
+        if day is None:
+            self.rollups.add(agent, key[2], calls, tokens, prompt_tokens, completion_tokens, cost)
+        else:
+            self.rollups.add_day(day, agent, key[2], calls, tokens, prompt_tokens, completion_tokens, cost)
+        with self._lock:
+            row = self._pending.get(key)
+            if row is None:
+                row = self._pending[key] = [0, 0, 0, 0, 0.0]
+            row[0] += calls
+            row[1] += tokens
+            row[2] += prompt_tokens
+            row[3] += completion_tokens
+            row[4] += cost
+            for scope in scopes:
+                for totals in (self._pending_sessions.setdefault(scope, [0, 0, 0.0]),
+                               self._sessions.setdefault(scope, [0, 0, 0.0])):
+                    totals[0] += calls
+                    totals[1] += tokens
+                    totals[2] += cost
+            self._pending_records += 1
+            full = self._pending_records >= self.flush_records
+        if full:
+            self._wake.set()
+
+    def flush(self):
+        """Applies the buffered usage to the database in one transaction."""
+        with self._io_lock:
+            with self._lock:
+                pending, self._pending = self._pending, {}
+                sessions, self._pending_sessions = self._pending_sessions, {}
+                self._pending_records = 0
+            if not pending and not sessions:
+                return
+            rows = [(day, agent, model, *values) for (day, agent, model), values in pending.items()]
+            now = time.time()
+            try:
+                with self._db() as conn:
+                    conn.executemany("""
+                        INSERT INTO usage (day, agent, model, calls, tokens, prompt_tokens, completion_tokens, cost)
+                        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                        ON CONFLICT (day, agent, model) DO UPDATE SET
+                            calls = calls + excluded.calls,
+                            tokens = tokens + excluded.tokens,
+                            prompt_tokens = prompt_tokens + excluded.prompt_tokens,
+                            completion_tokens = completion_tokens + excluded.completion_tokens,
+                            cost = cost + excluded.cost
+                    """, rows)
+                    conn.executemany("""
+                        INSERT INTO usage_sessions (session, calls, tokens, cost, updated_at)
+                        VALUES (?, ?, ?, ?, ?)
+                        ON CONFLICT (session) DO UPDATE SET
+                            calls = calls + excluded.calls,
+                            tokens = tokens + excluded.tokens,
+                            cost = cost + excluded.cost,
+                            updated_at = excluded.updated_at
+                    """, [(session, *values, now) for session, values in sessions.items()])
+            except sqlite3.Error:
+                # Put the usage back so the next flush retries it
+                with self._lock:
+                    for pending_rows, buffered, empty in ((pending, self._pending, [0, 0, 0, 0, 0.0]),
+                                                          (sessions, self._pending_sessions, [0, 0, 0.0])):
+                        for key, values in pending_rows.items():
+                            row = buffered.setdefault(key, list(empty))
+                            for i, value in enumerate(values):
+                                row[i] += value
+                raise
+            self.flushes += 1
+
+    def _load_session(self, session):
+        """Reads a session's stored totals the first time this process sees it."""
+        with self._lock:
+            if session in self._sessions:
+                self._sessions.move_to_end(session)
+                return
+        with self._io_lock:
+            row = self._db().execute(
+                "SELECT calls, tokens, cost FROM usage_sessions WHERE session = ?", (session,)
+            ).fetchone()
+        with self._lock:
+            if session not in self._sessions:
+                self._sessions[session] = list(row) if row else [0, 0, 0.0]
+                while len(self._sessions) > SESSION_CACHE_ENTRIES:
+                    self._sessions.popitem(last=False)
+
+    def session_usage(self, session):
+        self._load_session(session)
+        with self._lock:
+            calls, tokens, cost = self._sessions.get(session, (0, 0, 0.0))
+        return {"session": session, "calls": calls, "tokens": tokens, "cost": round(cost, 6)}
+
+    def key_usage(self, api_key, day=None):
+        """An API key's usage on one day, today by default."""
+        usage = self.session_usage(key_scope(api_key, day))
+        del usage["session"]
+        return usage
+
+    def day_cost(self, day=None) -> float:
+        """Every process's flushed cost for one day, today by default."""
+        return self._query("SELECT COALESCE(SUM(cost), 0) FROM usage WHERE day = ?", (day or today(),))[0][0]
+
+    def _query(self, sql, params=()):
+        self.flush()
+        with self._io_lock:
+            return self._db().execute(sql, params).fetchall()
+
+    def _where(self, agent=None):
+        return (" WHERE agent = ?", (agent,)) if agent else ("", ())
+
+    def totals(self, agent=None):
+        where, params = self._where(agent)
+        calls, tokens, prompt_tokens, completion_tokens, cost = self._query(
+            "SELECT COALESCE(SUM(calls), 0), COALESCE(SUM(tokens), 0), COALESCE(SUM(prompt_tokens), 0), "
+            "COALESCE(SUM(completion_tokens), 0), COALESCE(SUM(cost), 0) FROM usage" + where, params
+        )[0]
+        return {
+            "calls": calls,
+            "total_tokens": tokens,
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_cost": cost
+        }
+
+    def daily_usage(self, agent=None):
+        where, params = self._where(agent)
+        rows = self._query(f"SELECT day, SUM(tokens) FROM usage{where} GROUP BY day ORDER BY day", params)
+        return {day: tokens for day, tokens in rows}
+
+    def breakdown(self, dimension, agent=None):
+        """Totals grouped by "agent", "model" or "day"."""
+        if dimension not in ("agent", "model", "day"):
+            raise ValueError(f"Unknown usage dimension: {dimension}")
+        where, params = self._where(agent)
+        rows = self._query(
+            f"SELECT {dimension}, SUM(calls), SUM(tokens), SUM(cost) FROM usage{where} "
+            f"GROUP BY {dimension} ORDER BY {dimension}", params
+        )
+        return {key: {"calls": calls, "tokens": tokens, "cost": round(cost, 6)} for key, calls, tokens, cost in rows}
+
+    def import_legacy(self, path, agent):
+        """
+        Imports a per-agent usage JSON file (plus the ledger of unsnapshotted
+        records next to it) once; the import is recorded in the same
+        transaction as its rows so concurrent processes cannot repeat it.
+        """
+        if not os.path.exists(path):
+            return False
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (json.JSONDecodeError, OSError) as e:
+            logger.error(f"Error reading legacy usage file {path}: {str(e)}")
+            return False
+
+        daily = dict(data.get('daily_usage', {}))
+        total_tokens = data.get('total_tokens', 0)
+        total_cost = data.get('total_cost', 0)
+        ledger_path = os.path.splitext(path)[0] + ".ledger.jsonl"
+        if os.path.exists(ledger_path):
+            with open(ledger_path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue
+                    if record.get("seq", 0) > data.get('seq', 0):
+                        daily[record["day"]] = daily.get(record["day"], 0) + record["tokens"]
+                        total_tokens += record["tokens"]
+                        total_cost += record["cost"]
+
+        # The files only kept tokens per day, so the cost is split in proportion
+        rows = [
+            (day, agent, UNKNOWN_MODEL, 0, tokens, 0, 0, total_cost * tokens / total_tokens if total_tokens else 0.0)
+            for day, tokens in daily.items() if tokens
+        ]
+        source = os.path.abspath(path)
+        with self._io_lock:
+            conn = self._db()
+            try:
+                conn.execute("BEGIN IMMEDIATE")
+                if conn.execute("SELECT 1 FROM usage_imports WHERE source = ?", (source,)).fetchone():
+                    conn.rollback()
+                    return False
+                conn.executemany("""
+                    INSERT INTO usage (day, agent, model, calls, tokens, prompt_tokens, completion_tokens, cost)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                    ON CONFLICT (day, agent, model) DO UPDATE SET
+                        tokens = tokens + excluded.tokens,
+                        cost = cost + excluded.cost
+                """, rows)
+                conn.execute("INSERT INTO usage_imports (source, imported_at) VALUES (?, ?)", (source, time.time()))
+                conn.commit()
+            except sqlite3.Error:
+                conn.rollback()
+                raise
+        for row in rows:
+            self.rollups.add_day(*row)
+        logger.info(f"Imported {sum(daily.values())} tokens of {agent} usage from {path}")
+        return True
+
+    def _run(self):
+        while not self._closed:
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                logger.error(f"Error flushing usage store: {str(e)}")
+
+    def close(self):
+        """Flushes everything still buffered."""
+        if self._closed:
+            return
+        self._closed = True
+        self._wake.set()
+        try:
+            self.flush()
+        except Exception as e:
+            logger.error(f"Error closing usage store: {str(e)}")
+
+    def stats(self):
+        with self._lock:
+            pending = self._pending_records
+        return {"path": self.path, "pending": pending, "flushes": self.flushes, "sessions": len(self._sessions)}
+
+_store = None
+_store_lock = threading.Lock()
+
+def get_store() -> UsageStore:
+    """Returns the process-wide usage store, importing the legacy JSON files on first use."""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                store = UsageStore()
+                for path, agent in LEGACY_FILES.items():
+                    try:
+                        store.import_legacy(path, agent)
+                    except sqlite3.Error as e:
+                        logger.error(f"Error importing legacy usage file {path}: {str(e)}")
+                _store = store
+    return _store
+
+class CostTracker:
+    """
+    Records one agent's usage in the shared store and reports the store's
+    totals, plus those of its session when it has one.
+    """
+
+    def __init__(self, agent, store=None, session=None):
+        self.agent = agent
+        self.session = session
+        self._store = store
+
+    @property
+    def store(self) -> UsageStore:
+        if self._store is None:
+            self._store = get_store()
+        return self._store
+
+    @property
+    def total_tokens(self):
+        return self.store.totals()["total_tokens"]
+
+    @property
+    def total_cost(self):
+        return self.store.totals()["total_cost"]
+
+    @property
+    def daily_usage(self):
+        return self.store.daily_usage()
+
+    def track_usage(self, tokens: int, cost: float = None, model=UNKNOWN_MODEL):
+        """Records a token count whose prompt/completion split is unknown, priced as input."""
+        if cost is None:
+            cost = pricing.price_call(model, tokens, 0)
+        self.store.record(self.agent, model, tokens=tokens, cost=cost, session=self.session)
+
+    def track_request(self, usage, agent=None, session=None, api_key=None):
+        """Records a request's usage_context.RequestUsage, one row per model it called."""
+        for model, (calls, prompt_tokens, completion_tokens, cost) in usage.by_model.items():
+            self.store.record(agent or self.agent, model, tokens=prompt_tokens + completion_tokens,
+                              prompt_tokens=prompt_tokens, completion_tokens=completion_tokens,
+                              cost=cost, calls=calls, session=session or self.session, api_key=api_key)
+
+    def get_usage_summary(self):
+        totals = self.store.totals()
+        agent_cost = self.store.totals(self.agent)["total_cost"]
+        summary = f"""
+Usage Summary:
+-------------
+Total Tokens: {totals['total_tokens']:,}
+Total Cost: ${totals['total_cost']:.4f}
+Cost ({self.agent}): ${agent_cost:.4f}
+Today's Usage: {self.store.daily_usage().get(today(), 0):,} tokens
+"""
+        if self.session:
+            summary += f"This Session: ${self.store.session_usage(self.session)['cost']:.4f}\n"
+        return summary
@@ -1,16 +1,12 @@
-from flask import Flask, request, jsonify, send_from_directory
+from flask import Flask, Response, request, jsonify, send_from_directory, stream_with_context
 import os
 from dotenv import load_dotenv
 import logging
-from agents.research_agent_cli import process_query as research_process_query
-from agents.executor import get_executor
-from agents.planner import get_planner, get_replanner, get_answerer
-from agents.coding_agent_cli import generate_code, explain_code, debug_code
-from agents.concept_chart_agent import process_query as concept_chart_process_query
+from agents.registry import entry
 from agents.response_formatter import format_structured_response
-import tiktoken
+from agents import llm_cache, semantic_cache, rate_limiter, resilience, context_budget, model_router, usage_context, usage_store, usage_rollups, pricing, budget, router, intent_classifier, route_cache, registry, prewarm, plan_executor
+from agents.single_flight import SingleFlight, SingleFlightTimeout
 import json
-from datetime import datetime
 
 # Set up logging
 logging.basicConfig(level=logging.INFO)
@@ -22,54 +18,26 @@ load_dotenv()
 # Initialize Flask app
 app = Flask(__name__, static_folder='.')
 
-# Initialize token counter
-def count_tokens(text: str) -> int:
-    encoding = tiktoken.encoding_for_model("gpt-3.5-turbo")
-    return len(encoding.encode(text))
-
-# Cost tracking
-class CostTracker:
-    def __init__(self):
-        self.total_tokens = 0
-        self.total_cost = 0
-        self.daily_usage = {}
-        self.load_usage()
-
-    def load_usage(self):
-        if os.path.exists('usage.json'):
-            with open('usage.json', 'r') as f:
-                data = json.load(f)
-                self.total_tokens = data.get('total_tokens', 0)
-                self.total_cost = data.get('total_cost', 0)
-                self.daily_usage = data.get('daily_usage', {})
-
-    def save_usage(self):
-        with open('usage.json', 'w') as f:
-            json.dump({
-                'total_tokens': self.total_tokens,
-                'total_cost': self.total_cost,
-                'daily_usage': self.daily_usage
-            }, f)
-
-    def track_usage(self, tokens: int):
-        today = datetime.now().strftime('%Y-%m-%d')
-        self.total_tokens += tokens
-        self.daily_usage[today] = self.daily_usage.get(today, 0) + tokens
-        # Calculate cost (GPT-3.5-turbo: $0.002 per 1K tokens)
-        self.total_cost = (self.total_tokens / 1000) * 0.002
-        self.save_usage()
-
-    def get_usage_summary(self):
-        return f"""
-Usage Summary:
--------------
-Total Tokens: {self.total_tokens:,}
-Total Cost: ${self.total_cost:.4f}
-Today's Usage: {self.daily_usage.get(datetime.now().strftime('%Y-%m-%d'), 0):,} tokens
-"""
-
-# Initialize cost tracker
-cost_tracker = CostTracker()
+# Usage goes to the store shared by every agent and process
+cost_tracker = usage_store.CostTracker('app')
+
+# Identical queries that arrive while one is being answered wait for that answer
+query_flight = SingleFlight()
+QUERY_WAIT_TIMEOUT = float(os.environ.get("QUERY_WAIT_TIMEOUT", 180))
+
+# Agents are imported the first time they are used (see agents/registry.py)
+research_process_query = entry("research", "run")
+stream_research = entry("research", "stream")
+get_executor = entry("math", "init")
+stream_executor_query = entry("math", "stream")
+get_planner = entry("planner", "init")
+get_replanner = entry("multi_agent", "replanner")
+get_answerer = entry("answerer", "init")
+stream_answer = entry("answerer", "stream")
+generate_code = entry("coding", "generate")
+explain_code = entry("coding", "explain")
+debug_code = entry("coding", "debug")
+concept_chart_process_query = entry("concept_chart", "run")
 
 # Initialize agents
 def initialize_agents():
@@ -79,43 +47,78 @@ def initialize_agents():
     answerer = get_answerer()
     return executor, planner, replanner, answerer
 
+# Agents considered for a query's keyword matches, most specific first
+AGENT_ORDER = ["concept_chart", "coding", "math", "research", "planner"]
+# Agents the intent classifier may pick; run_agent answers anything else directly
+CLASSIFIED_AGENTS = AGENT_ORDER + ["multi_agent", "answerer"]
+
 # Determine which agent should handle the query
 def determine_agent(query):
-    query = query.lower()
-    
-    # Check for visualization requests first (most specific)
-    if any(word in query for word in ["plot", "chart", "visualize", "compare", "graph", "show", "display", "bar", "line", "pie"]):
-        return "concept_chart"
-    
-    # Check for concept mapping requests
-    if any(word in query for word in ["concept", "map", "outline", "structure"]):
-        return "concept_chart"
-    
-    # Check for coding-related queries
-    if any(word in query for word in ["code", "program", "function", "class", "debug", "error", "fix", "implement"]):
-        return "coding"
-    
-    # Check for mathematical queries
-    if any(word in query for word in ["calculate", "math", "equation", "formula", "solve", "compute"]):
-        return "math"
+    # Queries that normalize the same are routed once
+    return route_cache.route("app", query, decide_agent)
+
+def decide_agent(query):
+    # A confident prediction from the trained classifier wins over the keyword rules
+    agent = intent_classifier.predict_agent(query, CLASSIFIED_AGENTS)
+    if agent:
+        return agent
+    # Default to multi-agent for complex queries
+    return router.match(query).best(AGENT_ORDER, "multi_agent")
+
+# Process query, coalescing identical concurrent requests into one computation
+def process_query(query, agent_type=None, session_id=None, api_key=None):
+    if not agent_type:
+        agent_type = determine_agent(query)
     
-    # Check for research-related queries
-    if any(word in query for word in ["research", "find", "search", "look up", "information about", "what is", "who is", "where is"]):
-        return "research"
+    # Only requests of the same session and API key are coalesced, so each one
+    # is admitted against, and charged to, its own budgets
+    computed = []
+    result = query_flight.do(
+        (agent_type, query, session_id, api_key),
+        lambda: computed.append(True) or answer_query(query, agent_type, session_id, api_key),
+        timeout=QUERY_WAIT_TIMEOUT
+    )
+    if not computed:
+        # The usage was charged to the request that computed the answer
+        return {**result, "coalesced": True, "usage": {"tokens": 0, "cost": 0}}
+    return dict(result)
+
+# Serve near-duplicate questions from the semantic cache when enabled
+def answer_query(query, agent_type, session_id=None, api_key=None):
+    # All LLM calls made for one request share a budget of retries and hedges,
+    # and each must fit the daily, session and API key spend limits
+    with resilience.attempt_budget(), usage_context.track_usage() as usage, \
+            budget.admission(session_id, api_key) as admitted:
+        result = cached_run_agent(query, agent_type)
+    if result.get("cached"):
+        return result
+    accounted = account_usage(usage, query, result["response"], agent_type, session_id, api_key)
+    if admitted.rejected:
+        raise admitted.rejected
+    return {**result, **accounted}
+
+def account_usage(usage, query, response, agent_type, session_id=None, api_key=None):
+    """Adds a request's provider-reported usage to the usage store under its agent, session and API key."""
+    usage.count_locally(query, response)
+    cost_tracker.track_request(usage, agent_type, session_id, api_key)
+    return {"usage": usage.to_dict(), "models": usage.models}
+
+def cached_run_agent(query, agent_type):
+    if not semantic_cache.SEMANTIC_CACHE_ENABLED:
+        return run_agent(query, agent_type)
     
-    # Check for planning-related queries
-    if any(word in query for word in ["plan", "strategy", "approach", "steps", "how to", "guide", "tutorial"]):
-        return "planner"
+    cache = semantic_cache.get_semantic_cache()
+    cached = cache.lookup(query, agent_type)
+    if cached is not None:
+        return {**cached, "cached": True, "usage": {"tokens": 0, "cost": 0}}
     
-    # Default to multi-agent for complex queries
-    return "multi_agent"
+    result = run_agent(query, agent_type)
+    if not str(result["response"]).startswith(("An error occurred", "Error:")) and budget.rejection() is None:
+        cache.store(query, agent_type, result)
+    return result
 
 # Process query with the appropriate agent
-def process_query(query, agent_type=None):
-    # Track input tokens
-    input_tokens = count_tokens(query)
-    cost_tracker.track_usage(input_tokens)
-    
+def run_agent(query, agent_type=None):
     # Determine agent type if not specified
     if not agent_type:
         agent_type = determine_agent(query)
@@ -128,26 +131,18 @@ def process_query(query, agent_type=None):
                 return {
                     "response": format_structured_response(result["message"], agent_type, query),
                     "image_path": result["image_path"],
-                    "agent": "concept_chart",
-                    "usage": {
-                        "tokens": input_tokens,
-                        "cost": input_tokens * 0.000002
-                    }
+                    "agent": "concept_chart"
                 }
             else:
                 return {
                     "response": format_structured_response(result["message"], agent_type, query),
-                    "agent": "concept_chart",
-                    "usage": {
-                        "tokens": input_tokens,
-                        "cost": input_tokens * 0.000002
-                    }
+                    "agent": "concept_chart"
                 }
         elif agent_type == "coding":
             # Determine if it's a code generation, explanation, or debugging request
-            query_lower = query.lower()
+            task = router.coding_task(query)
             
-            if any(keyword in query_lower for keyword in ['debug', 'fix', 'error', 'exception']):
+            if task == "debug":
                 # Extract code and error message if present
                 parts = query.split(' ', 1)
                 if len(parts) > 1:
@@ -160,7 +155,7 @@ def process_query(query, agent_type=None):
                     response = debug_code(code, error_message)
                 else:
                     response = "Please provide code to debug."
-            elif any(keyword in query_lower for keyword in ['explain', 'how does', 'what does']):
+            elif task == "explain":
                 # Extract code to explain
                 parts = query.split(' ', 1)
                 if len(parts) > 1:
@@ -170,110 +165,60 @@ def process_query(query, agent_type=None):
                     response = "Please provide code to explain."
             else:
                 # Default to code generation
-                language = "python"  # Default language
-                if "in " in query_lower and any(lang in query_lower for lang in ['python', 'javascript', 'java', 'c++', 'c#', 'ruby', 'go', 'rust']):
-                    for lang in ['python', 'javascript', 'java', 'c++', 'c#', 'ruby', 'go', 'rust']:
-                        if lang in query_lower:
-                            language = lang
-                            break
+                # Default to Python unless the request names another language
+                language = router.code_language(query) if "in " in query.lower() else "python"
                 
                 response = generate_code(query, language)
             
-            output_tokens = count_tokens(response)
-            cost_tracker.track_usage(output_tokens)
-            
             return {
                 "response": response,
-                "agent": "coding",
-                "usage": {
-                    "tokens": input_tokens + output_tokens,
-                    "cost": (input_tokens + output_tokens) * 0.000002
-                }
+                "agent": "coding"
             }
         
         elif agent_type == "math":
             # Process with math agent
             response = math_process_query(query)
-            output_tokens = count_tokens(response)
-            cost_tracker.track_usage(output_tokens)
-            
             return {
                 "response": format_structured_response(response, agent_type, query),
-                "agent": "math",
-                "usage": {
-                    "tokens": input_tokens + output_tokens,
-                    "cost": (input_tokens + output_tokens) * 0.000002
-                }
+                "agent": "math"
             }
         
         elif agent_type == "research":
             # Process with research agent
             response = research_process_query(query)
-            output_tokens = count_tokens(response)
-            cost_tracker.track_usage(output_tokens)
-            
             return {
                 "response": format_structured_response(response, agent_type, query),
-                "agent": "research",
-                "usage": {
-                    "tokens": input_tokens + output_tokens,
-                    "cost": (input_tokens + output_tokens) * 0.000002
-                }
+                "agent": "research"
             }
         
         elif agent_type == "planner":
             # Process with planner agent
             response = planner_process_query(query)
-            output_tokens = count_tokens(response)
-            cost_tracker.track_usage(output_tokens)
-            
             return {
                 "response": format_structured_response(response, agent_type, query),
-                "agent": "planner",
-                "usage": {
-                    "tokens": input_tokens + output_tokens,
-                    "cost": (input_tokens + output_tokens) * 0.000002
-                }
+                "agent": "planner"
             }
         
         elif agent_type == "multi_agent":
             # Process with multi-agent system
             response = multi_agent_process_query(query)
-            output_tokens = count_tokens(response)
-            cost_tracker.track_usage(output_tokens)
-            
             return {
                 "response": format_structured_response(response, agent_type, query),
-                "agent": "multi_agent",
-                "usage": {
-                    "tokens": input_tokens + output_tokens,
-                    "cost": (input_tokens + output_tokens) * 0.000002
-                }
+                "agent": "multi_agent"
             }
         
         else:
             # Default to answerer agent
             response = answerer_process_query(query)
-            output_tokens = count_tokens(response)
-            cost_tracker.track_usage(output_tokens)
-            
             return {
                 "response": format_structured_response(response, agent_type, query),
-                "agent": "answerer",
-                "usage": {
-                    "tokens": input_tokens + output_tokens,
-                    "cost": (input_tokens + output_tokens) * 0.000002
-                }
+                "agent": "answerer"
             }
     except Exception as e:
         logger.error(f"Error processing query: {str(e)}")
         return {
             "response": f"An error occurred: {str(e)}",
-            "agent": agent_type,
-            "usage": {
-                "tokens": input_tokens,
-                "cost": input_tokens * 0.000002
-            }
+            "agent": agent_type
         }
 
 # Routes
@@ -294,10 +239,11 @@ def chat():
     try:
         data = request.json
         message = data.get('message', '')
-        agent_type = data.get('agent', 'auto')
+        agent_type = request_agent(data, message)
+        session_id = request_session_id(data)
         
         # Process the query
-        result = process_query(message, agent_type)
+        result = process_query(message, agent_type, session_id, request_api_key())
         
         # Prepare the response
         response = {
@@ -310,8 +256,32 @@ def chat():
         if "image_path" in result:
             response["image_path"] = result["image_path"]
         
+        if result.get("cached"):
+            response["cached"] = True
+        
+        if result.get("coalesced"):
+            response["coalesced"] = True
+        
+        if result.get("models"):
+            response["models"] = result["models"]
+        
+        if session_id:
+            response["session"] = cost_tracker.store.session_usage(session_id)
+        
         return jsonify(response)
         
+    except budget.BudgetExceeded as e:
+        return jsonify({
+            "error": "The spend budget for this request has been reached.",
+            "details": str(e),
+            "budget": e.to_dict()
+        }), 429
+    except SingleFlightTimeout as e:
+        logger.error(f"Timed out waiting for chat request: {str(e)}")
+        return jsonify({
+            "error": "The request timed out.",
+            "details": str(e)
+        }), 504
     except Exception as e:
         logger.error(f"Error processing chat request: {str(e)}")
         return jsonify({
@@ -319,16 +289,188 @@ def chat():
             "details": str(e)
         }), 500
 
+# Agents whose final step is a single completion can stream it token by token
+def stream_agent(query, agent_type):
+    if agent_type == "math":
+        return stream_executor_query(query)
+    if agent_type == "research":
+        return stream_research(query)
+    if agent_type not in ("concept_chart", "coding", "planner", "multi_agent"):
+        return stream_answer(query)
+    return None
+
+def sse_event(data):
+    return f"data: {json.dumps(data)}\n\n"
+
+def request_agent(data, message):
+    """The agent the client picked; "auto" or none routes the message."""
+    agent = data.get('agent')
+    if not agent or agent == 'auto':
+        return determine_agent(message)
+    return agent
+
+def request_session_id(data):
+    """The client's session id, from the request body or the X-Session-Id header."""
+    return data.get('session_id') or request.headers.get('X-Session-Id')
+
+def request_api_key():
+    """The client's API key from the X-API-Key header, used for per-key budgets."""
+    return request.headers.get('X-API-Key')
+
+@app.route('/api/chat/stream', methods=['POST'])
+def chat_stream():
+    data = request.json
+    message = data.get('message', '')
+    agent_type = request_agent(data, message)
+    session_id = request_session_id(data)
+    api_key = request_api_key()
+    chunks = stream_agent(message, agent_type)
+    
+    def generate():
+        with resilience.attempt_budget(), usage_context.track_usage() as usage, \
+                budget.admission(session_id, api_key) as admitted:
+            yield from generate_events(usage, admitted)
+    
+    def generate_events(usage, admitted):
+        # Agents without a streaming path send their whole answer as one chunk
+        if chunks is None:
+            try:
+                result = process_query(message, agent_type, session_id, api_key)
+            except budget.BudgetExceeded as e:
+                yield sse_event({"type": "error", "error": str(e), "budget": e.to_dict()})
+                return
+            except Exception as e:
+                logger.error(f"Error processing chat request: {str(e)}")
+                yield sse_event({"type": "error", "error": str(e)})
+                return
+            yield sse_event({"type": "start", "agent": result["agent"]})
+            yield sse_event({"type": "token", "text": result["response"]})
+            done = {"type": "done", "response": result["response"], "agent": result["agent"], "usage": result["usage"]}
+            if "image_path" in result:
+                done["image_path"] = result["image_path"]
+            if result.get("models"):
+                done["models"] = result["models"]
+            if session_id:
+                done["session"] = cost_tracker.store.session_usage(session_id)
+            yield sse_event(done)
+            return
+        
+        agent = agent_type if agent_type in ("math", "research") else "answerer"
+        yield sse_event({"type": "start", "agent": agent})
+        
+        parts = []
+        try:
+            for text in chunks:
+                parts.append(text)
+                yield sse_event({"type": "token", "text": text})
+        except budget.BudgetExceeded:
+            pass
+        except Exception as e:
+            logger.error(f"Error streaming chat response: {str(e)}")
+            yield sse_event({"type": "error", "error": str(e)})
+        finally:
+            # Account for usage however the stream ends, a dropped connection included;
+            # closing the agent's stream first records the provider call it was in
+            if hasattr(chunks, "close"):
+                chunks.close()
+            accounted = account_usage(usage, message, "".join(parts), agent, session_id, api_key)
+        
+        response = "".join(parts)
+        if admitted.rejected:
+            yield sse_event({"type": "error", "error": str(admitted.rejected), "budget": admitted.rejected.to_dict()})
+            return
+        done = {
+            "type": "done",
+            "response": format_structured_response(response, agent, message),
+            "agent": agent,
+            **accounted
+        }
+        if session_id:
+            done["session"] = cost_tracker.store.session_usage(session_id)
+        yield sse_event(done)
+    
+    return Response(
+        stream_with_context(generate()),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
 @app.route('/api/image/<path:filename>')
 def serve_image(filename):
     return send_from_directory('.', filename)
 
 @app.route('/api/usage', methods=['GET'])
 def usage():
+    store = cost_tracker.store
+    # Recent usage comes from the minute/hour/day rollups, e.g. ?window=6h&group_by=model&series=1
+    try:
+        rollup = store.rollups.query(
+            window=usage_rollups.parse_window(request.args.get('window', '1h')),
+            granularity=request.args.get('granularity'),
+            group_by=request.args.get('group_by'),
+            series=request.args.get('series', '0') not in ('0', 'false', '')
+        )
+    except ValueError as e:
+        return jsonify({
+            "error": "Invalid usage query.",
+            "details": str(e)
+        }), 400
+    totals = store.totals()
+    result = {
+        'total_tokens': totals['total_tokens'],
+        'total_cost': totals['total_cost'],
+        'daily_usage': store.daily_usage(),
+        'agents': store.breakdown('agent'),
+        'models': store.breakdown('model'),
+        'rollup': rollup
+    }
+    if request.args.get('session'):
+        result['session'] = store.session_usage(request.args['session'])
+    return jsonify(result)
+
+@app.route('/api/capacity', methods=['GET'])
+def capacity_stats():
+    return jsonify({
+        **rate_limiter.get_limiter().stats(),
+        'resilience': resilience.stats(),
+        'plans': plan_executor.stats()
+    })
+
+@app.route('/api/models', methods=['GET'])
+def model_stats():
+    return jsonify(model_router.stats())
+
+# Readiness probe: 503 until the required resources are warm, so traffic only reaches warm instances
+@app.route('/api/ready', methods=['GET'])
+def readiness():
+    # Servers started some other way than app.py or run.py begin warming on the first probe
+    prewarm.start()
+    status = prewarm.status()
+    return jsonify(status), 200 if status["ready"] else 503
+
+@app.route('/api/agents', methods=['GET'])
+def agent_stats():
+    return jsonify(registry.stats())
+
+@app.route('/api/budget', methods=['GET'])
+def budget_stats():
+    return jsonify(budget.get_guard().stats())
+
+@app.route('/api/pricing', methods=['GET'])
+def pricing_stats():
+    return jsonify(pricing.get_pricing().stats())
+
+@app.route('/api/cache', methods=['GET'])
+def cache_stats():
+    # Imported here so that startup does not load the OpenAI SDK
+    from agents.llm_client import inflight_calls
     return jsonify({
-        'total_tokens': cost_tracker.total_tokens,
-        'total_cost': cost_tracker.total_cost,
-        'daily_usage': cost_tracker.daily_usage
+        'llm': llm_cache.get_cache().stats(),
+        'semantic': semantic_cache.get_semantic_cache().stats() if semantic_cache.SEMANTIC_CACHE_ENABLED else {'enabled': False},
+        'coalesced_queries': query_flight.stats(),
+        'coalesced_llm_calls': inflight_calls.stats(),
+        'context': context_budget.stats(),
+        'routing': route_cache.get_route_cache().stats()
     })
 
 # Process functions for different agent types
@@ -343,46 +485,8 @@ def planner_process_query(query):
     return "\n".join([f"{i+1}. {step}" for i, step in enumerate(plan_result.steps)])
 
 def multi_agent_process_query(query):
-    # Initialize agents
-    executor = get_executor()
-    planner = get_planner()
-    replanner = get_replanner()
-    answerer = get_answerer()
-    
-    # Initialize state
-    state = {
-        "input": query,
-        "plan": [],
-        "past_steps": [],
-        "response": ""
-    }
-    
-    # Get initial plan
-    plan_result = planner({"objective": query})
-    state["plan"] = plan_result.steps
-    
-    # Execute steps until we get a response
-    while state["plan"] and not state["response"]:
-        # Execute the first step
-        task = state["plan"][0]
-        executor_result = executor({"input": task})
-        state["past_steps"].append((task, executor_result["output"]))
-        
-        # Remove the executed step
-        state["plan"] = state["plan"][1:]
-        
-        # Replan or get response
-        replan_result = replanner(state)
-        if hasattr(replan_result, "response"):
-            state["response"] = replan_result.response
-        else:
-            state["plan"] = replan_result.steps
-    
-    # If we still don't have a response, use the answerer
-    if not state["response"]:
-        answer_result = answerer({"input": query})
-        state["response"] = answer_result.response
-    
+    # Independent steps of the plan run together, with one replanner call per wave
+    state = plan_executor.run_plan(query, get_planner(), get_executor(), get_replanner(), get_answerer())
     return state["response"]
 
 def answerer_process_query(query):
@@ -394,9 +498,9 @@ if __name__ == '__main__':
     port = int(os.environ.get("PORT", 5000))
     print("Multi-Agent Chatbot Web Interface")
     print("=================================")
-    print("Initializing agents...")
-    executor, planner, replanner, answerer = initialize_agents()
-    print("Agents initialized successfully!")
+    # Agents, the provider connection and caches warm up while the server accepts connections
+    print("Prewarming agents in the background (see /api/ready)...")
+    prewarm.start()
     print(f"PORT environment variable: {os.environ.get('PORT', 'Not set')}")
     print(f"Starting web server on port: {port}")
     app.run(host="0.0.0.0", port=port, debug=False if os.environ.get("PORT") else True)
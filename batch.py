@@ -0,0 +1,243 @@
+import os
+import sys
+import json
+import time
+import argparse
+import logging
+from collections import deque, Counter
+from concurrent.futures import ThreadPoolExecutor
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+def read_records(path, offset=0):
+    """Yields (index, record) pairs from a JSONL file, skipping the first `offset` records."""
+    with open(path, 'r', encoding='utf-8') as f:
+        index = 0
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            if index >= offset:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError as e:
+                    record = {"error": f"Invalid JSON: {str(e)}"}
+                if not isinstance(record, dict):
+                    record = {"error": f"Expected a JSON object, got {type(record).__name__}"}
+                yield index, record
+            index += 1
+
+def count_lines(path):
+    if not os.path.exists(path):
+        return 0
+    with open(path, 'r', encoding='utf-8') as f:
+        return sum(1 for line in f if line.strip())
+
+def next_offset(output_path):
+    """
+    Returns the input offset right after the last record written to
+    output_path, or 0 if it holds none. A torn line left by an interrupted
+    run is cut off, so the resumed run starts on a line of its own.
+    """
+    if not os.path.exists(output_path):
+        return 0
+    offset = 0
+    end = 0
+    position = 0
+    with open(output_path, 'rb+') as f:
+        for line in f:
+            position += len(line)
+            if not line.strip():
+                continue
+            try:
+                result = json.loads(line)
+                offset = result["index"] + 1
+            except (ValueError, TypeError, KeyError):
+                continue
+            end = position
+        if end < position:
+            logger.warning(f"Removing {position - end} bytes of an incomplete result from {output_path}")
+            f.truncate(end)
+        if end:
+            f.seek(end - 1)
+            if f.read(1) != b"\n":
+                f.write(b"\n")
+    return offset
+
+def run_record(process_query, index, record):
+    query = record.get("query") or record.get("message") or ""
+    agent = record.get("agent")
+    if agent in (None, "", "auto"):
+        agent = None
+
+    result = {"index": index, "query": query}
+    if "id" in record:
+        result["id"] = record["id"]
+    if "error" in record and not query:
+        result.update({"agent": agent, "error": record["error"], "latency_ms": 0.0})
+        return result
+
+    start = time.perf_counter()
+    try:
+        output = process_query(query, agent)
+        result.update({
+            "agent": output.get("agent", agent),
+            "response": output.get("response"),
+            "usage": output.get("usage", {})
+        })
+        if "image_path" in output:
+            result["image_path"] = output["image_path"]
+        if output.get("models"):
+            result["models"] = output["models"]
+        if output.get("coalesced"):
+            result["coalesced"] = True
+    except Exception as e:
+        logger.error(f"Error processing record {index}: {str(e)}")
+        result.update({"agent": agent, "error": str(e)})
+    result["latency_ms"] = round((time.perf_counter() - start) * 1000, 1)
+    return result
+
+class BatchSummary:
+    def __init__(self, total=None):
+        self.total = total
+        self.processed = 0
+        self.errors = 0
+        self.coalesced = 0
+        self.tokens = 0
+        self.cost = 0.0
+        self.latencies = []
+        self.agents = Counter()
+        self.models = Counter()
+        self.started = time.perf_counter()
+
+    def add(self, result):
+        self.processed += 1
+        self.latencies.append(result["latency_ms"])
+        self.agents[result.get("agent") or "unknown"] += 1
+        self.models.update(result.get("models", []))
+        if "error" in result:
+            self.errors += 1
+        if result.get("coalesced"):
+            # Its usage was counted with the identical record that computed it
+            self.coalesced += 1
+            return
+        usage = result.get("usage") or {}
+        self.tokens += usage.get("tokens", 0)
+        self.cost += usage.get("cost", 0)
+
+    def percentile(self, p):
+        if not self.latencies:
+            return 0.0
+        ordered = sorted(self.latencies)
+        return ordered[min(len(ordered) - 1, int(p / 100 * len(ordered)))]
+
+    def progress(self):
+        elapsed = time.perf_counter() - self.started
+        rate = self.processed / elapsed if elapsed else 0.0
+        total = f"/{self.total}" if self.total is not None else ""
+        return (f"Processed {self.processed}{total} records ({self.errors} errors) | "
+                f"{rate:.2f} records/s | {self.tokens:,} tokens (${self.cost:.4f})")
+
+    def report(self):
+        elapsed = time.perf_counter() - self.started
+        agents = ", ".join(f"{agent}: {count}" for agent, count in self.agents.most_common())
+        models = ", ".join(f"{model}: {count}" for model, count in self.models.most_common())
+        return f"""
+Batch Summary:
+-------------
+Records: {self.processed:,} ({self.errors:,} errors, {self.coalesced:,} coalesced)
+Elapsed: {elapsed:.1f}s ({self.processed / elapsed if elapsed else 0.0:.2f} records/s)
+Latency: p50 {self.percentile(50):.0f} ms | p95 {self.percentile(95):.0f} ms | max {max(self.latencies, default=0):.0f} ms
+Total Tokens: {self.tokens:,}
+Total Cost: ${self.cost:.4f}
+Agents: {agents or 'none'}
+Models: {models or 'none'}
+"""
+
+def run_batch(input_path, output_path, concurrency=4, offset=0, limit=None, progress_every=100,
+              process_query=None):
+    """
+    Runs every record of a JSONL file through the agent router and appends
+    one result line per record to output_path, in input order.
+    At most `concurrency` records are processed at a time.
+    """
+    if process_query is None:
+        from app import process_query
+
+    total = count_lines(input_path) - offset
+    if limit is not None:
+        total = min(total, limit)
+    summary = BatchSummary(total=max(total, 0))
+
+    records = read_records(input_path, offset)
+    pending = deque()
+    window = max(1, concurrency) * 2
+
+    with ThreadPoolExecutor(max_workers=max(1, concurrency)) as pool, \
+            open(output_path, 'a', encoding='utf-8') as out:
+        submitted = 0
+
+        def submit_next():
+            nonlocal submitted
+            if limit is not None and submitted >= limit:
+                return False
+            try:
+                index, record = next(records)
+            except StopIteration:
+                return False
+            pending.append(pool.submit(run_record, process_query, index, record))
+            submitted += 1
+            return True
+
+        while len(pending) < window and submit_next():
+            pass
+
+        # Results are written in input order so an interrupted run can resume after the last index
+        while pending:
+            result = pending.popleft().result()
+            out.write(json.dumps(result) + "\n")
+            out.flush()
+            summary.add(result)
+            if progress_every and summary.processed % progress_every == 0:
+                logger.info(summary.progress())
+            submit_next()
+
+    return summary
+
+def main():
+    parser = argparse.ArgumentParser(description='Run a JSONL file of {query, agent} records through the agents')
+    parser.add_argument('input', type=str, help='Input JSONL file')
+    parser.add_argument('--output', '-o', type=str, help='Output JSONL file (default: <input>.results.jsonl)')
+    parser.add_argument('--concurrency', '-c', type=int, default=4, help='Records processed at the same time')
+    parser.add_argument('--offset', type=int, default=0, help='Skip the first N records')
+    parser.add_argument('--resume', action='store_true', help='Continue after the records already in the output file')
+    parser.add_argument('--limit', type=int, help='Process at most N records')
+    parser.add_argument('--progress-every', type=int, default=100, help='Log progress every N records')
+
+    args = parser.parse_args()
+    output_path = args.output or os.path.splitext(args.input)[0] + ".results.jsonl"
+
+    offset = args.offset
+    if args.resume:
+        offset = max(offset, next_offset(output_path))
+        logger.info(f"Resuming from record {offset}")
+    elif args.offset == 0 and os.path.exists(output_path):
+        # Start a fresh output file unless we are resuming or continuing from an offset
+        open(output_path, 'w').close()
+
+    summary = run_batch(
+        args.input,
+        output_path,
+        concurrency=args.concurrency,
+        offset=offset,
+        limit=args.limit,
+        progress_every=args.progress_every
+    )
+    print(summary.report())
+    print(f"Results written to {output_path}")
+    return 1 if summary.errors and summary.errors == summary.processed else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,100 @@
+import sys
+import time
+import argparse
+from agents import router
+
+SHORT_QUERIES = [
+    "What is the capital of France?",
+    "Plot the population of the five largest countries",
+    "Write a Python function that checks whether a number is an Armstrong number.",
+    "How to prepare for a marathon in three months",
+    "Compare the economies of Japan and Germany since 1990",
+    "What is the best online course for beginners?"
+]
+
+CODE_SNIPPET = '''
+def load_records(path):
+    """Read newline-delimited records, skipping blank lines."""
+    records = []
+    with open(path, encoding="utf-8") as f:
+        for number, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                records.append(parse(line))
+            except ValueError as exc:
+                print(f"line {number}: {exc}")
+    return records
+'''
+
+def long_query(lines):
+    """A question with pasted code, as users send them to the coding agent."""
+    snippet = CODE_SNIPPET.strip("\n").splitlines()
+    body = "\n".join(snippet[i % len(snippet)] for i in range(lines))
+    return f"Why does this raise a KeyError when the file has a header row?\n\n{body}\n\nTraceback: KeyError: 'id'"
+
+def legacy_determine_agent(query):
+    # The any(...) chain app.py used before the router
+    query = query.lower()
+    if any(word in query for word in ["plot", "chart", "visualize", "compare", "graph", "show", "display", "bar", "line", "pie"]):
+        return "concept_chart"
+    if any(word in query for word in ["concept", "map", "outline", "structure"]):
+        return "concept_chart"
+    if any(word in query for word in ["code", "program", "function", "class", "debug", "error", "fix", "implement"]):
+        return "coding"
+    if any(word in query for word in ["calculate", "math", "equation", "formula", "solve", "compute"]):
+        return "math"
+    if any(word in query for word in ["research", "find", "search", "look up", "information about", "what is", "who is", "where is"]):
+        return "research"
+    if any(word in query for word in ["plan", "strategy", "approach", "steps", "how to", "guide", "tutorial"]):
+        return "planner"
+    return "multi_agent"
+
+def legacy_scores(query):
+    # Every category checked with substring scans, as the scores need
+    query = query.lower()
+    return {category: sum(1 for keyword in keywords if keyword in query)
+            for category, keywords in router.AGENT_RULES.items()}
+
+def router_determine_agent(query):
+    return router.match(query).best(["concept_chart", "coding", "math", "research", "planner"], "multi_agent")
+
+def time_per_call(fn, queries, rounds):
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for query in queries:
+            fn(query)
+    return (time.perf_counter() - start) / (rounds * len(queries))
+
+def main():
+    parser = argparse.ArgumentParser(description='Micro-benchmark of keyword agent routing')
+    parser.add_argument('--rounds', type=int, default=2000, help='Times each short query is routed')
+    parser.add_argument('--code-lines', type=int, default=400, help='Lines of pasted code in the long query')
+    args = parser.parse_args()
+
+    # Compile outside the timed loop, as a server would on its first request
+    router.match("")
+    long_queries = [long_query(args.code_lines)]
+    long_rounds = max(1, args.rounds // 20)
+
+    print(f"Long query: {len(long_queries[0]):,} characters")
+    print("first match: the app.py any(...) chain, which stops at the first category that matches")
+    print("all categories: the same substring scans for every category, as scoring needs\n")
+    print(f"{'Workload':<16} {'first match us':>15} {'all categories us':>18} {'router us':>10} {'vs all':>8}")
+    for name, queries, rounds in (("short queries", SHORT_QUERIES, args.rounds),
+                                  ("pasted code", long_queries, long_rounds)):
+        first = time_per_call(legacy_determine_agent, queries, rounds)
+        scanned = time_per_call(legacy_scores, queries, rounds)
+        compiled = time_per_call(router_determine_agent, queries, rounds)
+        print(f"{name:<16} {first * 1e6:>15.2f} {scanned * 1e6:>18.2f} {compiled * 1e6:>10.2f} {scanned / compiled:>7.1f}x")
+
+    print("\nRouting differences (legacy -> router):")
+    for query in SHORT_QUERIES + long_queries:
+        before, after = legacy_determine_agent(query), router_determine_agent(query)
+        if before != after:
+            print(f"  {query[:60]!r}: {before} -> {after}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
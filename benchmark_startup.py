@@ -0,0 +1,345 @@
+import os
+import re
+import sys
+import json
+import hashlib
+import time
+import socket
+import argparse
+import tempfile
+import importlib.util
+import statistics
+import subprocess
+import urllib.error
+import urllib.request
+from agents.registry import AGENTS
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+# Entry points timed by importing them; the Streamlit, Chainlit and LangGraph
+# apps are skipped when their framework is not installed
+ENTRY_POINTS = ["app", "run", "cli", "main", "graph", "agents.math_agent", "agents.research_agent"]
+
+# Servers timed from launch until they answer HTTP, until their readiness path
+# answers 200 and then until the first chat answer:
+# name -> (command, readiness path, chat request or None, framework module)
+SERVERS = {
+    "app": ([sys.executable, "app.py"], "/api/ready", "/api/chat", None),
+    "run": ([sys.executable, "run.py"], "/api/ready", "/api/chat", None),
+    "main": ([sys.executable, "-m", "streamlit", "run", "main.py", "--server.headless", "true",
+              "--server.port", "{port}"], "/_stcore/health", None, "streamlit"),
+    "math_agent": ([sys.executable, "-m", "chainlit", "run", "agents/math_agent.py", "--headless", "--port", "{port}"],
+                   "/", None, "chainlit"),
+    "research_agent": ([sys.executable, "-m", "chainlit", "run", "agents/research_agent.py", "--headless",
+                        "--port", "{port}"], "/", None, "chainlit")
+}
+
+# The question every entry point answers; the answerer makes a single LLM call
+FIRST_QUERY = "hello there"
+
+TIME_IMPORT = """
+import json, time
+start = time.perf_counter()
+import {module}
+print(json.dumps(time.perf_counter() - start))
+"""
+
+TIME_AGENT = """
+import json, time
+from agents import registry
+start = time.perf_counter()
+for name in {names!r}:
+    registry.load(name)
+print(json.dumps(time.perf_counter() - start))
+"""
+
+# The eager import of every agent; with --relative, baseline times are scaled by
+# how much slower or faster this machine runs it than the machine that saved them
+REFERENCE_METRIC = "agents:all"
+
+# Where tiktoken caches the encoding the token counter uses
+TIKTOKEN_ENCODING_URL = "https://openaipublic.blob.core.windows.net/encodings/cl100k_base.tiktoken"
+
+# import time: self [us] | cumulative | imported package
+IMPORTTIME_LINE = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)")
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def run_cold(code, env, *flags):
+    """Seconds reported by `code` in a fresh interpreter and its stderr, or the error that stopped it."""
+    result = subprocess.run([sys.executable, *flags, "-c", code], cwd=ROOT, env=env, capture_output=True, text=True)
+    if result.returncode != 0:
+        lines = result.stderr.strip().splitlines()
+        return None, lines[-1] if lines else f"exit code {result.returncode}"
+    return json.loads(result.stdout.strip().splitlines()[-1]), result.stderr
+
+def median_cold(code, env, runs):
+    times = []
+    for _ in range(runs):
+        seconds, output = run_cold(code, env)
+        if seconds is None:
+            return None, output
+        times.append(seconds)
+    return statistics.median(times), None
+
+def parse_importtime(stderr, depth=1):
+    """(cumulative ms, module) of the imports `depth` levels below the timed module, slowest first."""
+    modules = []
+    for line in stderr.splitlines():
+        match = IMPORTTIME_LINE.match(line)
+        if match and len(match.group(3)) // 2 == depth:
+            modules.append((int(match.group(2)) / 1000, match.group(4)))
+    return sorted(modules, reverse=True)
+
+def wait_for_http(url, process, timeout, ok=False):
+    """
+    Seconds until `url` answers, with 200 when `ok`, or None if the process
+    exits or the timeout passes first.
+    """
+    start = time.perf_counter()
+    while time.perf_counter() - start < timeout:
+        if process.poll() is not None:
+            return None
+        try:
+            with urllib.request.urlopen(url, timeout=1):
+                return time.perf_counter() - start
+        except urllib.error.HTTPError:
+            if not ok:
+                return time.perf_counter() - start
+            time.sleep(0.02)
+        except OSError:
+            time.sleep(0.02)
+    return None
+
+def post_json(url, payload, timeout):
+    request = urllib.request.Request(url, json.dumps(payload).encode("utf-8"), {"Content-Type": "application/json"})
+    with urllib.request.urlopen(request, timeout=timeout) as response:
+        return json.loads(response.read())
+
+def time_server(name, env, timeout):
+    """
+    (seconds until it listens, seconds to ready, seconds to the first answer
+    or None) for one launch of a server. A server is ready once its readiness
+    path answers 200, so a warming one that answers 503 is not yet.
+    """
+    command, ready_path, chat_path, _ = SERVERS[name]
+    port = free_port()
+    env = dict(env, PORT=str(port))
+    with tempfile.TemporaryFile() as log:
+        start = time.perf_counter()
+        process = subprocess.Popen([part.format(port=port) for part in command], cwd=ROOT, env=env,
+                                   stdout=log, stderr=subprocess.STDOUT, stdin=subprocess.DEVNULL)
+        try:
+            url = f"http://127.0.0.1:{port}{ready_path}"
+            if wait_for_http(url, process, timeout) is None:
+                log.seek(0)
+                lines = log.read().decode("utf-8", "replace").strip().splitlines()
+                raise RuntimeError(lines[-1] if lines else "did not start")
+            listening = time.perf_counter() - start
+            if wait_for_http(url, process, timeout, ok=True) is None:
+                raise RuntimeError(f"{ready_path} did not answer 200")
+            ready = time.perf_counter() - start
+            if chat_path is None:
+                return listening, ready, None
+            post_json(f"http://127.0.0.1:{port}{chat_path}", {"message": FIRST_QUERY, "agent": "answerer"}, timeout)
+            return listening, ready, time.perf_counter() - start
+        finally:
+            process.terminate()
+            try:
+                process.wait(timeout=5)
+            except subprocess.TimeoutExpired:
+                process.kill()
+
+def time_cli(env, timeout):
+    """(None, seconds until the CLI prompts, seconds until it prints its first answer)."""
+    start = time.perf_counter()
+    process = subprocess.Popen([sys.executable, "-u", "cli.py"], cwd=ROOT, env=env, stdin=subprocess.PIPE,
+                               stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True)
+    try:
+        process.stdin.write(f"answerer {FIRST_QUERY}\nexit\n")
+        process.stdin.flush()
+        ready = None
+        for line in process.stdout:
+            if ready is None and "Agents initialized" in line:
+                ready = time.perf_counter() - start
+            if line.startswith("Usage:") or line.startswith("Error:"):
+                return None, ready, time.perf_counter() - start
+            if time.perf_counter() - start > timeout:
+                break
+        raise RuntimeError("no answer")
+    finally:
+        process.kill()
+        process.wait()
+
+def median_runs(measure, runs):
+    """The median of each of the times `measure` returns, or None for a time it never measured."""
+    results = [measure() for _ in range(runs)]
+    medians = []
+    for times in zip(*results):
+        measured = [seconds for seconds in times if seconds is not None]
+        medians.append(statistics.median(measured) if measured else None)
+    return medians
+
+def start_mock_provider(env):
+    port = free_port()
+    process = subprocess.Popen([sys.executable, "mock_llm_server.py", "--port", str(port), "--latency-ms", "0",
+                                "--distribution", "fixed", "--tokens-per-second", "100000"],
+                               cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    if wait_for_http(f"http://127.0.0.1:{port}/stats", process, 30) is None:
+        process.kill()
+        raise RuntimeError("The mock LLM server did not start")
+    return process, f"http://127.0.0.1:{port}/v1"
+
+def tokenizer_cached(env):
+    """Whether tiktoken can load the encoding from its cache, without the network."""
+    cache_dir = env.get("TIKTOKEN_CACHE_DIR", env.get("DATA_GYM_CACHE_DIR"))
+    if cache_dir is None:
+        cache_dir = os.path.join(tempfile.gettempdir(), "data-gym-cache")
+    return bool(cache_dir) and os.path.exists(
+        os.path.join(cache_dir, hashlib.sha1(TIKTOKEN_ENCODING_URL.encode()).hexdigest()))
+
+def compare(baseline, current, tolerance, slack_ms, reference=None):
+    """
+    Metrics slower than their baseline by more than `tolerance` (a fraction)
+    plus `slack_ms`, as (metric, allowed baseline ms, measured ms). With a
+    `reference` metric, baseline times are first scaled by the ratio of its
+    current to its baseline time, so a slower machine is not a regression.
+    """
+    scale = 1.0
+    if reference is not None:
+        if not baseline.get(reference) or not current.get(reference):
+            raise ValueError(f"{reference} is needed in both the baseline and this run to compare relative times")
+        scale = current[reference] / baseline[reference]
+    regressions = []
+    for metric, ms in sorted(current.items()):
+        allowed = baseline.get(metric)
+        if metric == reference or allowed is None:
+            continue
+        allowed *= scale
+        if ms > allowed * (1 + tolerance) + slack_ms:
+            regressions.append((metric, round(allowed, 1), ms))
+    return regressions
+
+def fmt(seconds):
+    return f"{seconds * 1000:>10.0f}" if seconds is not None else f"{'-':>10}"
+
+def main():
+    parser = argparse.ArgumentParser(description='Startup time of every entry point, offline against a mock provider')
+    parser.add_argument('--runs', type=int, default=3, help='Fresh processes per measurement (the median is shown)')
+    parser.add_argument('--profile', type=int, default=8, help='Slowest imports listed per entry point (0 to skip)')
+    parser.add_argument('--timeout', type=float, default=60, help='Seconds a server gets to start and answer')
+    parser.add_argument('--skip-servers', action='store_true', help='Only time imports and agent loading')
+    parser.add_argument('--baseline', help='JSON file of startup times in ms to compare against')
+    parser.add_argument('--save-baseline', help='Write the measured times in ms to this JSON file')
+    parser.add_argument('--tolerance', type=float, default=0.5,
+                        help='Fraction a time may exceed its baseline by before it counts as a regression')
+    parser.add_argument('--slack-ms', type=float, default=100, help='Absolute allowance added to every baseline time')
+    parser.add_argument('--relative', action='store_true',
+                        help=f'Scale the baseline by this machine\'s {REFERENCE_METRIC} time before comparing')
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="startup-benchmark-")
+    env = dict(os.environ)
+    # Nothing reaches a real provider or touches the project's databases
+    env.update({
+        "OPENROUTER_API_KEY": "benchmark",
+        "LLM_CACHE": "0",
+        "SEMANTIC_CACHE": "0",
+        "LLM_CACHE_PATH": os.path.join(workdir, "llm_cache.db"),
+        "USAGE_DB_PATH": os.path.join(workdir, "usage.db"),
+        "LANGCHAIN_TRACING_V2": "false",
+        "PYTHONDONTWRITEBYTECODE": "1"
+    })
+    if not tokenizer_cached(env):
+        # Without a cached encoding, tiktoken would download it during the timed runs
+        env["TOKENIZER"] = "0"
+        print("The tiktoken encoding is not cached, so token counts are approximated (see TIKTOKEN_CACHE_DIR)\n")
+    metrics = {}
+
+    print(f"{'Entry point':<16} {'import ms':>10}")
+    for module in ENTRY_POINTS:
+        seconds, error = median_cold(TIME_IMPORT.format(module=module), env, args.runs)
+        if error:
+            print(f"{module:<16} skipped: {error}")
+            continue
+        metrics[f"import:{module}"] = round(seconds * 1000, 1)
+        print(f"{module:<16} {fmt(seconds)}")
+        if args.profile:
+            _, stderr = run_cold(TIME_IMPORT.format(module=module), env, "-X", "importtime")
+            for ms, name in parse_importtime(stderr)[:args.profile]:
+                print(f"    {name:<40} {ms:>8.0f}")
+
+    print(f"\n{'Agent':<16} {'load ms':>10}  module")
+    for spec in AGENTS:
+        seconds, error = median_cold(TIME_AGENT.format(names=[spec.name]), env, args.runs)
+        if error:
+            print(f"{spec.name:<16} failed: {error}")
+            continue
+        metrics[f"agent:{spec.name}"] = round(seconds * 1000, 1)
+        print(f"{spec.name:<16} {fmt(seconds)}  agents.{spec.module}")
+    seconds, error = median_cold(TIME_AGENT.format(names=[spec.name for spec in AGENTS]), env, args.runs)
+    if not error:
+        metrics[REFERENCE_METRIC] = round(seconds * 1000, 1)
+    print(f"{'all agents':<16} {'failed: ' + error if error else fmt(seconds)}  (what an eager startup imports)")
+
+    if not args.skip_servers:
+        provider, base_url = start_mock_provider(env)
+        env["OPENROUTER_BASE_URL"] = base_url
+        try:
+            print(f"\n{'Process':<16} {'listen ms':>10} {'ready ms':>10} {'first answer ms':>16}")
+            measurements = [("cli", lambda: time_cli(env, args.timeout))]
+            measurements.extend((name, lambda name=name: time_server(name, env, args.timeout)) for name in SERVERS)
+            for name, measure in measurements:
+                framework = SERVERS[name][3] if name in SERVERS else None
+                if framework and importlib.util.find_spec(framework) is None:
+                    print(f"{name:<16} skipped: {framework} is not installed")
+                    continue
+                try:
+                    listening, ready, answered = median_runs(measure, args.runs)
+                except (RuntimeError, OSError) as e:
+                    print(f"{name:<16} failed: {str(e)}")
+                    continue
+                if listening is not None:
+                    metrics[f"listen:{name}"] = round(listening * 1000, 1)
+                metrics[f"ready:{name}"] = round(ready * 1000, 1)
+                if answered is not None:
+                    metrics[f"first_answer:{name}"] = round(answered * 1000, 1)
+                print(f"{name:<16} {fmt(listening)} {fmt(ready)} {fmt(answered):>16}")
+        finally:
+            provider.terminate()
+            provider.wait()
+
+    if args.save_baseline:
+        with open(args.save_baseline, 'w') as f:
+            json.dump(metrics, f, indent=2, sort_keys=True)
+            f.write("\n")
+        print(f"\nBaseline written to {args.save_baseline}")
+
+    if args.baseline:
+        with open(args.baseline, 'r') as f:
+            baseline = json.load(f)
+        reference = REFERENCE_METRIC if args.relative else None
+        try:
+            regressions = compare(baseline, metrics, args.tolerance, args.slack_ms, reference)
+        except ValueError as e:
+            print(f"\n{str(e)}")
+            return 1
+        if reference:
+            print(f"\nBaseline scaled by {metrics[reference] / baseline[reference]:.2f}, "
+                  f"this machine's {reference} time relative to the baseline's")
+        unmeasured = sorted(set(metrics) - set(baseline))
+        if unmeasured:
+            print(f"\nNot in the baseline, so not checked: {', '.join(unmeasured)}")
+        if regressions:
+            print(f"\nStartup regressed beyond {args.tolerance:.0%} + {args.slack_ms:.0f} ms of {args.baseline}:")
+            for metric, allowed, ms in regressions:
+                print(f"  {metric}: {ms:.0f} ms (baseline {allowed:.0f} ms{' scaled' if reference else ''})")
+            return 1
+        print(f"\nNo startup regressions against {args.baseline}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
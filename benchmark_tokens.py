@@ -0,0 +1,61 @@
+import sys
+import time
+import argparse
+import tiktoken
+from agents import token_counter
+
+SAMPLE_TEXTS = [
+    "What is the capital of France?",
+    "Write a Python function that checks whether a number is an Armstrong number.",
+    "Explain the difference between supervised and unsupervised learning with examples.",
+    "Page: Python (programming language)\nSummary: Python is a high-level, general-purpose programming "
+    "language. Its design philosophy emphasizes code readability with the use of significant indentation.",
+    "Translate 'Good morning, how are you today?' to Spanish."
+]
+
+def legacy_count_tokens(text: str) -> int:
+    # The per-call lookup every module used to do
+    encoding = tiktoken.encoding_for_model("gpt-3.5-turbo")
+    return len(encoding.encode(text))
+
+def time_per_call(fn, texts, rounds):
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for text in texts:
+            fn(text)
+    return (time.perf_counter() - start) / (rounds * len(texts))
+
+def time_batch(texts, rounds):
+    start = time.perf_counter()
+    for _ in range(rounds):
+        token_counter.count_tokens_batch(texts)
+    return (time.perf_counter() - start) / (rounds * len(texts))
+
+def main():
+    parser = argparse.ArgumentParser(description='Micro-benchmark of token counting')
+    parser.add_argument('--rounds', type=int, default=2000, help='Times each sample text is counted')
+    parser.add_argument('--batch-size', type=int, default=100, help='Texts per count_tokens_batch call')
+    args = parser.parse_args()
+
+    if token_counter.get_encoding() is None:
+        print("The tiktoken encoder could not be loaded; only the approximate counter can be measured.")
+        print(f"approx_tokens: {time_per_call(token_counter.approx_tokens, SAMPLE_TEXTS, args.rounds) * 1e6:.2f} us/text")
+        return 1
+
+    batch = (SAMPLE_TEXTS * (args.batch_size // len(SAMPLE_TEXTS) + 1))[:args.batch_size]
+    batch_rounds = max(1, args.rounds * len(SAMPLE_TEXTS) // len(batch))
+    results = [
+        ("legacy count_tokens (encoder lookup per call)", time_per_call(legacy_count_tokens, SAMPLE_TEXTS, args.rounds)),
+        ("token_counter.count_tokens (cached encoder)", time_per_call(token_counter.count_tokens, SAMPLE_TEXTS, args.rounds)),
+        (f"token_counter.count_tokens_batch ({len(batch)} texts)", time_batch(batch, batch_rounds)),
+        ("token_counter.approx_tokens", time_per_call(token_counter.approx_tokens, SAMPLE_TEXTS, args.rounds))
+    ]
+
+    baseline = results[0][1]
+    print(f"{'Counter':<50} {'us/text':>10} {'speedup':>9}")
+    for name, seconds in results:
+        print(f"{name:<50} {seconds * 1e6:>10.2f} {baseline / seconds:>8.1f}x")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
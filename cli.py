@@ -1,13 +1,7 @@
-import os
 from dotenv import load_dotenv
 import logging
-from agents.research_agent_cli import process_query as research_process_query
-from agents.executor import get_executor
-from agents.planner import get_planner, get_replanner, get_answerer
-from agents.coding_agent_cli import generate_code, explain_code, debug_code
-import tiktoken
-import json
-from datetime import datetime
+from agents.registry import entry
+from agents import budget, intent_classifier, plan_executor, route_cache, router, usage_context, usage_store
 
 # Set up logging
 logging.basicConfig(level=logging.INFO)
@@ -16,54 +10,18 @@ logger = logging.getLogger(__name__)
 # Load environment variables
 load_dotenv()
 
-# Initialize token counter
-def count_tokens(text: str) -> int:
-    encoding = tiktoken.encoding_for_model("gpt-3.5-turbo")
-    return len(encoding.encode(text))
+# Usage goes to the store shared by every agent and process
+cost_tracker = usage_store.CostTracker('cli', session=usage_store.new_session_id())
 
-# Cost tracking
-class CostTracker:
-    def __init__(self):
-        self.total_tokens = 0
-        self.total_cost = 0
-        self.daily_usage = {}
-        self.load_usage()
-
-    def load_usage(self):
-        if os.path.exists('usage.json'):
-            with open('usage.json', 'r') as f:
-                data = json.load(f)
-                self.total_tokens = data.get('total_tokens', 0)
-                self.total_cost = data.get('total_cost', 0)
-                self.daily_usage = data.get('daily_usage', {})
-
-    def save_usage(self):
-        with open('usage.json', 'w') as f:
-            json.dump({
-                'total_tokens': self.total_tokens,
-                'total_cost': self.total_cost,
-                'daily_usage': self.daily_usage
-            }, f)
-
-    def track_usage(self, tokens: int):
-        today = datetime.now().strftime('%Y-%m-%d')
-        self.total_tokens += tokens
-        self.daily_usage[today] = self.daily_usage.get(today, 0) + tokens
-        # Calculate cost (GPT-3.5-turbo: $0.002 per 1K tokens)
-        self.total_cost = (self.total_tokens / 1000) * 0.002
-        self.save_usage()
-
-    def get_usage_summary(self):
-        return f"""
-Usage Summary:
--------------
-Total Tokens: {self.total_tokens:,}
-Total Cost: ${self.total_cost:.4f}
-Today's Usage: {self.daily_usage.get(datetime.now().strftime('%Y-%m-%d'), 0):,} tokens
-"""
-
-# Initialize cost tracker
-cost_tracker = CostTracker()
+# Agents are imported the first time they are used (see agents/registry.py)
+research_process_query = entry("research", "run")
+get_executor = entry("math", "init")
+get_planner = entry("planner", "init")
+get_replanner = entry("multi_agent", "replanner")
+get_answerer = entry("answerer", "init")
+generate_code = entry("coding", "generate")
+explain_code = entry("coding", "explain")
+debug_code = entry("coding", "debug")
 
 # Initialize agents
 def initialize_agents():
@@ -73,59 +31,42 @@ def initialize_agents():
     answerer = get_answerer()
     return executor, planner, replanner, answerer
 
+# Agents considered for a query's keyword matches, most specific first
+AGENT_ORDER = ["coding", "math", "research", "planner", "multi_agent"]
+# Agents the intent classifier may pick
+CLASSIFIED_AGENTS = AGENT_ORDER + ["answerer"]
+# CLI names of the router's categories
+AGENT_NAMES = {"math": "executor", "multi_agent": "multi-agent"}
+
 # Determine which agent should handle the query
 def determine_agent(query):
-    query_lower = query.lower()
-    
-    # Coding/execution queries
-    if any(keyword in query_lower for keyword in [
-        'code', 'program', 'write', 'implement', 'function', 'class',
-        'script', 'debug', 'fix', 'error', 'exception', 'run', 'execute',
-        'compile', 'build', 'test', 'algorithm', 'data structure'
-    ]):
-        return "coding"
-    
-    # Mathematical concepts and calculations
-    elif any(keyword in query_lower for keyword in [
-        'calculate', 'math', 'mathematical', 'formula', 'equation', 'solve',
-        'prime', 'armstrong', 'fibonacci', 'factorial', 'gcd', 'lcm',
-        'square root', 'power', 'exponent', 'logarithm', 'trigonometry',
-        'geometry', 'algebra', 'calculus', 'statistics', 'probability'
-    ]):
-        return "executor"
-    
-    # Research queries
-    elif any(keyword in query_lower for keyword in [
-        'research', 'find information about', 'tell me about', 'what is', 
-        'who is', 'when did', 'where is', 'how does', 'explain', 'describe',
-        'history of', 'meaning of', 'definition of', 'facts about'
-    ]):
-        return "research"
-    
-    # Planning queries
-    elif any(keyword in query_lower for keyword in [
-        'how to', 'steps', 'plan', 'process', 'guide', 'instructions',
-        'method', 'way to', 'approach', 'strategy', 'tutorial'
-    ]):
-        return "planner"
-    
-    # Multi-agent system queries (complex tasks that need multiple steps)
-    elif any(keyword in query_lower for keyword in [
-        'compare', 'analyze', 'evaluate', 'investigate', 'study',
-        'find out', 'figure out', 'determine', 'calculate', 'solve'
-    ]) or len(query.split()) > 15:
-        return "multi-agent"
-    
-    # Simple queries (direct answers)
-    else:
-        return "answerer"
+    # Queries that normalize the same are routed once
+    return route_cache.route("cli", query, decide_agent)
 
-# Process query with the appropriate agent
+def decide_agent(query):
+    # A confident prediction from the trained classifier wins over the keyword rules
+    agent = intent_classifier.predict_agent(query, CLASSIFIED_AGENTS)
+    if agent is None:
+        agent = router.match(query).best(AGENT_ORDER)
+    
+    # Long queries are complex tasks that need multiple steps
+    if agent is None and len(query.split()) > 15:
+        agent = "multi_agent"
+    
+    # Simple queries get a direct answer
+    return AGENT_NAMES.get(agent, agent) if agent else "answerer"
+
+# Process query with the appropriate agent, accounting for every LLM call it makes
 def process_query(query, agent_type=None):
-    # Track input tokens
-    input_tokens = count_tokens(query)
-    cost_tracker.track_usage(input_tokens)
-    
+    with usage_context.track_usage() as usage, budget.admission(cost_tracker.session) as admitted:
+        response, agent_type = run_agent(query, agent_type)
+    usage.count_locally(query, response)
+    cost_tracker.track_request(usage, agent_type)
+    if admitted.rejected:
+        raise admitted.rejected
+    return response, usage, agent_type
+
+def run_agent(query, agent_type=None):
     # If agent_type is not specified, determine it
     if agent_type is None:
         agent_type = determine_agent(query)
@@ -136,9 +77,9 @@ def process_query(query, agent_type=None):
     # Process query with the appropriate agent
     if agent_type == "coding":
         # Determine if it's a code generation, explanation, or debugging request
-        query_lower = query.lower()
+        task = router.coding_task(query)
         
-        if any(keyword in query_lower for keyword in ['debug', 'fix', 'error', 'exception']):
+        if task == "debug":
             # Extract code and error message if present
             parts = query.split(' ', 1)
             if len(parts) > 1:
@@ -151,7 +92,7 @@ def process_query(query, agent_type=None):
                 response = debug_code(code, error_message)
             else:
                 response = "Please provide code to debug."
-        elif any(keyword in query_lower for keyword in ['explain', 'how does', 'what does']):
+        elif task == "explain":
             # Extract code to explain
             parts = query.split(' ', 1)
             if len(parts) > 1:
@@ -161,84 +102,36 @@ def process_query(query, agent_type=None):
                 response = "Please provide code to explain."
         else:
             # Default to code generation
-            language = "python"  # Default language
-            if "in " in query_lower and any(lang in query_lower for lang in ['python', 'javascript', 'java', 'c++', 'c#', 'ruby', 'go', 'rust']):
-                for lang in ['python', 'javascript', 'java', 'c++', 'c#', 'ruby', 'go', 'rust']:
-                    if lang in query_lower:
-                        language = lang
-                        break
+            # Default to Python unless the request names another language
+            language = router.code_language(query) if "in " in query.lower() else "python"
             
             response = generate_code(query, language)
         
-        output_tokens = count_tokens(response)
-        cost_tracker.track_usage(output_tokens)
-        return response, input_tokens + output_tokens, agent_type
+        return response, agent_type
     
     elif agent_type == "executor":
         executor_result = executor({"input": query})
         response = executor_result["output"]
-        output_tokens = count_tokens(response)
-        cost_tracker.track_usage(output_tokens)
-        return response, input_tokens + output_tokens, agent_type
+        return response, agent_type
     
     elif agent_type == "research":
         response = research_process_query(query)
-        output_tokens = count_tokens(response)
-        cost_tracker.track_usage(output_tokens)
-        return response, input_tokens + output_tokens, agent_type
+        return response, agent_type
     
     elif agent_type == "planner":
         plan_result = planner({"objective": query})
         response = "\n".join([f"{i+1}. {step}" for i, step in enumerate(plan_result.steps)])
-        output_tokens = count_tokens(response)
-        cost_tracker.track_usage(output_tokens)
-        return response, input_tokens + output_tokens, agent_type
+        return response, agent_type
     
     elif agent_type == "multi-agent":
-        # Initialize state
-        state = {
-            "input": query,
-            "plan": [],
-            "past_steps": [],
-            "response": ""
-        }
-        
-        # Get initial plan
-        plan_result = planner({"objective": query})
-        state["plan"] = plan_result.steps
-        
-        # Execute steps until we get a response
-        while state["plan"] and not state["response"]:
-            # Execute the first step
-            task = state["plan"][0]
-            executor_result = executor({"input": task})
-            state["past_steps"].append((task, executor_result["output"]))
-            
-            # Remove the executed step
-            state["plan"] = state["plan"][1:]
-            
-            # Replan or get response
-            replan_result = replanner(state)
-            if hasattr(replan_result, "response"):
-                state["response"] = replan_result.response
-            else:
-                state["plan"] = replan_result.steps
-        
-        # If we still don't have a response, use the answerer
-        if not state["response"]:
-            answer_result = answerer({"input": query})
-            state["response"] = answer_result.response
-        
-        output_tokens = count_tokens(state["response"])
-        cost_tracker.track_usage(output_tokens)
-        return state["response"], input_tokens + output_tokens, agent_type
+        # Independent steps of the plan run together, with one replanner call per wave
+        state = plan_executor.run_plan(query, planner, executor, replanner, answerer)
+        return state["response"], agent_type
     
     else:  # answerer
         answer_result = answerer({"input": query})
         response = answer_result.response
-        output_tokens = count_tokens(response)
-        cost_tracker.track_usage(output_tokens)
-        return response, input_tokens + output_tokens, agent_type
+        return response, agent_type
 
 # CLI interface
 if __name__ == "__main__":
@@ -277,6 +170,7 @@ if __name__ == "__main__":
             
             if user_input.lower() == 'usage':
                 print(cost_tracker.get_usage_summary())
+                print(route_cache.get_route_cache().summary())
                 continue
             
             # Determine which agent to use
@@ -310,14 +204,14 @@ if __name__ == "__main__":
             print("\nProcessing your query...")
             
             # Process the query with the appropriate agent
-            response, total_tokens, used_agent = process_query(user_input, agent_type)
+            response, usage, used_agent = process_query(user_input, agent_type)
             
             # Print the response
             print("\nResponse:")
             print(response)
             
             # Print usage information
-            print(f"\nUsage: {total_tokens} tokens (${total_tokens/1000*0.002:.4f})")
+            print(f"\nUsage: {usage.total_tokens} tokens (${usage.cost:.4f})")
             print(f"Agent used: {used_agent}")
             
         except KeyboardInterrupt:
@@ -0,0 +1,78 @@
+import sys
+import time
+import argparse
+from agents import intent_classifier, router
+from agents.intent_classifier import IntentClassifier
+
+# app.py's keyword routing, which sends every unmatched query to multi_agent
+AGENT_ORDER = ["concept_chart", "coding", "math", "research", "planner"]
+
+def keyword_agent(query):
+    return router.match(query).best(AGENT_ORDER, "multi_agent")
+
+def llm_calls(agent, steps):
+    """Expected LLM calls to answer with an agent: multi_agent plans, then executes and replans every step."""
+    return 1 + 2 * steps if agent == "multi_agent" else 1
+
+def evaluate(name, route, examples, steps, rounds):
+    predictions = [route(query) for query, _ in examples]
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for query, _ in examples:
+            route(query)
+    latency = (time.perf_counter() - start) / (rounds * len(examples))
+    correct = sum(1 for prediction, (_, agent) in zip(predictions, examples) if prediction == agent)
+    calls = sum(llm_calls(prediction, steps) for prediction in predictions)
+    return {"name": name, "accuracy": correct / len(examples), "calls": calls, "latency": latency,
+            "multi_agent": predictions.count("multi_agent")}
+
+def main():
+    parser = argparse.ArgumentParser(description='Routing accuracy, latency and LLM calls of keyword and classifier routing')
+    parser.add_argument('input', nargs='?', default='data/intents_eval.jsonl', help='Labelled JSONL set to evaluate on')
+    parser.add_argument('--model', default=intent_classifier.INTENT_MODEL_PATH, help='Trained intent model')
+    parser.add_argument('--threshold', type=float, default=intent_classifier.INTENT_THRESHOLD,
+                        help='Confidence below which the hybrid router falls back to keywords')
+    parser.add_argument('--steps', type=int, default=3, help='Plan steps a multi_agent run is assumed to execute')
+    parser.add_argument('--rounds', type=int, default=200, help='Times each query is routed for timing')
+    args = parser.parse_args()
+
+    examples = intent_classifier.load_examples(args.input)
+    start = time.perf_counter()
+    classifier = IntentClassifier.load(args.model)
+    load_time = time.perf_counter() - start
+    labels = set(classifier.labels)
+
+    def hybrid(threshold):
+        def route(query):
+            label, confidence = classifier.predict(query)
+            return label if confidence >= threshold and label in labels else keyword_agent(query)
+        return route
+
+    # Warm the keyword index outside the timed loops
+    router.match("")
+    expected = sum(llm_calls(agent, args.steps) for _, agent in examples)
+    results = [
+        evaluate("keywords", keyword_agent, examples, args.steps, args.rounds),
+        evaluate("classifier", lambda query: classifier.predict(query)[0], examples, args.steps, args.rounds),
+        evaluate(f"hybrid @ {args.threshold:.2f}", hybrid(args.threshold), examples, args.steps, args.rounds)
+    ]
+
+    print(f"{len(examples)} labelled queries; multi_agent assumed to make {llm_calls('multi_agent', args.steps)} "
+          f"LLM calls, other agents 1; correct routing needs {expected} calls")
+    print(f"Model: {len(classifier.hashes):,} features, loaded in {load_time * 1e6:.0f} us\n")
+    print(f"{'Router':<16} {'accuracy':>9} {'multi_agent':>12} {'LLM calls':>10} {'saved':>7} {'us/query':>9}")
+    baseline = results[0]["calls"]
+    for result in results:
+        print(f"{result['name']:<16} {result['accuracy']:>9.1%} {result['multi_agent']:>12} "
+              f"{result['calls']:>10} {baseline - result['calls']:>7} {result['latency'] * 1e6:>9.1f}")
+
+    print("\nHybrid threshold sweep:")
+    print(f"{'threshold':>9} {'classified':>11} {'accuracy':>9} {'LLM calls':>10}")
+    for threshold in (0.5, 0.6, 0.7, 0.8, 0.9):
+        covered = sum(1 for query, _ in examples if classifier.predict(query)[1] >= threshold)
+        result = evaluate(f"{threshold}", hybrid(threshold), examples, args.steps, 1)
+        print(f"{threshold:>9.2f} {covered / len(examples):>11.1%} {result['accuracy']:>9.1%} {result['calls']:>10}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -4,6 +4,7 @@ from agents.planner import get_planner, get_replanner
 from agents.executor import get_executor
 from agents.research_agent import setup_research_agent
 from agents.planner import Response
+from agents import plan_executor, route_cache, router
 from langgraph.graph import StateGraph, END
 
 import os
@@ -19,10 +20,15 @@ client = Client()
 class State(TypedDict):
     input: str
     plan: List[str]
+    dependencies: List[List[int]]
     past_steps: Annotated[List[Tuple], operator.add]
     response: str
     
 
+# Tasks the research agent handles; decisions are cached per normalized task
+def is_research_task(task):
+    return "research" in router.match(task)
+
 # Create the graph
 
 def get_graph():
@@ -32,14 +38,19 @@ def get_graph():
     replanner = get_replanner()
     research_agent = setup_research_agent()
 
-    def execute(state: State):
-        task = state['plan'][0]
+    def execute_task(task):
         output = executor.invoke({'input': task, "chat_history" : []})
-        return {"past_steps" : (task, output['agent_outcome'].return_values['output'])}
+        return output['agent_outcome'].return_values['output']
+
+    def ready_tasks(state: State):
+        return [state['plan'][i] for i in plan_executor.ready_steps(state['plan'], state.get('dependencies'))]
+
+    def execute(state: State):
+        return {"past_steps" : plan_executor.run_wave(execute_task, ready_tasks(state))}
 
     def plan(state: State):
         plan = planner.invoke({'objective': state['input']})
-        return {"plan" : plan.steps}
+        return {"plan" : plan.steps, "dependencies" : plan.dependencies}
 
     def replan(state: State):
         output = replanner.invoke(state)
@@ -47,17 +58,19 @@ def get_graph():
         if isinstance(output, Response):
             return {"response" : output.response}
         else:
-            return {"plan" : output.steps}
+            return {"plan" : output.steps, "dependencies" : output.dependencies}
             
-    def research(state: State):
+    def run_task(task):
         # Check if the task is a research query
-        task = state['plan'][0]
-        if any(keyword in task.lower() for keyword in ['research', 'find information about', 'tell me about', 'what is', 'who is', 'when did', 'where is', 'how does']):
-            output = research_agent.invoke({'input': task})
-            return {"past_steps": (task, output['output'])}
+        if route_cache.route("graph", task, is_research_task):
+            return research_agent.invoke({'input': task})['output']
         else:
             # If not a research query, pass to the executor
-            return execute(state)
+            return execute_task(task)
+
+    def research(state: State):
+        # Every step that needs no other step of the plan runs at once, then the plan is revised once
+        return {"past_steps": plan_executor.run_wave(run_task, ready_tasks(state))}
 
     def should_end(state: State):
         if (state['response']):
@@ -2,12 +2,8 @@ import streamlit as st
 import os
 from dotenv import load_dotenv
 import logging
-from agents.research_agent_cli import process_query as research_process_query
-from agents.executor import get_executor
-from agents.planner import get_planner, get_replanner, get_answerer
-import tiktoken
-import json
-from datetime import datetime
+from agents.registry import entry
+from agents import budget, intent_classifier, plan_executor, route_cache, router, usage_context, usage_store
 
 # Set up logging
 logging.basicConfig(level=logging.INFO)
@@ -16,54 +12,15 @@ logger = logging.getLogger(__name__)
 # Load environment variables
 load_dotenv()
 
-# Initialize token counter
-def count_tokens(text: str) -> int:
-    encoding = tiktoken.encoding_for_model("gpt-3.5-turbo")
-    return len(encoding.encode(text))
-
-# Cost tracking
-class CostTracker:
-    def __init__(self):
-        self.total_tokens = 0
-        self.total_cost = 0
-        self.daily_usage = {}
-        self.load_usage()
-
-    def load_usage(self):
-        if os.path.exists('usage.json'):
-            with open('usage.json', 'r') as f:
-                data = json.load(f)
-                self.total_tokens = data.get('total_tokens', 0)
-                self.total_cost = data.get('total_cost', 0)
-                self.daily_usage = data.get('daily_usage', {})
-
-    def save_usage(self):
-        with open('usage.json', 'w') as f:
-            json.dump({
-                'total_tokens': self.total_tokens,
-                'total_cost': self.total_cost,
-                'daily_usage': self.daily_usage
-            }, f)
-
-    def track_usage(self, tokens: int):
-        today = datetime.now().strftime('%Y-%m-%d')
-        self.total_tokens += tokens
-        self.daily_usage[today] = self.daily_usage.get(today, 0) + tokens
-        # Calculate cost (GPT-3.5-turbo: $0.002 per 1K tokens)
-        self.total_cost = (self.total_tokens / 1000) * 0.002
-        self.save_usage()
-
-    def get_usage_summary(self):
-        return f"""
-Usage Summary:
--------------
-Total Tokens: {self.total_tokens:,}
-Total Cost: ${self.total_cost:.4f}
-Today's Usage: {self.daily_usage.get(datetime.now().strftime('%Y-%m-%d'), 0):,} tokens
-"""
-
-# Initialize cost tracker
-cost_tracker = CostTracker()
+# Usage goes to the store shared by every agent and process
+cost_tracker = usage_store.CostTracker('streamlit')
+
+# Agents are imported the first time they are used (see agents/registry.py)
+research_process_query = entry("research", "run")
+get_executor = entry("math", "init")
+get_planner = entry("planner", "init")
+get_replanner = entry("multi_agent", "replanner")
+get_answerer = entry("answerer", "init")
 
 # Initialize agents
 def initialize_agents():
@@ -73,42 +30,48 @@ def initialize_agents():
     answerer = get_answerer()
     return executor, planner, replanner, answerer
 
+# Agents considered for a query's keyword matches, most specific first
+AGENT_ORDER = ["research", "planner", "multi_agent"]
+# Agents the intent classifier may pick
+CLASSIFIED_AGENTS = AGENT_ORDER + ["answerer"]
+# Streamlit names of the router's categories
+AGENT_NAMES = {"multi_agent": "multi-agent"}
+
 # Determine which agent should handle the query
 def determine_agent(query):
-    query_lower = query.lower()
-    
-    # Research queries
-    if any(keyword in query_lower for keyword in [
-        'research', 'find information about', 'tell me about', 'what is', 
-        'who is', 'when did', 'where is', 'how does', 'explain', 'describe',
-        'history of', 'meaning of', 'definition of', 'facts about'
-    ]):
-        return "research"
-    
-    # Planning queries
-    elif any(keyword in query_lower for keyword in [
-        'how to', 'steps', 'plan', 'process', 'guide', 'instructions',
-        'method', 'way to', 'approach', 'strategy', 'tutorial'
-    ]):
-        return "planner"
+    # Queries that normalize the same are routed once
+    return route_cache.route("main", query, decide_agent)
+
+def decide_agent(query):
+    # A confident prediction from the trained classifier wins over the keyword rules
+    agent = intent_classifier.predict_agent(query, CLASSIFIED_AGENTS)
+    if agent is None:
+        agent = router.match(query).best(AGENT_ORDER)
     
-    # Multi-agent system queries (complex tasks that need multiple steps)
-    elif any(keyword in query_lower for keyword in [
-        'compare', 'analyze', 'evaluate', 'investigate', 'study',
-        'find out', 'figure out', 'determine', 'calculate', 'solve'
-    ]) or len(query.split()) > 15:
-        return "multi-agent"
+    # Long queries are complex tasks that need multiple steps
+    if agent is None and len(query.split()) > 15:
+        agent = "multi_agent"
     
-    # Simple queries (direct answers)
-    else:
-        return "answerer"
+    # Simple queries get a direct answer
+    return AGENT_NAMES.get(agent, agent) if agent else "answerer"
 
-# Process query with the appropriate agent
+# Process query with the appropriate agent, accounting for every LLM call it makes
 def process_query(query, agent_type=None):
-    # Track input tokens
-    input_tokens = count_tokens(query)
-    cost_tracker.track_usage(input_tokens)
-    
+    with usage_context.track_usage() as usage, budget.admission(usage_session_id()) as admitted:
+        response = run_agent(query, agent_type)
+    usage.count_locally(query, response)
+    cost_tracker.track_request(usage, agent_type, usage_session_id())
+    if admitted.rejected:
+        response = f"Error: {admitted.rejected}"
+    return response, usage
+
+# Each browser session is billed separately
+def usage_session_id():
+    if "usage_session" not in st.session_state:
+        st.session_state["usage_session"] = usage_store.new_session_id()
+    return st.session_state["usage_session"]
+
+def run_agent(query, agent_type=None):
     # If agent_type is not specified, determine it
     if agent_type is None:
         agent_type = determine_agent(query)
@@ -125,62 +88,23 @@ def process_query(query, agent_type=None):
     # Process query with the appropriate agent
     if agent_type == "research":
         response = research_process_query(query)
-        output_tokens = count_tokens(response)
-        cost_tracker.track_usage(output_tokens)
-        return response, input_tokens + output_tokens
+        return response
     
     elif agent_type == "planner":
         plan_result = st.session_state["planner"]({"objective": query})
         response = "\n".join([f"{i+1}. {step}" for i, step in enumerate(plan_result.steps)])
-        output_tokens = count_tokens(response)
-        cost_tracker.track_usage(output_tokens)
-        return response, input_tokens + output_tokens
+        return response
     
     elif agent_type == "multi-agent":
-        # Initialize state
-        state = {
-            "input": query,
-            "plan": [],
-            "past_steps": [],
-            "response": ""
-        }
-        
-        # Get initial plan
-        plan_result = st.session_state["planner"]({"objective": query})
-        state["plan"] = plan_result.steps
-        
-        # Execute steps until we get a response
-        while state["plan"] and not state["response"]:
-            # Execute the first step
-            task = state["plan"][0]
-            executor_result = st.session_state["executor"]({"input": task})
-            state["past_steps"].append((task, executor_result["output"]))
-            
-            # Remove the executed step
-            state["plan"] = state["plan"][1:]
-            
-            # Replan or get response
-            replan_result = st.session_state["replanner"](state)
-            if hasattr(replan_result, "response"):
-                state["response"] = replan_result.response
-            else:
-                state["plan"] = replan_result.steps
-        
-        # If we still don't have a response, use the answerer
-        if not state["response"]:
-            answer_result = st.session_state["answerer"]({"input": query})
-            state["response"] = answer_result.response
-        
-        output_tokens = count_tokens(state["response"])
-        cost_tracker.track_usage(output_tokens)
-        return state["response"], input_tokens + output_tokens
+        # Independent steps of the plan run together, with one replanner call per wave
+        state = plan_executor.run_plan(query, st.session_state["planner"], st.session_state["executor"],
+                                       st.session_state["replanner"], st.session_state["answerer"])
+        return state["response"]
     
     else:  # answerer
         answer_result = st.session_state["answerer"]({"input": query})
         response = answer_result.response
-        output_tokens = count_tokens(response)
-        cost_tracker.track_usage(output_tokens)
-        return response, input_tokens + output_tokens
+        return response
 
 # Streamlit UI
 with st.sidebar:
@@ -197,6 +121,8 @@ with st.sidebar:
     
     st.sidebar.title("Usage Statistics")
     st.sidebar.text(cost_tracker.get_usage_summary())
+    st.sidebar.text(f"This Session: ${cost_tracker.store.session_usage(usage_session_id())['cost']:.4f}")
+    st.sidebar.text(route_cache.get_route_cache().summary())
 
 st.title("💬Multi-Agent Search Engine Chatbot")
 if "messages" not in st.session_state:
@@ -212,7 +138,7 @@ if prompt := st.chat_input():
     
     # Set environment variables for API keys
     if openai_api_key:
-    os.environ['OPENAI_API_KEY'] = openai_api_key
+        os.environ['OPENAI_API_KEY'] = openai_api_key
     if openrouter_api_key:
         os.environ['OPENROUTER_API_KEY'] = openrouter_api_key
     
@@ -234,10 +160,10 @@ if prompt := st.chat_input():
     
     # Process the query with the appropriate agent
     with st.spinner("Processing..."):
-        response, total_tokens = process_query(prompt, agent_type)
+        response, usage = process_query(prompt, agent_type)
         
         # Add usage information to the response
-        usage_info = f"\n\n---\n*Usage: {total_tokens} tokens (${total_tokens/1000*0.002:.4f})*"
+        usage_info = f"\n\n---\n*Usage: {usage.total_tokens} tokens (${usage.cost:.4f})*"
         if agent_type == "Auto-Detect":
             usage_info += f"\n*Agent used: {agent_type}*"
         
@@ -247,4 +173,3 @@ if prompt := st.chat_input():
     st.chat_message("assistant").write(msg)
 
 
-
@@ -0,0 +1,254 @@
+import re
+import sys
+import json
+import time
+import uuid
+import random
+import hashlib
+import argparse
+import logging
+import threading
+from flask import Flask, Response, request, jsonify
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Canned planner/replanner outputs, picked by a substring of the system prompt
+PLANNER_RESPONSE = """Here is a short plan:
+1. Search for background information about the topic. (needs: none)
+2. Look up the specific facts the question asks for. (needs: none)
+3. Combine the findings into a final answer. (needs: 1, 2)"""
+
+REPLANNER_RESPONSE = "Based on the executed steps, here is the final answer to your question."
+
+CANNED_RESPONSES = {
+    "creates natural, conversational plans": PLANNER_RESPONSE,
+    "revises plans or provides final answers": REPLANNER_RESPONSE
+}
+
+WORDS = (
+    "the answer depends on several factors including context history data and the "
+    "specific question being asked which we summarise here in a clear and concise way"
+).split()
+
+class MockConfig:
+    """Latency, throughput and failure settings of the mock server."""
+
+    def __init__(self, latency_ms=200.0, jitter_ms=50.0, distribution="normal", tokens_per_second=50.0,
+                 response_tokens=60, error_rate=0.0, error_codes=(429, 500, 503), seed=0, responses=None):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.distribution = distribution
+        self.tokens_per_second = tokens_per_second
+        self.response_tokens = response_tokens
+        self.error_rate = error_rate
+        self.error_codes = list(error_codes)
+        self.responses = {**CANNED_RESPONSES, **(responses or {})}
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def first_token_delay(self) -> float:
+        """Samples the time to first token in seconds."""
+        with self._lock:
+            if self.distribution == "fixed":
+                delay = self.latency_ms
+            elif self.distribution == "uniform":
+                delay = self._random.uniform(self.latency_ms - self.jitter_ms, self.latency_ms + self.jitter_ms)
+            elif self.distribution == "lognormal":
+                # Long-tailed, with the median at latency_ms
+                sigma = self.jitter_ms / self.latency_ms if self.latency_ms else 0.0
+                delay = self.latency_ms * self._random.lognormvariate(0, sigma)
+            else:
+                delay = self._random.gauss(self.latency_ms, self.jitter_ms)
+        return max(0.0, delay) / 1000
+
+    def injected_error(self):
+        """Returns an HTTP status code to fail the request with, or None."""
+        with self._lock:
+            if self.error_codes and self._random.random() < self.error_rate:
+                return self._random.choice(self.error_codes)
+        return None
+
+def count_tokens(text: str) -> int:
+    # The mock treats whitespace-separated words as tokens so usage is deterministic
+    return len(text.split())
+
+def generate_text(messages, max_tokens, config):
+    """Builds a deterministic response for a conversation."""
+    system = " ".join(m.get("content") or "" for m in messages if m.get("role") == "system")
+    for marker, response in config.responses.items():
+        if marker in system:
+            return response
+
+    prompt = json.dumps(messages, sort_keys=True)
+    digest = hashlib.sha256(prompt.encode()).digest()
+    length = min(max_tokens or config.response_tokens, config.response_tokens)
+    words = [WORDS[(digest[i % len(digest)] + i) % len(WORDS)] for i in range(max(1, length))]
+    return f"Mock answer {digest.hex()[:8]}: " + " ".join(words) + "."
+
+def generate_json(messages, text):
+    """
+    Fills the JSON shape described in the system prompt with placeholder
+    values, or wraps the text when the prompt does not describe one.
+    """
+    system = " ".join(m.get("content") or "" for m in messages if m.get("role") == "system")
+    match = re.search(r"\{.*\}", system.replace("{{", "{").replace("}}", "}"), re.DOTALL)
+    try:
+        shape = json.loads(match.group(0)) if match else None
+    except json.JSONDecodeError:
+        shape = None
+    if not isinstance(shape, dict):
+        return json.dumps({"response": text})
+    return json.dumps({
+        key: [f"mock {key}"] if isinstance(value, list) else f"mock {key}"
+        for key, value in shape.items()
+    })
+
+def completion_id():
+    return f"chatcmpl-mock-{uuid.uuid4().hex[:12]}"
+
+def create_app(config=None):
+    app = Flask(__name__)
+    config = config or MockConfig()
+    stats = {"requests": 0, "streams": 0, "errors": 0}
+    stats_lock = threading.Lock()
+
+    def record(name):
+        with stats_lock:
+            stats[name] += 1
+
+    @app.route('/models', methods=['GET'])
+    @app.route('/v1/models', methods=['GET'])
+    @app.route('/api/v1/models', methods=['GET'])
+    def models():
+        return jsonify({"object": "list", "data": [{"id": "mock", "object": "model", "owned_by": "mock"}]})
+
+    @app.route('/stats', methods=['GET'])
+    def server_stats():
+        with stats_lock:
+            return jsonify(dict(stats))
+
+    @app.route('/chat/completions', methods=['POST'])
+    @app.route('/v1/chat/completions', methods=['POST'])
+    @app.route('/api/v1/chat/completions', methods=['POST'])
+    def chat_completions():
+        body = request.get_json(force=True)
+        record("requests")
+        model = body.get("model", "mock")
+        messages = body.get("messages", [])
+
+        status = config.injected_error()
+        if status is not None:
+            record("errors")
+            time.sleep(config.first_token_delay())
+            response = jsonify({"error": {"message": f"Injected mock error {status}", "code": status}})
+            response.status_code = status
+            if status == 429:
+                response.headers["Retry-After"] = "1"
+            return response
+
+        text = generate_text(messages, body.get("max_tokens"), config)
+        if (body.get("response_format") or {}).get("type") == "json_object":
+            text = generate_json(messages, text)
+        usage = {
+            "prompt_tokens": sum(count_tokens(str(m.get("content") or "")) for m in messages),
+            "completion_tokens": count_tokens(text)
+        }
+        usage["total_tokens"] = usage["prompt_tokens"] + usage["completion_tokens"]
+        token_delay = 1.0 / config.tokens_per_second if config.tokens_per_second > 0 else 0.0
+        first_token_delay = config.first_token_delay()
+
+        if not body.get("stream"):
+            time.sleep(first_token_delay + token_delay * usage["completion_tokens"])
+            return jsonify({
+                "id": completion_id(),
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": model,
+                "choices": [{
+                    "index": 0,
+                    "message": {"role": "assistant", "content": text},
+                    "finish_reason": "stop"
+                }],
+                "usage": usage
+            })
+
+        record("streams")
+        include_usage = (body.get("stream_options") or {}).get("include_usage", False)
+
+        def generate():
+            chunk_id = completion_id()
+            created = int(time.time())
+
+            def chunk(delta, finish_reason=None):
+                return "data: " + json.dumps({
+                    "id": chunk_id,
+                    "object": "chat.completion.chunk",
+                    "created": created,
+                    "model": model,
+                    "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}]
+                }) + "\n\n"
+
+            time.sleep(first_token_delay)
+            yield chunk({"role": "assistant", "content": ""})
+            for i, word in enumerate(text.split(" ")):
+                if i:
+                    time.sleep(token_delay)
+                yield chunk({"content": word if i == 0 else " " + word})
+            yield chunk({}, finish_reason="stop")
+            if include_usage:
+                yield "data: " + json.dumps({
+                    "id": chunk_id,
+                    "object": "chat.completion.chunk",
+                    "created": created,
+                    "model": model,
+                    "choices": [],
+                    "usage": usage
+                }) + "\n\n"
+            yield "data: [DONE]\n\n"
+
+        return Response(generate(), mimetype='text/event-stream')
+
+    return app
+
+def main():
+    parser = argparse.ArgumentParser(description='Local OpenAI-compatible mock LLM server for offline benchmarks')
+    parser.add_argument('--host', type=str, default='127.0.0.1', help='Host to bind')
+    parser.add_argument('--port', type=int, default=8765, help='Port to listen on')
+    parser.add_argument('--latency-ms', type=float, default=200.0, help='Median time to first token in ms')
+    parser.add_argument('--jitter-ms', type=float, default=50.0, help='Spread of the latency distribution in ms')
+    parser.add_argument('--distribution', choices=['fixed', 'uniform', 'normal', 'lognormal'], default='normal',
+                        help='Latency distribution')
+    parser.add_argument('--tokens-per-second', type=float, default=50.0, help='Generation speed after the first token')
+    parser.add_argument('--response-tokens', type=int, default=60, help='Length of generated answers')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='Fraction of requests that fail')
+    parser.add_argument('--error-codes', type=str, default='429,500,503', help='Comma-separated status codes to inject')
+    parser.add_argument('--seed', type=int, default=0, help='Random seed for latency and error injection')
+    parser.add_argument('--responses', type=str,
+                        help='JSON file mapping system prompt substrings to canned responses')
+
+    args = parser.parse_args()
+    responses = None
+    if args.responses:
+        with open(args.responses, 'r', encoding='utf-8') as f:
+            responses = json.load(f)
+
+    config = MockConfig(
+        latency_ms=args.latency_ms,
+        jitter_ms=args.jitter_ms,
+        distribution=args.distribution,
+        tokens_per_second=args.tokens_per_second,
+        response_tokens=args.response_tokens,
+        error_rate=args.error_rate,
+        error_codes=[int(code) for code in args.error_codes.split(',') if code.strip()],
+        seed=args.seed,
+        responses=responses
+    )
+    logger.info(f"Mock LLM server on http://{args.host}:{args.port}/v1 "
+                f"(set OPENROUTER_BASE_URL to this address)")
+    create_app(config).run(host=args.host, port=args.port, threaded=True)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
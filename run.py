@@ -1,5 +1,6 @@
 import os
 from app import app
+from agents import prewarm
 
 if __name__ == "__main__":
     port = int(os.environ.get("PORT", 5000))
@@ -8,6 +9,8 @@ if __name__ == "__main__":
     print("="*50)
     print(f"PORT environment variable: {os.environ.get('PORT', 'Not set')}")
     print(f"Using port: {port}")
-    print("\nStarting web server...")
+    print("\nPrewarming agents in the background (see /api/ready)...")
+    prewarm.start()
+    print("Starting web server...")
     print("="*50 + "\n")
     app.run(host="0.0.0.0", port=port)
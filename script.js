@@ -83,50 +83,137 @@ function initializeChat() {
     chatMessages.appendChild(typingIndicator);
     chatMessages.scrollTop = chatMessages.scrollHeight;
     
-    // Send message to backend
-    fetch('/api/chat', {
+    const request = {
       method: 'POST',
       headers: {
         'Content-Type': 'application/json'
       },
       body: JSON.stringify({
         message: message,
-        agent: 'auto'
+        agent: 'auto',
+        session_id: getSessionId()
       })
-    })
-    .then(response => response.json())
-    .then(data => {
+    };
+    
+    // Stream the response when the browser supports it
+    const send = window.ReadableStream && window.TextDecoder
+      ? streamMessage(request, typingIndicator)
+      : fetchMessage(request, typingIndicator);
+    
+    send.catch(error => {
       // Remove typing indicator
-      chatMessages.removeChild(typingIndicator);
-      
-      // Add bot response
-      addMessage(data.response, 'bot');
-      
-      // Add usage info if available
-      if (data.usage) {
-        const usageInfo = document.createElement('div');
-        usageInfo.className = 'usage-info';
-        usageInfo.textContent = `Usage: ${data.usage.tokens} tokens ($${data.usage.cost}) | Agent: ${data.agent}`;
-        chatMessages.appendChild(usageInfo);
+      if (typingIndicator.parentNode) {
+        chatMessages.removeChild(typingIndicator);
       }
       
-      chatMessages.scrollTop = chatMessages.scrollHeight;
-    })
-    .catch(error => {
-      // Remove typing indicator
-      chatMessages.removeChild(typingIndicator);
-      
-      // Add error message
-      addMessage("Sorry, I encountered an error. Please try again.", 'bot');
+      // Add error message; a reached spend budget is explained as it is
+      addMessage(error.budget ? error.message : "Sorry, I encountered an error. Please try again.", 'bot');
       console.error('Error:', error);
     });
   }
   
+  function fetchMessage(request, typingIndicator) {
+    return fetch('/api/chat', request)
+      .then(response => response.json())
+      .then(data => {
+        if (data.budget) {
+          throw budgetError(data.details, data.budget);
+        }
+        
+        // Remove typing indicator
+        chatMessages.removeChild(typingIndicator);
+        
+        // Add bot response
+        addMessage(data.response, 'bot');
+        addUsage(data);
+      });
+  }
+  
+  async function streamMessage(request, typingIndicator) {
+    const response = await fetch('/api/chat/stream', request);
+    if (!response.ok || !response.body) {
+      throw new Error(`Request failed with status ${response.status}`);
+    }
+    
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+    let messageElement = null;
+    
+    while (true) {
+      const { value, done } = await reader.read();
+      if (done) break;
+      buffer += decoder.decode(value, { stream: true });
+      
+      // Server-Sent Events are separated by a blank line
+      const events = buffer.split('\n\n');
+      buffer = events.pop();
+      
+      for (const event of events) {
+        if (!event.startsWith('data: ')) continue;
+        const data = JSON.parse(event.slice(6));
+        
+        if (data.type === 'token') {
+          if (!messageElement) {
+            // Replace the typing indicator with the message being streamed
+            chatMessages.removeChild(typingIndicator);
+            messageElement = addMessage('', 'bot');
+          }
+          messageElement.textContent += data.text;
+          chatMessages.scrollTop = chatMessages.scrollHeight;
+        } else if (data.type === 'done') {
+          if (!messageElement) {
+            chatMessages.removeChild(typingIndicator);
+            messageElement = addMessage('', 'bot');
+          }
+          messageElement.textContent = data.response;
+          addUsage(data);
+        } else if (data.type === 'error') {
+          throw data.budget ? budgetError(data.error, data.budget) : new Error(data.error);
+        }
+      }
+    }
+  }
+  
+  function budgetError(message, budget) {
+    const error = new Error(message);
+    error.budget = budget;
+    return error;
+  }
+  
+  function addUsage(data) {
+    // Add usage info if available
+    if (data.usage) {
+      const usageInfo = document.createElement('div');
+      usageInfo.className = 'usage-info';
+      usageInfo.textContent = `Usage: ${data.usage.tokens} tokens ($${data.usage.cost}) | Agent: ${data.agent}`;
+      if (data.session) {
+        usageInfo.textContent += ` | Session: $${data.session.cost}`;
+      }
+      chatMessages.appendChild(usageInfo);
+    }
+    
+    chatMessages.scrollTop = chatMessages.scrollHeight;
+  }
+  
+  // One id per browser tab so the server can report what the conversation has cost
+  function getSessionId() {
+    let sessionId = sessionStorage.getItem('sessionId');
+    if (!sessionId) {
+      sessionId = window.crypto && crypto.randomUUID
+        ? crypto.randomUUID()
+        : Date.now().toString(36) + Math.random().toString(36).slice(2);
+      sessionStorage.setItem('sessionId', sessionId);
+    }
+    return sessionId;
+  }
+  
   function addMessage(text, sender) {
     const messageElement = document.createElement('div');
     messageElement.className = `chat-message ${sender}`;
     messageElement.textContent = text;
     chatMessages.appendChild(messageElement);
     chatMessages.scrollTop = chatMessages.scrollHeight;
+    return messageElement;
   }
 } 
\ No newline at end of file
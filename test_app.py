@@ -0,0 +1,117 @@
+import json
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+import pytest
+import app
+from agents import llm_cache, llm_client, registry, usage_store
+from agents.usage_store import UsageStore
+
+def stream_events(client, payload):
+    response = client.post("/api/chat/stream", json=payload)
+    assert response.status_code == 200
+    return [json.loads(line[len("data: "):]) for line in response.get_data(as_text=True).splitlines()
+            if line.startswith("data: ")]
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    # Usage goes to a store under tmp_path instead of the project's usage.db
+    store = UsageStore(str(tmp_path / "usage.db"), flush_interval=60)
+    monkeypatch.setattr(usage_store, "_store", store)
+    monkeypatch.setattr(app.cost_tracker, "_store", store)
+    return store
+
+def fake_provider(monkeypatch, content="A summary", prompt_tokens=100, completion_tokens=50):
+    usage = SimpleNamespace(prompt_tokens=prompt_tokens, completion_tokens=completion_tokens,
+                            total_tokens=prompt_tokens + completion_tokens)
+    response = SimpleNamespace(usage=usage, choices=[SimpleNamespace(message=SimpleNamespace(content=content))])
+    client = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=lambda **kwargs: response)))
+    monkeypatch.setattr(llm_client, "get_client", lambda api_key=None: client)
+    monkeypatch.setattr(llm_cache, "CACHE_ENABLED", False)
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(app, "stream_executor_query", lambda query: iter(["6", "2"]))
+    monkeypatch.setattr(app, "stream_research", lambda query: iter(["Paris"]))
+    monkeypatch.setattr(app, "stream_answer", lambda query: pytest.fail("the query was not routed"))
+    monkeypatch.setattr(app, "account_usage", lambda *args, **kwargs: {"usage": {"tokens": 0, "cost": 0}, "models": []})
+    return app.app.test_client()
+
+@pytest.mark.parametrize("agent", ["auto", "", None])
+def test_stream_routes_auto_and_missing_agent(client, agent):
+    events = stream_events(client, {"message": "calculate 15 * 4 + 2", "agent": agent})
+    assert events[0] == {"type": "start", "agent": "math"}
+    assert events[-1]["type"] == "done" and events[-1]["agent"] == "math"
+
+def test_stream_keeps_the_agent_the_client_picked(client):
+    events = stream_events(client, {"message": "calculate 15 * 4 + 2", "agent": "research"})
+    assert events[0] == {"type": "start", "agent": "research"}
+
+def test_stream_dropped_by_the_client_is_still_accounted(client, monkeypatch):
+    closed = threading.Event()
+    accounted = []
+
+    def endless_stream(query):
+        try:
+            while True:
+                yield "6"
+        finally:
+            closed.set()
+
+    monkeypatch.setattr(app, "stream_executor_query", endless_stream)
+    monkeypatch.setattr(app, "account_usage", lambda usage, query, response, *args: accounted.append(response) or {})
+    response = client.post("/api/chat/stream", json={"message": "calculate 15 * 4 + 2", "agent": "math"}, buffered=False)
+    events = iter(response.response)
+    next(events)
+    next(events)
+    response.close()
+    assert closed.is_set()
+    assert accounted == ["6"]
+
+@pytest.mark.parametrize("window", ["infh", "-5m", "1e12d"])
+def test_usage_rejects_unusable_windows(store, window):
+    response = app.app.test_client().get(f"/api/usage?window={window}")
+    assert response.status_code == 400
+    assert response.get_json()["error"] == "Invalid usage query."
+
+def test_only_requests_of_one_session_and_key_are_coalesced(monkeypatch):
+    computed = []
+    release = threading.Event()
+
+    def answer_query(query, agent_type, session_id=None, api_key=None):
+        computed.append((session_id, api_key))
+        release.wait(1)
+        return {"response": f"for {session_id}", "agent": agent_type}
+
+    monkeypatch.setattr(app, "answer_query", answer_query)
+    callers = [("s1", None), ("s1", None), ("s2", None), ("s1", "key")]
+    with ThreadPoolExecutor(len(callers)) as pool:
+        futures = [pool.submit(app.process_query, "what is 2+2", "math", session, key) for session, key in callers]
+        time.sleep(0.1)
+        release.set()
+        results = [future.result()["response"] for future in futures]
+
+    assert sorted(computed, key=str) == sorted([("s1", None), ("s2", None), ("s1", "key")], key=str)
+    assert results == ["for s1", "for s1", "for s2", "for s1"]
+
+def test_research_request_is_charged_once(store, monkeypatch):
+    research = registry.load("research")
+    monkeypatch.setattr(research, "get_wiki_data", lambda topic: "Paris is the capital of France.")
+    fake_provider(monkeypatch)
+
+    result = app.answer_query("What is the capital of France?", "research", session_id="s1")
+    assert "A summary" in result["response"]
+    assert result["usage"]["calls"] == 1
+    totals = store.totals()
+    assert (totals["calls"], totals["total_tokens"]) == (1, 150)
+    assert store._query("SELECT COUNT(*) FROM usage")[0][0] == 1
+
+def test_request_usage_shows_the_tokens_trimming_saved(store, monkeypatch):
+    research = registry.load("research")
+    wiki = "\n\n".join(f"Page: France {i}\nSummary: " + "France is a country in Europe. " * 100 for i in range(5))
+    monkeypatch.setattr(research, "get_wiki_data", lambda topic: wiki)
+    fake_provider(monkeypatch)
+
+    result = app.answer_query("What is the capital of France?", "research", session_id="s1")
+    assert result["usage"]["saved_tokens"] > 0
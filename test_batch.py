@@ -0,0 +1,73 @@
+import json
+import time
+from batch import BatchSummary, next_offset, run_batch
+
+def write_lines(path, lines):
+    path.write_text("".join(line + "\n" for line in lines), encoding="utf-8")
+
+def read_results(path):
+    return [json.loads(line) for line in path.read_text(encoding="utf-8").splitlines()]
+
+def test_records_that_are_not_objects_are_per_record_errors(tmp_path):
+    source = tmp_path / "in.jsonl"
+    output = tmp_path / "out.jsonl"
+    write_lines(source, ['{"query": "first"}', '["a", "list"]', '"a string"', '{oops', '{"query": "last"}'])
+
+    summary = run_batch(str(source), str(output), concurrency=2, progress_every=0,
+                        process_query=lambda query, agent: {"response": query.upper(), "agent": "answerer"})
+
+    results = read_results(output)
+    assert [result["index"] for result in results] == [0, 1, 2, 3, 4]
+    assert [result.get("response") for result in results] == ["FIRST", None, None, None, "LAST"]
+    assert results[1]["error"] == "Expected a JSON object, got list"
+    assert results[2]["error"] == "Expected a JSON object, got str"
+    assert results[3]["error"].startswith("Invalid JSON")
+    assert (summary.processed, summary.errors) == (5, 3)
+
+def test_resume_cuts_off_a_torn_line_and_keeps_the_offset(tmp_path):
+    output = tmp_path / "out.jsonl"
+    complete = '{"index": 5, "query": "a"}\n{"index": 6, "query": "b"}\n'
+    output.write_bytes(complete.encode() + b'{"index": 7, "que')
+
+    # The run started at record 5, so the count of lines would have resumed at 2
+    assert next_offset(str(output)) == 7
+    assert output.read_bytes() == complete.encode()
+
+    source = tmp_path / "in.jsonl"
+    write_lines(source, [json.dumps({"query": f"q{i}"}) for i in range(9)])
+    run_batch(str(source), str(output), offset=7, progress_every=0,
+              process_query=lambda query, agent: {"response": query, "agent": "answerer"})
+    assert [result["index"] for result in read_results(output)] == [5, 6, 7, 8]
+
+    output.write_bytes(b'{"index": 3}')
+    assert next_offset(str(output)) == 4
+    assert output.read_bytes() == b'{"index": 3}\n'
+    assert next_offset(str(tmp_path / "missing.jsonl")) == 0
+
+def test_coalesced_duplicates_are_charged_once(tmp_path, monkeypatch):
+    import app
+    source = tmp_path / "in.jsonl"
+    output = tmp_path / "out.jsonl"
+    write_lines(source, ['{"query": "same question", "agent": "math"}'] * 3)
+    shared = app.query_flight.stats()["shared"]
+
+    def answer_query(query, agent_type, session_id=None, api_key=None):
+        # The leader answers once both duplicates are waiting for it
+        deadline = time.monotonic() + 2
+        while app.query_flight.stats()["shared"] < shared + 2 and time.monotonic() < deadline:
+            time.sleep(0.005)
+        return {"response": "42", "agent": agent_type, "usage": {"tokens": 100, "cost": 0.01}}
+
+    monkeypatch.setattr(app, "answer_query", answer_query)
+    summary = run_batch(str(source), str(output), concurrency=3, progress_every=0, process_query=app.process_query)
+
+    assert [result["response"] for result in read_results(output)] == ["42"] * 3
+    assert (summary.coalesced, summary.tokens, round(summary.cost, 6)) == (2, 100, 0.01)
+
+def test_summary_report():
+    summary = BatchSummary(total=2)
+    summary.add({"latency_ms": 10.0, "agent": "math", "usage": {"tokens": 7, "cost": 0.5}, "models": ["m"]})
+    summary.add({"latency_ms": 30.0, "agent": "math", "error": "boom"})
+    assert summary.percentile(50) == 30.0
+    assert "Records: 2 (1 errors, 0 coalesced)" in summary.report()
+    assert "Total Tokens: 7" in summary.report()
@@ -0,0 +1,73 @@
+import hashlib
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from types import SimpleNamespace
+import pytest
+from benchmark_startup import TIKTOKEN_ENCODING_URL, compare, median_runs, parse_importtime, tokenizer_cached, wait_for_http
+
+IMPORTTIME = """import time: self [us] | cumulative | imported package
+import time:       120 |        120 |     _io
+import time:       300 |      45000 |     flask.json
+import time:      2000 |     90000 |   flask
+import time:       400 |      12000 |   agents.budget
+import time:      1000 |    150000 | app
+"""
+
+def test_importtime_lists_direct_imports_slowest_first():
+    assert parse_importtime(IMPORTTIME) == [(90.0, "flask"), (12.0, "agents.budget")]
+    assert parse_importtime(IMPORTTIME, depth=0) == [(150.0, "app")]
+
+def test_regressions_allow_tolerance_and_slack():
+    baseline = {"import:app": 300.0, "ready:app": 1000.0, "import:cli": 40.0}
+    current = {"import:app": 480.0, "ready:app": 1700.0, "import:cli": 100.0, "ready:main": 5000.0}
+    # 300 * 1.5 + 50 = 500 is allowed, 1000 * 1.5 + 50 = 1550 is not, and 40 * 1.5 + 50 = 110 is
+    assert compare(baseline, current, tolerance=0.5, slack_ms=50) == [("ready:app", 1000.0, 1700.0)]
+    assert compare(baseline, current, tolerance=1.0, slack_ms=0) == [("import:cli", 40.0, 100.0)]
+
+def test_relative_comparison_scales_the_baseline_by_the_reference():
+    baseline = {"agents:all": 1000.0, "import:app": 300.0, "ready:app": 1000.0}
+    # A machine twice as slow is allowed twice the baseline times
+    slower = {"agents:all": 2000.0, "import:app": 650.0, "ready:app": 3500.0}
+    assert compare(baseline, slower, tolerance=0.1, slack_ms=0, reference="agents:all") == [
+        ("ready:app", 2000.0, 3500.0)]
+    assert compare(baseline, slower, tolerance=0.1, slack_ms=0) == [
+        ("agents:all", 1000.0, 2000.0), ("import:app", 300.0, 650.0), ("ready:app", 1000.0, 3500.0)]
+    with pytest.raises(ValueError):
+        compare({"import:app": 300.0}, slower, tolerance=0.1, slack_ms=0, reference="agents:all")
+
+def test_tokenizer_cache_is_found_without_the_network(tmp_path):
+    env = {"TIKTOKEN_CACHE_DIR": str(tmp_path)}
+    assert not tokenizer_cached(env)
+    (tmp_path / hashlib.sha1(TIKTOKEN_ENCODING_URL.encode()).hexdigest()).write_bytes(b"")
+    assert tokenizer_cached(env)
+    assert not tokenizer_cached({"TIKTOKEN_CACHE_DIR": ""})
+
+def test_a_warming_server_is_listening_but_not_ready():
+    probes = []
+
+    class Warming(BaseHTTPRequestHandler):
+        def do_GET(self):
+            probes.append(self.path)
+            # /api/ready answers 503 for the first few probes, as while warming up
+            self.send_response(503 if len(probes) < 4 else 200)
+            self.end_headers()
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Warming)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_address[1]}/api/ready"
+    running = SimpleNamespace(poll=lambda: None)
+    try:
+        assert wait_for_http(url, running, timeout=5) is not None
+        assert len(probes) == 1
+        assert wait_for_http(url, running, timeout=5, ok=True) is not None
+        assert len(probes) == 4
+    finally:
+        server.shutdown()
+        server.server_close()
+
+def test_medians_skip_times_a_run_did_not_measure():
+    results = iter([(None, 1.0, 3.0), (None, 2.0, None), (None, 4.0, 5.0)])
+    assert median_runs(lambda: next(results), 3) == [None, 2.0, 4.0]
@@ -0,0 +1,80 @@
+import pytest
+from agents import budget, llm_client, model_router, pricing, usage_context
+from agents.budget import BudgetExceeded, BudgetGuard
+from agents.usage_store import UsageStore
+
+MESSAGES = [{"role": "user", "content": "hello " * 200}]
+
+def make_store(tmp_path):
+    return UsageStore(str(tmp_path / "usage.db"), flush_interval=60)
+
+def test_session_budget_rejects_before_the_call(tmp_path, monkeypatch):
+    store = make_store(tmp_path)
+    store.record("app", "m", tokens=100, cost=0.009, session="s1")
+    monkeypatch.setattr(budget, "_guard", BudgetGuard(store, daily=0, session=0.01, key_daily=0, degrade=False))
+    monkeypatch.setattr(llm_client, "get_client", lambda api_key=None: pytest.fail("provider was called"))
+
+    with budget.admission("s1") as admitted, pytest.raises(BudgetExceeded) as error:
+        llm_client.call_openrouter("hello " * 200, model="openai/gpt-4o", cache=False)
+    assert error.value.scope == "session"
+    assert admitted.rejected is error.value
+    # Other sessions still have their whole budget
+    with budget.admission("s2"):
+        assert budget.check(MESSAGES, "openai/gpt-4o-mini", 100) == "openai/gpt-4o-mini"
+
+def test_degrades_to_the_fast_tier_when_only_it_fits(tmp_path):
+    guard = BudgetGuard(make_store(tmp_path), daily=0, session=0, key_daily=0.01)
+    strong = pricing.price_call("openai/gpt-4o", budget.token_counter.approx_message_tokens(MESSAGES), 1000)
+    assert strong > 0.01
+
+    with budget.admission(api_key="k1") as admitted:
+        assert guard.check(MESSAGES, "openai/gpt-4o", 1000) == model_router.FAST_MODEL
+        # Spend already made inside the request counts against the budget too
+        with usage_context.track_usage() as usage:
+            usage.add("openai/gpt-4o", 0, 0, 0.0099)
+            with pytest.raises(BudgetExceeded):
+                guard.check(MESSAGES, "openai/gpt-4o", 1000)
+    assert admitted.degraded == 1
+    assert guard.stats()["rejected"] == 1
+
+def test_daily_spend_includes_other_processes(tmp_path):
+    other = make_store(tmp_path)
+    guard = BudgetGuard(make_store(tmp_path), daily=1.0, refresh_interval=0)
+    guard.store.record("app", "m", cost=0.25)
+    other.record("cli", "m", cost=0.5)
+    other.flush()
+    assert guard.daily_spent() == pytest.approx(0.75)
+
+    # API key spend is kept per day without storing the key
+    guard.store.record("app", "m", cost=0.1, api_key="secret")
+    assert guard.store.key_usage("secret")["cost"] == pytest.approx(0.1)
+    guard.store.flush()
+    assert not guard.store._query("SELECT 1 FROM usage_sessions WHERE session LIKE '%secret%'")
+
+def test_concept_chart_chains_are_budgeted_and_recorded(tmp_path, monkeypatch):
+    from agents import concept_chart_agent
+
+    class FakeChain:
+        prompt = concept_chart_agent.concept_prompt
+
+        def __init__(self):
+            self.runs = 0
+
+        def run(self, text):
+            self.runs += 1
+            return "A concept map"
+
+    chain = FakeChain()
+    monkeypatch.setattr(concept_chart_agent, "initialize_agent", lambda: (chain, chain))
+    store = make_store(tmp_path)
+    store.record("app", "m", tokens=100, cost=0.0099, session="s1")
+    monkeypatch.setattr(budget, "_guard", BudgetGuard(store, daily=0, session=0.01, key_daily=0, degrade=False))
+    with budget.admission("s1"), pytest.raises(BudgetExceeded):
+        concept_chart_agent.process_query("photosynthesis")
+    assert chain.runs == 0
+
+    # Within budget the chain runs and its call counts towards the request
+    with budget.admission("s2"), usage_context.track_usage() as usage:
+        assert concept_chart_agent.process_query("photosynthesis")["message"] == "A concept map"
+    assert usage.calls == 1 and usage.models == [concept_chart_agent.PRICED_MODEL]
+    assert usage.to_dict()["estimated"]
@@ -0,0 +1,34 @@
+from agents import usage_context
+from agents.context_budget import ContextAssembler
+
+def test_keeps_everything_within_budget():
+    context = ContextAssembler(1000).add_wiki("python", "Page: Python\nSummary: A language.").assemble()
+    assert context.text("wiki") == "Page: Python\nSummary: A language."
+    assert context.saved_tokens == 0
+
+def test_prefers_relevant_passages():
+    wiki = "\n\n".join([
+        "Page: Monty Python\nSummary: " + "comedy sketch troupe " * 40,
+        "Page: Python (programming language)\nSummary: " + "programming language interpreter " * 40
+    ])
+    context = ContextAssembler(150).add_wiki("python programming language", wiki).assemble()
+    assert context.text("wiki").startswith("Page: Python (programming language)")
+    assert context.used_tokens <= 150
+    assert context.saved_tokens > 0
+
+def test_keeps_most_recent_steps_in_order():
+    steps = [(f"task {i}", "result " * 30) for i in range(10)]
+    context = ContextAssembler(200).add_steps(steps).assemble()
+    kept = context.groups["steps"]
+    assert kept[-1].startswith("Step: task 9")
+    assert "task 0" not in context.text("steps")
+    assert context.used_tokens <= 200
+
+def test_saved_tokens_are_added_to_the_request_usage():
+    steps = [(f"task {i}", "result " * 30) for i in range(10)]
+    with usage_context.track_usage() as outer:
+        with usage_context.track_usage() as usage:
+            context = ContextAssembler(200).add_steps(steps).assemble()
+            ContextAssembler(1000).add_wiki("python", "Page: Python\nSummary: A language.").assemble()
+    assert context.saved_tokens > 0
+    assert usage.to_dict()["saved_tokens"] == outer.saved_tokens == context.saved_tokens
@@ -0,0 +1,39 @@
+import os
+from agents import intent_classifier
+from agents.intent_classifier import IntentClassifier
+
+EXAMPLES = [
+    ("calculate the square root of 81", "math"),
+    ("solve 3x + 1 = 10", "math"),
+    ("what is 12 times 7", "math"),
+    ("write a python function to sort a list", "coding"),
+    ("fix this python error in my function", "coding"),
+    ("implement a queue in java", "coding"),
+]
+
+def test_saved_model_loads_with_the_same_predictions(tmp_path):
+    classifier = IntentClassifier.train(EXAMPLES)
+    path = tmp_path / "model.bin"
+    classifier.save(path)
+    loaded = IntentClassifier.load(path)
+    assert loaded.labels == ["coding", "math"]
+    for query in ("calculate 5 times 3", "write a java function", "something else entirely"):
+        assert loaded.predict_proba(query) == classifier.predict_proba(query)
+    assert loaded.predict("solve x + 2 = 5")[0] == "math"
+    assert loaded.predict("write a function in java")[0] == "coding"
+
+def test_unsure_or_unsupported_predictions_fall_back(monkeypatch):
+    classifier = IntentClassifier.train(EXAMPLES)
+    monkeypatch.setattr(intent_classifier, "get_classifier", lambda: classifier)
+    assert intent_classifier.predict_agent("write a python function", ["coding", "math"]) == "coding"
+    # An unseen query is split evenly between the labels
+    assert intent_classifier.predict_agent("hello there", ["coding", "math"]) is None
+    assert intent_classifier.predict_agent("write a python function", ["math", "research"]) is None
+    assert intent_classifier.predict_agent("write a python function", ["coding"], threshold=1.0) is None
+
+def test_shipped_model_routes_eval_queries():
+    classifier = intent_classifier.get_classifier()
+    assert classifier is not None
+    examples = intent_classifier.load_examples(os.path.join(os.path.dirname(__file__), "data", "intents_eval.jsonl"))
+    correct = sum(1 for query, agent in examples if classifier.predict(query)[0] == agent)
+    assert correct / len(examples) > 0.8
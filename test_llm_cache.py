@@ -0,0 +1,50 @@
+import time
+from agents.llm_cache import LLMCache, make_key, should_cache
+
+def test_key_depends_on_request_fields():
+    messages = [{"role": "user", "content": "What is a prime number?"}]
+    key = make_key("openai/gpt-3.5-turbo", messages, 0, 1000)
+    assert key == make_key("openai/gpt-3.5-turbo", list(messages), 0, 1000)
+    assert key != make_key("openai/gpt-3.5-turbo", messages, 0, 500)
+    assert key != make_key("openai/gpt-4o-mini", messages, 0, 1000)
+    assert key != make_key("openai/gpt-3.5-turbo", messages, 0, 1000, response_format={"type": "json_object"})
+
+def test_memory_and_disk_tiers(tmp_path):
+    path = str(tmp_path / "cache.db")
+    cache = LLMCache(path=path, memory_entries=1)
+    cache.set("a", "alpha")
+    cache.set("b", "beta")
+    assert cache.get("b") == "beta"
+    assert cache.get("a") == "alpha"
+    assert cache.get("missing") is None
+    stats = cache.stats()
+    assert stats["memory_hits"] == 1
+    assert stats["disk_hits"] == 1
+    assert stats["misses"] == 1
+
+    # A fresh instance reads what the first one persisted
+    assert LLMCache(path=path).get("a") == "alpha"
+
+def test_expired_entries_are_misses(tmp_path):
+    cache = LLMCache(path=str(tmp_path / "cache.db"), ttl=0.05)
+    cache.set("a", "alpha")
+    time.sleep(0.1)
+    assert cache.get("a") is None
+
+def test_prune_trims_least_recently_used(tmp_path):
+    cache = LLMCache(path=str(tmp_path / "cache.db"), memory_entries=0, max_entries=2)
+    for key in ["a", "b", "c"]:
+        cache.set(key, key)
+        time.sleep(0.01)
+    cache.get("a")
+    cache.prune()
+    assert cache.get("b") is None
+    assert cache.get("a") == "a"
+    assert cache.get("c") == "c"
+
+def test_only_deterministic_calls_cached_by_default():
+    assert should_cache(0)
+    assert not should_cache(0.7)
+    assert should_cache(0.7, cache=True)
+    assert not should_cache(0, cache=False)
+    assert not should_cache(0, stream=True)
@@ -0,0 +1,39 @@
+import json
+from mock_llm_server import MockConfig, create_app
+
+def client(**kwargs):
+    return create_app(MockConfig(latency_ms=0, jitter_ms=0, tokens_per_second=0, **kwargs)).test_client()
+
+def chat(client, **body):
+    body.setdefault("model", "openai/gpt-3.5-turbo")
+    return client.post("/v1/chat/completions", json=body)
+
+def test_responses_are_deterministic():
+    c = client()
+    messages = [{"role": "user", "content": "What is Python?"}]
+    first = chat(c, messages=messages).get_json()
+    second = chat(c, messages=messages).get_json()
+    assert first["choices"][0]["message"]["content"] == second["choices"][0]["message"]["content"]
+    assert first["usage"]["total_tokens"] > 0
+
+def test_json_object_follows_prompt_shape():
+    messages = [
+        {"role": "system", "content": 'Respond with JSON: {"purpose": "...", "components": ["..."]}'},
+        {"role": "user", "content": "print(1)"}
+    ]
+    data = chat(client(), messages=messages, response_format={"type": "json_object"}).get_json()
+    content = json.loads(data["choices"][0]["message"]["content"])
+    assert isinstance(content["purpose"], str)
+    assert isinstance(content["components"], list)
+
+def test_stream_reports_usage():
+    response = chat(client(), messages=[{"role": "user", "content": "hi"}], stream=True,
+                    stream_options={"include_usage": True})
+    events = [line[len("data: "):] for line in response.get_data(as_text=True).split("\n\n") if line]
+    assert events[-1] == "[DONE]"
+    assert json.loads(events[-2])["usage"]["completion_tokens"] > 0
+
+def test_error_injection():
+    response = chat(client(error_rate=1.0, error_codes=[429]), messages=[{"role": "user", "content": "hi"}])
+    assert response.status_code == 429
+    assert response.headers["Retry-After"] == "1"
@@ -0,0 +1,20 @@
+from agents import model_router
+from agents.model_router import ModelInfo, ModelRegistry
+
+def test_simple_questions_use_fast_tier():
+    assert model_router.choose_model("answer", "What is the capital of France?") == model_router.FAST_MODEL
+
+def test_complex_questions_escalate():
+    assert model_router.choose_model("answer", "Compare Python and Java step by step") == model_router.STANDARD_MODEL
+    assert model_router.choose_model("plan", "Plan a trip") == model_router.STANDARD_MODEL
+
+def test_escalates_when_context_does_not_fit():
+    assert model_router.choose_model("plan", prompt_tokens=20000) == model_router.STRONG_MODEL
+
+def test_cheapest_fitting_model_in_tier_wins(monkeypatch):
+    monkeypatch.setattr(model_router, "_registry", ModelRegistry([
+        ModelInfo("expensive", "fast", 0.001, 0.002, 8000),
+        ModelInfo("cheap", "fast", 0.0001, 0.0002, 8000),
+        ModelInfo("cheap-small", "fast", 0.00001, 0.00002, 1000)
+    ]))
+    assert model_router.choose_model("answer", "hi", prompt_tokens=100) == "cheap"
@@ -0,0 +1,91 @@
+import time
+import threading
+from agents import plan_executor, usage_context
+from agents.planner import Planner, Response, parse_plan, format_plan
+
+def test_plan_dependencies_are_parsed_and_unannotated_steps_run_in_order():
+    plan = parse_plan("Here is a plan:\n1. Find the population of France. (needs: none)\n"
+                      "2. Find the population of Spain (needs: none)\n3. Compare the two populations. (needs: 1, 2)\n"
+                      "4. Round the difference. (needs: 4, 7)")
+    assert plan.steps == ["Find the population of France.", "Find the population of Spain",
+                          "Compare the two populations.", "Round the difference."]
+    assert plan.dependencies == [[], [], [0, 1], []]
+    assert format_plan(plan.steps, plan.dependencies).splitlines()[2] == "3. Compare the two populations. (needs: 1, 2)"
+
+    plan = parse_plan("1. Search for X.\n2. Search for Y.\n3. Answer.")
+    assert plan.dependencies == [[], [0], [1]]
+    assert plan_executor.ready_steps(plan.steps, plan.dependencies) == [0]
+    assert plan_executor.ready_steps(["a", "b"], None) == [0]
+    assert plan_executor.remove_steps(["a", "b", "c"], [[], [], [0, 1]], [0, 1]) == (["c"], [[]])
+
+def test_preamble_is_not_a_step_and_needs_follow_the_planner_numbers():
+    plan = parse_plan("Here is the plan.\n1. Find the population of France. (needs: none)\n"
+                      "2. Find the population of Spain. (needs: none)\n3. Compare the two populations. (needs: 1, 2)\n"
+                      "That should answer the question.")
+    assert plan.steps == ["Find the population of France.", "Find the population of Spain.",
+                          "Compare the two populations."]
+    assert plan.dependencies == [[], [], [0, 1]]
+
+    # A plan resumed at step 2 still refers to its steps by the planner's numbers
+    plan = parse_plan("2. Find the population of Spain. (needs: none)\n3. Compare the two populations. (needs: 2)")
+    assert plan.dependencies == [[], [0]]
+    # Without a list, short sentences are still taken as steps
+    assert parse_plan("Search for X.\nAnswer the question.").steps == ["Search for X.", "Answer the question."]
+
+def test_independent_steps_run_together_with_one_replan_per_wave():
+    plan = Planner(steps=["population of X", "population of Y", "compare"], dependencies=[[], [], [0, 1]])
+    running = []
+    overlapped = threading.Event()
+    replans = []
+
+    def executor(query):
+        running.append(query["input"])
+        if len(running) == 2:
+            overlapped.set()
+        overlapped.wait(1)
+        usage_context.current_usage().add("test-model", 10, 5, 0.0)
+        return {"output": query["input"].upper()}
+
+    def replanner(state):
+        replans.append(list(state["plan"]))
+        if state["plan"]:
+            return Planner(steps=state["plan"], dependencies=state["dependencies"])
+        return Response(response="X is bigger")
+
+    with usage_context.track_usage() as usage:
+        state = plan_executor.run_plan("compare X and Y", lambda objective: plan, executor, replanner,
+                                       lambda query: Response(response="fallback"), parallelism=4)
+    assert overlapped.is_set()
+    assert state["response"] == "X is bigger"
+    assert state["waves"] == 2
+    assert replans == [["compare"], []]
+    assert state["past_steps"] == [("population of X", "POPULATION OF X"), ("population of Y", "POPULATION OF Y"),
+                                   ("compare", "COMPARE")]
+    # Steps run in worker threads still count towards the request's usage
+    assert usage.total_tokens == 45
+
+def test_parallelism_and_step_cap_are_respected():
+    active = []
+    peak = []
+    lock = threading.Lock()
+
+    def run(task):
+        with lock:
+            active.append(task)
+            peak.append(len(active))
+        time.sleep(0.02)
+        with lock:
+            active.remove(task)
+        return task
+
+    tasks = [f"step {i}" for i in range(6)]
+    assert plan_executor.run_wave(run, tasks, parallelism=2) == [(task, task) for task in tasks]
+    assert max(peak) == 2
+
+    plan = Planner(steps=tasks, dependencies=[[] for _ in tasks])
+    state = plan_executor.run_plan("many steps", lambda objective: plan, lambda query: {"output": "done"},
+                                   lambda state: Planner(steps=state["plan"], dependencies=state["dependencies"]),
+                                   lambda query: Response(response="fallback"), max_steps=4, parallelism=2)
+    assert [task for task, _ in state["past_steps"]] == tasks[:4]
+    assert state["waves"] == 1
+    assert state["response"] == "fallback"
@@ -0,0 +1,37 @@
+import time
+from agents.prewarm import Prewarmer
+
+def wait_until(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return condition()
+
+def test_ready_once_required_resources_are_warm():
+    warmed = []
+    def fail():
+        raise RuntimeError("offline")
+    prewarmer = Prewarmer([("agents", lambda: warmed.append("agents")), ("tokenizer", fail)],
+                          required=["agents"], retry_interval=60)
+    assert not prewarmer.ready and prewarmer.status()["resources"]["agents"]["state"] == "pending"
+    assert prewarmer.start() and not prewarmer.start()
+    assert wait_until(lambda: prewarmer.ready)
+    assert wait_until(lambda: prewarmer.status()["resources"]["tokenizer"]["state"] != "pending")
+    resources = prewarmer.status()["resources"]
+    assert warmed == ["agents"]
+    assert resources["agents"]["state"] == "warm" and resources["agents"]["required"]
+    # Optional resources that fail do not hold readiness back
+    assert resources["tokenizer"] == {"state": "failed", "required": False, "error": "offline"}
+
+def test_failed_required_resource_is_retried():
+    attempts = []
+    def flaky():
+        attempts.append(1)
+        if len(attempts) < 3:
+            raise ConnectionError("no route to provider")
+    prewarmer = Prewarmer([("provider", flaky)], required=["provider"], retry_interval=0.01)
+    prewarmer.start()
+    assert wait_until(lambda: prewarmer.status()["resources"]["provider"]["state"] == "failed")
+    assert wait_until(lambda: prewarmer.ready)
+    assert len(attempts) == 3
+    assert "error" not in prewarmer.status()["resources"]["provider"]
@@ -0,0 +1,33 @@
+import json
+from types import SimpleNamespace
+from agents import pricing, usage_context
+from agents.pricing import ModelPrice, PricingRegistry
+
+def test_cached_input_is_billed_at_its_own_rate():
+    price = ModelPrice(0.001, 0.002, 0.0005)
+    assert price.cost(1000, 500) == 0.002
+    assert price.cost(1000, 500, cached_tokens=600) == (400 * 0.001 + 600 * 0.0005 + 500 * 0.002) / 1000
+    # Without a cached rate, cached tokens cost the same as other input
+    assert ModelPrice(0.001, 0.002).cost(1000, 0, cached_tokens=1000) == 0.001
+
+def test_lookup_by_id_without_provider_and_unknown_fallback(tmp_path):
+    path = tmp_path / "pricing.json"
+    path.write_text(json.dumps({"acme/small": {"input": 0.0001, "output": 0.0002}}))
+    registry = PricingRegistry.from_file(str(path))
+
+    assert registry.price("acme/small").output_price == 0.0002
+    assert registry.price("gpt-4o") is registry.price("openai/gpt-4o")
+    assert registry.price("nobody/knows") is pricing.UNKNOWN_PRICE
+
+def test_calls_are_priced_per_model_with_cached_tokens():
+    usage = SimpleNamespace(prompt_tokens=2000, completion_tokens=100,
+                            prompt_tokens_details=SimpleNamespace(cached_tokens=1000))
+    with usage_context.track_usage() as request:
+        usage_context.record_call("openai/gpt-4o", 0.1, usage)
+        usage_context.record_call("openai/gpt-4o-mini", 0.1, SimpleNamespace(prompt_tokens=1000, completion_tokens=1000))
+
+    strong = pricing.price_call("openai/gpt-4o", 2000, 100, cached_tokens=1000)
+    assert strong < pricing.price_call("openai/gpt-4o", 2000, 100)
+    assert request.cached_tokens == 1000
+    assert abs(request.cost - (strong + pricing.price_call("openai/gpt-4o-mini", 1000, 1000))) < 1e-12
+    assert request.by_model["openai/gpt-4o"][3] == strong
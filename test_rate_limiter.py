@@ -0,0 +1,63 @@
+import threading
+import pytest
+from agents.rate_limiter import AdaptiveConcurrencyLimiter, LimiterTimeout, ProviderLimiter, TokenBucket
+
+def test_bucket_refills_at_its_rate_up_to_capacity():
+    bucket = TokenBucket(rate=10, capacity=20)
+    assert bucket.reserve(20) == 0.0
+    # An empty bucket makes the next caller wait for its share to refill
+    assert bucket.reserve(5) == pytest.approx(0.5, abs=0.01)
+    bucket.updated -= 1.5
+    assert bucket.reserve(10) == 0.0
+    bucket.updated -= 60
+    bucket.refund(100)
+    assert bucket.tokens == 20
+
+def test_limit_backs_off_on_429_and_spikes_then_recovers():
+    limiter = AdaptiveConcurrencyLimiter(initial=8, minimum=1, maximum=10)
+    limiter.acquire()
+    limiter.release(0.1, rate_limited=True)
+    assert limiter.limit == 4
+    assert limiter.rate_limited == 1
+
+    for _ in range(3):
+        limiter.acquire()
+        limiter.release(0.1)
+    limit = limiter.limit
+    assert 4.5 < limit < 5
+    limiter.acquire()
+    limiter.release(1.0)
+    assert limiter.latency_spikes == 1
+    assert limiter.limit == pytest.approx(limit * 0.9)
+
+    for _ in range(100):
+        limiter.acquire()
+        limiter.release(0.1)
+    assert limiter.limit == 10
+    assert limiter.in_flight == 0
+
+def test_concurrency_timeout_refunds_the_reservation():
+    limiter = ProviderLimiter(requests_per_second=100, tokens_per_minute=6000,
+                              concurrency=AdaptiveConcurrencyLimiter(initial=1, minimum=1, maximum=1))
+    entered = threading.Event()
+    release = threading.Event()
+
+    def hold_the_only_slot():
+        with limiter.slot(100):
+            entered.set()
+            release.wait(2)
+
+    holder = threading.Thread(target=hold_the_only_slot)
+    holder.start()
+    entered.wait(1)
+    try:
+        for _ in range(5):
+            with pytest.raises(LimiterTimeout), limiter.slot(1000, timeout=0.01):
+                pytest.fail("the call ran without a slot")
+        # Only the running call's estimate is taken from the buckets
+        assert limiter.tokens.tokens > 6000 - 100 - 1
+        assert limiter.requests.tokens > 100 - 1 - 1
+    finally:
+        release.set()
+        holder.join()
+    assert limiter.concurrency.in_flight == 0
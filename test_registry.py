@@ -0,0 +1,42 @@
+import os
+import sys
+import subprocess
+import pytest
+from agents.registry import AgentRegistry, AgentSpec
+
+def write_agent(tmp_path, name, body):
+    (tmp_path / f"{name}.py").write_text(body)
+
+def test_agent_is_imported_on_first_call(tmp_path, monkeypatch):
+    write_agent(tmp_path, "lazy_echo_agent", "LOADS = []\nLOADS.append(1)\ndef run(text):\n    return text.upper()\n")
+    monkeypatch.syspath_prepend(str(tmp_path))
+    registry = AgentRegistry([AgentSpec("echo", "lazy_echo_agent", {"run": "run"}, aliases=("shout",))], package=None)
+    run = registry.entry("shout", "run")
+    assert "lazy_echo_agent" not in sys.modules
+    assert not registry.loaded("echo")
+    assert run("hi") == "HI" and run("again") == "AGAIN"
+    assert sys.modules["lazy_echo_agent"].LOADS == [1]
+    stats = registry.stats()
+    assert list(stats) == ["echo"] and stats["echo"]["loaded"] and "load_ms" in stats["echo"]
+
+def test_required_agents_load_first_and_unknown_names_fail(tmp_path, monkeypatch):
+    write_agent(tmp_path, "lazy_base_agent", "import sys\nORDER = sys.modules.setdefault('lazy_order', [])\nORDER.append('base')\n")
+    write_agent(tmp_path, "lazy_top_agent", "import sys\nsys.modules['lazy_base_agent'].ORDER.append('top')\ndef run():\n    return 'top'\n")
+    monkeypatch.syspath_prepend(str(tmp_path))
+    registry = AgentRegistry([
+        AgentSpec("base", "lazy_base_agent", {}),
+        AgentSpec("top", "lazy_top_agent", {"run": "run"}, requires=("base",))
+    ], package=None)
+    assert registry.get("top", "run")() == "top"
+    assert sys.modules["lazy_base_agent"].ORDER == ["base", "top"]
+    with pytest.raises(KeyError):
+        registry.entry("missing", "run")
+    with pytest.raises(KeyError):
+        registry.entry("top", "stream")
+
+def test_light_modules_do_not_load_agents_or_llm_sdk():
+    code = ("import sys\nfrom agents import budget, registry, route_cache, router, intent_classifier\n"
+            "print(sorted(name for name in ('openai', 'langchain_core', 'matplotlib', 'agents.planner') if name in sys.modules))")
+    result = subprocess.run([sys.executable, "-c", code], cwd=os.path.dirname(os.path.abspath(__file__)),
+                            capture_output=True, text=True, check=True)
+    assert result.stdout.strip() == "[]"
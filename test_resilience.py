@@ -0,0 +1,114 @@
+import time
+import threading
+from types import SimpleNamespace
+from contextlib import contextmanager
+from concurrent.futures import CancelledError, ThreadPoolExecutor
+import pytest
+from agents import llm_client, resilience
+
+class FakeStatusError(Exception):
+    def __init__(self, status_code):
+        super().__init__(f"status {status_code}")
+        self.status_code = status_code
+
+def flaky(failures, status_code=503):
+    calls = []
+    def fn():
+        calls.append(1)
+        if len(calls) <= failures:
+            raise FakeStatusError(status_code)
+        return "ok"
+    return fn, calls
+
+def test_retries_transient_errors(monkeypatch):
+    monkeypatch.setattr(resilience, "backoff_delay", lambda error, attempt: 0)
+    fn, calls = flaky(2)
+    assert resilience.call_with_retries(fn) == "ok"
+    assert len(calls) == 3
+
+def test_does_not_retry_client_errors(monkeypatch):
+    monkeypatch.setattr(resilience, "backoff_delay", lambda error, attempt: 0)
+    fn, calls = flaky(1, status_code=400)
+    with pytest.raises(FakeStatusError):
+        resilience.call_with_retries(fn)
+    assert len(calls) == 1
+
+def test_attempt_budget_caps_retries(monkeypatch):
+    monkeypatch.setattr(resilience, "backoff_delay", lambda error, attempt: 0)
+    fn, calls = flaky(2)
+    with resilience.attempt_budget(1):
+        with pytest.raises(FakeStatusError):
+            resilience.call_with_retries(fn)
+    assert len(calls) == 2
+
+class RecordingPool(ThreadPoolExecutor):
+    def __init__(self, workers):
+        super().__init__(max_workers=workers)
+        self.futures = []
+
+    def submit(self, *args, **kwargs):
+        future = super().submit(*args, **kwargs)
+        self.futures.append(future)
+        return future
+
+def hedging(monkeypatch, workers, delay=0.05):
+    tracker = resilience.LatencyTracker()
+    for _ in range(resilience.HEDGE_MIN_SAMPLES):
+        tracker.record(delay)
+    pool = RecordingPool(workers)
+    monkeypatch.setattr(resilience, "HEDGE_ENABLED", True)
+    monkeypatch.setattr(resilience, "latencies", tracker)
+    monkeypatch.setattr(resilience, "_hedge_pool", pool)
+    monkeypatch.setattr(resilience, "stats_counters", resilience._Stats())
+    return pool
+
+def test_hedge_fires_after_the_delay_and_wins(monkeypatch):
+    hedging(monkeypatch, workers=2)
+    calls = []
+    release = threading.Event()
+
+    def fn():
+        calls.append(time.monotonic())
+        if len(calls) == 1:
+            release.wait(2)
+            return "slow"
+        return "fast"
+
+    start = time.monotonic()
+    assert resilience.hedged(fn) == "fast"
+    release.set()
+    assert calls[1] - start >= 0.05
+    assert time.monotonic() - start < 1
+    assert (resilience.stats_counters.hedges, resilience.stats_counters.hedge_wins) == (1, 1)
+
+def test_losing_hedge_is_cancelled(monkeypatch):
+    # With one worker the hedge is still queued when the primary returns
+    pool = hedging(monkeypatch, workers=1)
+    calls = []
+
+    def fn():
+        calls.append(1)
+        time.sleep(0.15)
+        return "primary"
+
+    assert resilience.hedged(fn) == "primary"
+    primary, hedge = pool.futures
+    assert hedge.cancelled() or isinstance(hedge.exception(), CancelledError)
+    assert len(calls) == 1
+    assert (resilience.stats_counters.hedges, resilience.stats_counters.hedge_wins) == (1, 0)
+
+def test_latency_excludes_time_queued_for_a_provider_slot(monkeypatch):
+    tracker = resilience.LatencyTracker()
+    monkeypatch.setattr(resilience, "latencies", tracker)
+
+    @contextmanager
+    def slow_slot(messages, model, max_tokens, timeout):
+        time.sleep(0.2)
+        yield {"actual_tokens": None}
+
+    response = SimpleNamespace(usage=None, choices=[SimpleNamespace(message=SimpleNamespace(content="hi"))])
+    client = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=lambda **kwargs: response)))
+    monkeypatch.setattr(llm_client, "provider_slot", slow_slot)
+    monkeypatch.setattr(llm_client, "get_client", lambda api_key=None: client)
+    assert llm_client.chat_completion([{"role": "user", "content": "hi"}], cache=False) is response
+    assert len(tracker._samples) == 1 and tracker._samples[0] < 0.1
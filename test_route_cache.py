@@ -0,0 +1,46 @@
+import pytest
+import app
+from agents import route_cache
+from agents.route_cache import RouteCache
+
+def test_normalize_folds_case_punctuation_and_code():
+    assert route_cache.normalize("  What is the Capital,  of FRANCE?!") == "what is the capital of france"
+    query = ("Why does this fail?\n```python\nprint(records['id'])\n```\n\n"
+             "def load(path):\n    with open(path) as f:\n        return f.read()\nThanks")
+    assert route_cache.normalize(query) == "why does this fail code code thanks"
+    assert route_cache.normalize("Shopping list:\n  - eggs\n  - milk") == "shopping list eggs milk"
+    assert route_cache.normalize("C++ or C#?") == "c++ or c#"
+
+def test_same_normalized_query_is_decided_once():
+    cache = RouteCache(max_entries=8)
+    decided = []
+    decide = lambda text: decided.append(text) or "research"
+    assert cache.route("app", "What is Python?", decide) == "research"
+    assert cache.route("app", "what is python", decide) == "research"
+    assert cache.route("cli", "what is python", decide) == "research"
+    assert decided == ["what is python", "what is python"]
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["entries"]) == (1, 2, 2)
+    assert stats["hit_rate"] == 1 / 3
+
+def test_least_recently_used_decision_is_evicted():
+    cache = RouteCache(max_entries=2)
+    cache.route("app", "first", str.upper)
+    cache.route("app", "second", str.upper)
+    cache.route("app", "first", str.upper)
+    cache.route("app", "third", str.upper)
+    assert cache.stats()["evictions"] == 1
+    assert cache.route("app", "first", lambda text: "recomputed") == "FIRST"
+    assert cache.route("app", "second", lambda text: "recomputed") == "recomputed"
+    assert RouteCache(max_entries=0).route("app", "x", str.upper) == "X"
+
+@pytest.mark.parametrize("query", ["calculate 2+2;", "what is {x}", "import math",
+                                   "how to make tea:\n  1. boil water\n  2. add the tea\n  3. steep"])
+def test_prose_that_looks_like_code_is_kept(query):
+    assert route_cache.CODE_MARKER not in route_cache.normalize(query).split()
+    # A normalized query routes the same as its raw text
+    assert RouteCache(max_entries=8).route("app", query, app.decide_agent) == app.decide_agent(query)
+
+def test_only_runs_of_code_lines_are_stripped():
+    assert route_cache.strip_code("x = 1;\ny = 2;\nprint(x);\nwhy is this slow") == "code\nwhy is this slow"
+    assert route_cache.strip_code("x = 1;\ny = 2;\nwhy is this slow") == "x = 1;\ny = 2;\nwhy is this slow"
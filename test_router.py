@@ -0,0 +1,24 @@
+from agents import router
+from agents.router import KeywordRouter
+
+def test_keywords_match_whole_words_with_endings():
+    match = router.match("Debug these Functions from an online\ncourse: what\nis wrong?")
+    assert set(match.keywords) == {"what is", "debug", "function"}
+    assert "concept_chart" not in match  # "line" inside "online"
+    assert match.best(["concept_chart", "coding", "research"]) == "coding"
+    assert not router.match("")
+
+def test_scores_count_each_keyword_once_and_phrases_win():
+    rules = KeywordRouter({"multi": ["find out", "compare"], "research": ["find", "what is"]})
+    match = rules.match("Find out what is faster, then find it and find it again")
+    assert match.scores == {"multi": 1, "research": 2}
+    assert rules.match("find out more").scores == {"multi": 1}
+
+def test_coding_task_and_language():
+    assert router.coding_task("fix this error: NameError") == "debug"
+    assert router.coding_task("explain how this loop works") == "explain"
+    assert router.coding_task("write a parser") == "generate"
+    assert router.code_language("sort a list in C++") == "c++"
+    assert router.code_language("a javascript debounce") == "javascript"
+    assert router.code_language("let's go") == "go"
+    assert router.code_language("no language here") == "python"
@@ -0,0 +1,65 @@
+from agents import semantic_cache
+from agents.semantic_cache import SemanticCache
+
+QUESTIONS = ["What is the capital of France?", "How do I bake sourdough bread?", "Explain quantum entanglement simply"]
+
+def filled_cache(**kwargs):
+    cache = SemanticCache(threshold=0.9, max_entries=8, **kwargs)
+    for question in QUESTIONS:
+        cache.store(question, "research", {"response": question})
+    return cache
+
+def test_paraphrase_hits_and_near_miss_misses():
+    cache = filled_cache()
+    assert cache.lookup("what's the capital of France", "research") == {"response": QUESTIONS[0]}
+    # Same words but another country, or another agent, is a different question
+    assert cache.lookup("What is the capital of Spain?", "research") is None
+    assert cache.lookup("What is the capital of France?", "math") is None
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["entries"]) == (1, 2, 3)
+
+def age(cache, seconds):
+    cache._created -= seconds
+    cache._last_used -= seconds
+
+def test_entries_expire_after_the_ttl():
+    cache = filled_cache(ttl=60)
+    age(cache, 30)
+    assert cache.lookup(QUESTIONS[1], "research") is not None
+    age(cache, 31)
+    assert cache.lookup(QUESTIONS[1], "research") is None
+    assert cache.stats()["entries"] == 0
+    assert cache.stats()["evictions"] == 3
+
+def test_least_recently_used_entry_is_evicted_when_full():
+    cache = SemanticCache(threshold=0.9, max_entries=2)
+    cache.store(QUESTIONS[0], "research", "france")
+    age(cache, 1)
+    cache.store(QUESTIONS[1], "research", "bread")
+    age(cache, 1)
+    assert cache.lookup(QUESTIONS[0], "research") == "france"
+    age(cache, 1)
+    cache.store(QUESTIONS[2], "research", "quantum")
+
+    assert cache.stats()["evictions"] == 1
+    assert cache.lookup(QUESTIONS[1], "research") is None
+    assert cache.lookup(QUESTIONS[0], "research") == "france"
+    assert cache.lookup(QUESTIONS[2], "research") == "quantum"
+
+    # Storing the same question again replaces its entry instead of taking a slot
+    cache.store(QUESTIONS[2], "research", "updated")
+    assert cache.lookup(QUESTIONS[2], "research") == "updated"
+    assert cache.stats()["entries"] == 2
+
+def test_operator_and_number_differences_miss():
+    cache = SemanticCache(threshold=0.9, max_entries=8)
+    cache.store("what is 3+3", "math", "6")
+    cache.store("calculate 10-2", "math", "8")
+    for query in ["what is 3*3", "what is 3/3", "what is 3-3", "what is 33", "what is 3+4"]:
+        assert cache.lookup(query, "math") is None, query
+    for query in ["calculate 10+2", "calculate 10^2", "calculate 10%2", "calculate 10 = 2"]:
+        assert cache.lookup(query, "math") is None, query
+    # The same question written differently is still served
+    assert cache.lookup("What is 3 + 3?", "math") == "6"
+    assert cache.lookup("Calculate 10 - 2", "math") == "8"
+    assert semantic_cache.normalize_query("A well-known and/or famous x-ray") == "a well known and or famous x ray"
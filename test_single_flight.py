@@ -0,0 +1,74 @@
+import threading
+import time
+from concurrent.futures import CancelledError, ThreadPoolExecutor
+import pytest
+from agents.single_flight import SingleFlight, SingleFlightTimeout
+
+def test_concurrent_callers_share_one_call():
+    flight = SingleFlight()
+    calls = []
+    release = threading.Event()
+
+    def work():
+        calls.append(1)
+        release.wait(1)
+        return "answer"
+
+    with ThreadPoolExecutor(5) as pool:
+        futures = [pool.submit(flight.do, "key", work) for _ in range(5)]
+        time.sleep(0.1)
+        release.set()
+        results = [f.result() for f in futures]
+
+    assert results == ["answer"] * 5
+    assert len(calls) == 1
+    assert flight.stats()["shared"] == 4
+    assert flight.in_flight() == 0
+
+def test_waiter_timeout_does_not_cancel_leader():
+    flight = SingleFlight()
+    release = threading.Event()
+
+    with ThreadPoolExecutor(2) as pool:
+        leader = pool.submit(flight.do, "key", lambda: release.wait(1) and "done")
+        time.sleep(0.05)
+        with pytest.raises(SingleFlightTimeout):
+            flight.do("key", lambda: "unused", timeout=0.05)
+        release.set()
+        assert leader.result() == "done"
+
+def test_errors_reach_waiters_and_are_not_kept():
+    flight = SingleFlight()
+    release = threading.Event()
+
+    def fail():
+        release.wait(1)
+        raise ValueError("boom")
+
+    with ThreadPoolExecutor(2) as pool:
+        futures = [pool.submit(flight.do, "key", fail) for _ in range(2)]
+        time.sleep(0.05)
+        release.set()
+        for future in futures:
+            with pytest.raises(ValueError):
+                future.result()
+
+    assert flight.do("key", lambda: "recovered") == "recovered"
+
+def test_waiters_retry_when_leader_is_cancelled():
+    flight = SingleFlight()
+    release = threading.Event()
+
+    def cancelled():
+        release.wait(1)
+        raise CancelledError()
+
+    with ThreadPoolExecutor(2) as pool:
+        leader = pool.submit(flight.do, "key", cancelled)
+        time.sleep(0.05)
+        waiter = pool.submit(flight.do, "key", lambda: "fresh")
+        time.sleep(0.05)
+        release.set()
+        with pytest.raises(CancelledError):
+            leader.result()
+        assert waiter.result() == "fresh"
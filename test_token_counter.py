@@ -0,0 +1,14 @@
+from agents import token_counter
+
+TEXTS = ["What is the capital of France?", "", "Explain recursion with an example in Python."]
+
+def test_batch_matches_single_counts():
+    assert token_counter.count_tokens_batch(TEXTS) == [token_counter.count_tokens(text) for text in TEXTS]
+
+def test_approx_tokens():
+    assert token_counter.approx_tokens("") == 0
+    assert token_counter.approx_tokens("abcd") == 1
+    assert token_counter.approx_tokens("abcde") == 2
+
+def test_encoder_is_shared_across_provider_prefixes():
+    assert token_counter.get_encoding("openai/gpt-3.5-turbo") is token_counter.get_encoding("gpt-3.5-turbo")
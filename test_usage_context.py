@@ -0,0 +1,63 @@
+from types import SimpleNamespace
+from agents import usage_context
+
+def test_provider_usage_is_collected_per_request():
+    with usage_context.track_usage() as usage:
+        usage_context.record_call("openai/gpt-4o-mini", 0.2, SimpleNamespace(prompt_tokens=120, completion_tokens=30))
+        usage_context.record_call("openai/gpt-3.5-turbo", 0.4, SimpleNamespace(prompt_tokens=200, completion_tokens=50))
+    assert usage.calls == 2
+    assert usage.total_tokens == 400
+    assert usage.models == ["openai/gpt-4o-mini", "openai/gpt-3.5-turbo"]
+    assert usage.cost > 0
+    assert not usage.to_dict()["estimated"]
+
+def test_missing_usage_is_counted_locally():
+    messages = [{"role": "user", "content": "What is the capital of France?"}]
+    with usage_context.track_usage() as usage:
+        usage_context.record_call("openai/gpt-3.5-turbo", None, None, messages, "Paris.")
+    assert usage.prompt_tokens > 0 and usage.completion_tokens > 0
+    assert usage.to_dict()["estimated"]
+
+def test_nested_blocks_count_towards_the_outer_request():
+    with usage_context.track_usage() as outer:
+        with usage_context.track_usage() as inner:
+            usage_context.record_call("openai/gpt-3.5-turbo", 0.1, SimpleNamespace(prompt_tokens=10, completion_tokens=5))
+        inner.count_locally("query", "answer")
+        outer.count_locally("query", "answer")
+    assert inner.total_tokens == outer.total_tokens == 15
+
+def test_requests_without_llm_calls_fall_back_to_local_counting():
+    with usage_context.track_usage() as usage:
+        pass
+    usage.count_locally("What is 2 + 2?", "4")
+    assert usage.calls == 1 and usage.total_tokens > 0
+
+class FakeStream:
+    def __init__(self, chunks):
+        self.chunks = iter(chunks)
+        self.closed = False
+
+    def __iter__(self):
+        return self.chunks
+
+    def close(self):
+        self.closed = True
+
+def test_stream_closed_before_the_usage_chunk_is_still_recorded(monkeypatch):
+    from agents import llm_client
+    chunks = [SimpleNamespace(usage=None, choices=[SimpleNamespace(delta=SimpleNamespace(content=text))])
+              for text in ["Paris is", " the capital", " of France."]]
+    stream = FakeStream(chunks)
+    client = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=lambda **kwargs: stream)))
+    monkeypatch.setattr(llm_client, "get_client", lambda api_key=None: client)
+
+    messages = [{"role": "user", "content": "What is the capital of France?"}]
+    with usage_context.track_usage() as usage:
+        chunk_stream = llm_client.stream_chat_completion(messages, model="openai/gpt-3.5-turbo")
+        next(chunk_stream)
+        # The client disconnects after the first chunk, before the provider's usage arrives
+        chunk_stream.close()
+    assert stream.closed
+    assert usage.calls == 1
+    assert usage.prompt_tokens > 0 and usage.completion_tokens > 0
+    assert usage.to_dict()["estimated"]
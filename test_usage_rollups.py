@@ -0,0 +1,52 @@
+import pytest
+from agents.usage_rollups import UsageRollups, parse_window
+from agents.usage_store import UsageStore
+
+NOW = 1_700_000_000.0
+
+def test_range_query_groups_by_agent_and_model():
+    rollups = UsageRollups()
+    rollups.add("app", "fast", calls=1, tokens=120, prompt_tokens=100, completion_tokens=20, cost=0.1, ts=NOW - 30)
+    rollups.add("app", "strong", calls=1, tokens=15, prompt_tokens=10, completion_tokens=5, cost=0.5, ts=NOW - 400)
+    rollups.add("cli", "fast", calls=1, tokens=60, prompt_tokens=50, completion_tokens=10, cost=0.05, ts=NOW - 7200)
+
+    recent = rollups.query(window=600, end=NOW, group_by="model")
+    assert recent["granularity"] == "minute"
+    assert recent["totals"]["tokens"] == 135
+    assert recent["groups"]["fast"]["prompt_tokens"] == 100
+    assert recent["groups"]["strong"]["completion_tokens"] == 5
+
+    by_agent = rollups.query(window=3 * 3600, end=NOW, group_by="agent")
+    assert by_agent["groups"]["cli"]["tokens"] == 60
+    assert by_agent["totals"]["calls"] == 3
+
+def test_ring_slots_are_reused_for_newer_buckets():
+    rollups = UsageRollups(minute_slots=5)
+    rollups.add("app", "m", tokens=10, ts=NOW - 6 * 60)
+    rollups.add("app", "m", tokens=7, ts=NOW)
+
+    result = rollups.query(window=300, end=NOW, granularity="minute", series=True)
+    assert result["totals"]["tokens"] == 7
+    assert len(result["series"]) == 5
+    assert result["series"][-1]["tokens"] == 7
+
+def test_windows_and_bad_queries():
+    assert parse_window("15m") == 900
+    assert parse_window("7d") == 7 * 86400
+    assert UsageRollups().choose_granularity(30 * 86400) == "day"
+    with pytest.raises(ValueError):
+        UsageRollups().query(group_by="day")
+
+@pytest.mark.parametrize("window", ["infh", "nan", "-1h", "0", "0m", "1e12d", "abc"])
+def test_unusable_windows_are_rejected(window):
+    with pytest.raises(ValueError):
+        parse_window(window)
+
+def test_store_seeds_day_rollups_from_stored_rows(tmp_path):
+    store = UsageStore(str(tmp_path / "usage.db"), flush_interval=60)
+    store.record("app", "fast", tokens=40, calls=1)
+    store.flush()
+
+    reopened = UsageStore(str(tmp_path / "usage.db"), flush_interval=60)
+    result = reopened.rollups.query(window=86400, granularity="day", group_by="agent")
+    assert result["groups"]["app"]["tokens"] == 40
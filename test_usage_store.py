@@ -0,0 +1,65 @@
+import json
+import threading
+from agents import usage_context
+from agents.usage_store import UsageStore, CostTracker
+
+def make_store(tmp_path, **kwargs):
+    kwargs.setdefault("flush_interval", 60)
+    return UsageStore(str(tmp_path / "usage.db"), **kwargs)
+
+def test_concurrent_writers_do_not_lose_updates(tmp_path):
+    # Two stores on one file stand in for two worker processes
+    stores = [make_store(tmp_path, flush_records=7) for _ in range(2)]
+
+    def write(store):
+        for _ in range(200):
+            store.record("app", "m", tokens=10, cost=0.01, calls=1)
+
+    threads = [threading.Thread(target=write, args=(store,)) for store in stores for _ in range(2)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    for store in stores:
+        store.flush()
+
+    totals = make_store(tmp_path).totals()
+    assert totals["calls"] == 800
+    assert totals["total_tokens"] == 8000
+
+def test_request_usage_is_split_by_agent_and_model(tmp_path):
+    tracker = CostTracker("app", make_store(tmp_path))
+    with usage_context.track_usage() as usage:
+        usage.add("fast", 100, 20, 0.5)
+        usage.add("strong", 10, 5, 1.0)
+        usage.add("fast", 50, 10, 0.25)
+    tracker.track_request(usage, "research")
+    tracker.track_usage(40)
+
+    store = tracker.store
+    assert store.breakdown("model")["fast"] == {"calls": 2, "tokens": 180, "cost": 0.75}
+    assert store.breakdown("agent")["research"]["tokens"] == 195
+    assert store.breakdown("agent")["app"]["tokens"] == 40
+    assert tracker.total_tokens == 235
+
+def test_legacy_files_are_imported_once(tmp_path):
+    legacy = tmp_path / "coding_usage.json"
+    legacy.write_text(json.dumps({"total_tokens": 300, "total_cost": 0.6,
+                                  "daily_usage": {"2025-01-01": 100, "2025-01-02": 200}}))
+
+    store = make_store(tmp_path)
+    assert store.import_legacy(str(legacy), "coding")
+    assert not make_store(tmp_path).import_legacy(str(legacy), "coding")
+    assert store.daily_usage("coding") == {"2025-01-01": 100, "2025-01-02": 200}
+    assert round(store.totals()["total_cost"], 6) == 0.6
+
+def test_session_totals_survive_restart(tmp_path):
+    tracker = CostTracker("app", make_store(tmp_path), session="s1")
+    tracker.track_usage(100, cost=0.5)
+    tracker.track_usage(50, cost=0.25)
+    assert tracker.store.session_usage("s1")["tokens"] == 150
+    tracker.store.flush()
+
+    reopened = make_store(tmp_path)
+    assert reopened.session_usage("s1") == {"session": "s1", "calls": 0, "tokens": 150, "cost": 0.75}
+    assert reopened.session_usage("other")["cost"] == 0
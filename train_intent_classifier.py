@@ -0,0 +1,29 @@
+import sys
+import argparse
+from agents import intent_classifier
+from agents.intent_classifier import IntentClassifier
+
+def main():
+    parser = argparse.ArgumentParser(description='Train the intent classifier used for agent routing')
+    parser.add_argument('input', nargs='?', default='data/intents_train.jsonl',
+                        help='JSONL file of {"query": ..., "agent": ...} examples')
+    parser.add_argument('-o', '--output', default=intent_classifier.DEFAULT_MODEL_PATH, help='Where to write the model')
+    parser.add_argument('--alpha', type=float, default=0.5, help='Laplace smoothing')
+    args = parser.parse_args()
+
+    examples = intent_classifier.load_examples(args.input)
+    if not examples:
+        print(f"No examples in {args.input}")
+        return 1
+    classifier = IntentClassifier.train(examples, alpha=args.alpha)
+    classifier.save(args.output)
+
+    correct = sum(1 for query, agent in examples if classifier.predict(query)[0] == agent)
+    print(f"Trained on {len(examples)} examples, {len(classifier.hashes):,} features, "
+          f"labels: {', '.join(classifier.labels)}")
+    print(f"Training accuracy: {correct / len(examples):.1%}")
+    print(f"Model written to {args.output}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())